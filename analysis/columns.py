@@ -0,0 +1,208 @@
+from concurrent.futures import ProcessPoolExecutor
+from mmap import mmap, ACCESS_READ
+from os.path import exists, getsize
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from logger.sink import data_files, read_binary_log
+
+CHUNK_BYTES = 1 << 22   # log bytes parsed per vectorized pass (bounds the temporary arrays)
+MAX_HOST_BYTES = 255    # longest host kept when grouping by host
+HASH_BASE = np.uint64(0x100000001b3) # odd, so its powers are invertible mod 2**64
+
+TAB, NEWLINE = 9, 10
+ZERO = ord('0')
+PADDING = MAX_HOST_BYTES + 1 # zero bytes after each chunk, so fixed-width reads never run past it
+PLACES = 10.0 ** np.arange(15)[::-1] # place values (exact in float64 up to 15 digits)
+
+# Column arrays of a page log: one entry per record, plus the hosts that host_id indexes
+COLUMNS = ('timestamp', 'content_length', 'depth', 'status_code', 'priority', 'host_id', 'url_hash')
+
+def _powers(count):
+    # HASH_BASE**i and its inverse**i for i < count (uint64 products wrap mod 2**64)
+    inverse = pow(int(HASH_BASE), -1, 1 << 64)
+    powers = np.full(count, HASH_BASE, dtype=np.uint64)
+    powers[0] = 1
+    inverses = np.full(count, inverse, dtype=np.uint64)
+    inverses[0] = 1
+    return np.cumprod(powers), np.cumprod(inverses)
+
+def _gather(buf, start, width):
+    # Bytes start..start+width of each row as an (n, width) matrix (buf is zero-padded past its last line)
+    return buf[start[:, None] + np.arange(width)]
+
+def _parse_ints(buf, start, end, width):
+    # Unsigned decimal fields buf[start:end] of at most width digits as int64, and whether each one is well formed
+    length = end - start
+    ok = (length > 0) & (length <= width)
+
+    # Read the width bytes ending at each field, so digits line up with fixed place values
+    digits = _gather(buf, np.maximum(end - width, 0), width) - np.uint8(ZERO) # non-digits wrap past 9
+    inside = np.arange(width) >= width - length[:, None]
+    ok &= np.all(~inside | (digits <= 9), axis=1)
+    digits[~inside] = 0
+    return (digits @ PLACES[-width:]).astype(np.int64), ok
+
+def _parse_timestamps(buf, start, end):
+    # ISO 8601 timestamps (as written by datetime.isoformat, e.g. 2025-10-01T23:10:41.743326+00:00) as epoch seconds
+    head = _gather(buf, start, 19)
+    ok = (end - start >= 25) & (head[:, 4] == ord('-')) & (head[:, 10] == ord('T')) & (head[:, 13] == ord(':'))
+    head[~ok] = np.frombuffer(b'1970-01-01T00:00:00', dtype=np.uint8)
+    seconds = np.ascontiguousarray(head).view('S19').ravel().astype('datetime64[s]').astype(np.float64)
+
+    # Fraction is omitted when microseconds are 0; the UTC offset is always the last 6 characters
+    fraction, has_fraction = _parse_ints(buf, start + 20, start + 26, 6)
+    has_fraction &= buf[start + 19] == ord('.')
+    offset = _gather(buf, end - 6, 6).astype(np.int64) - ZERO
+    sign = np.where(offset[:, 0] == ord('-') - ZERO, -1, 1)
+    offset = sign * ((offset[:, 1] * 10 + offset[:, 2]) * 3600 + (offset[:, 4] * 10 + offset[:, 5]) * 60)
+    return seconds + np.where(has_fraction, fraction, 0) / 1e6 - offset, ok
+
+def _parse_chunk(buf, powers, inverses, hosts, host_ids):
+    # Columns of the complete lines in buf (a newline followed by PADDING zeros); lines that aren't records are skipped
+    ends = np.flatnonzero(buf == NEWLINE)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    tabs = np.flatnonzero(buf == TAB)
+    first = np.searchsorted(tabs, starts)
+    records = np.searchsorted(tabs, ends) - first == 5
+    starts, ends, first = starts[records], ends[records], first[records]
+    if not len(starts): return None
+    t = [tabs[first + k] for k in range(5)]
+
+    timestamp, ok = _parse_timestamps(buf, t[0] + 1, t[1])
+    content_length, ok_length = _parse_ints(buf, t[1] + 1, t[2], 15)
+    depth, ok_depth = _parse_ints(buf, t[2] + 1, t[3], 9)
+    status_code, ok_status = _parse_ints(buf, t[3] + 1, t[4], 4)
+
+    # Priority is written with 6 decimals: integer part, '.', fraction
+    whole, ok_whole = _parse_ints(buf, t[4] + 1, ends - 7, 9)
+    fraction, ok_fraction = _parse_ints(buf, ends - 6, ends, 6)
+    priority = whole + fraction / 1e6
+
+    ok &= ok_length & ok_depth & ok_status & ok_whole & ok_fraction & (buf[np.maximum(ends - 7, 0)] == ord('.'))
+    url_start, url_end = starts[ok], t[0][ok]
+
+    # Host: after '://' up to the first '/', '?' or '#' (or the end of the URL)
+    separators = np.flatnonzero((buf[:-2] == ord(':')) & (buf[1:-1] == ord('/')) & (buf[2:] == ord('/')))
+    separator = np.append(separators, len(buf))[np.searchsorted(separators, url_start)]
+    host_start = np.where(separator < url_end, separator + 3, url_start)
+    delimiters = np.flatnonzero((buf == ord('/')) | (buf == ord('?')) | (buf == ord('#')))
+    after = np.searchsorted(delimiters, host_start)
+    host_end = np.minimum(np.append(delimiters, len(buf))[after], url_end)
+    host_length = np.clip(host_end - host_start, 0, MAX_HOST_BYTES)
+    width = max(int(host_length.max()), 1)
+    host_bytes = _gather(buf, host_start, width)
+    host_bytes[np.arange(width) >= host_length[:, None]] = 0
+    unique, inverse = np.unique(np.ascontiguousarray(host_bytes).view(f'S{width}').ravel(), return_inverse=True)
+
+    # Hosts are few next to records, so they're mapped to global ids in Python
+    mapping = np.empty(len(unique), dtype=np.int64)
+    for index, host in enumerate(unique):
+        host = host.decode('utf-8', errors='replace')
+        if host not in host_ids:
+            host_ids[host] = len(hosts)
+            hosts.append(host)
+        mapping[index] = host_ids[host]
+
+    # URL fingerprint: polynomial hash of the URL bytes, from prefix sums rebased to each URL's start
+    sums = np.cumsum(buf.astype(np.uint64) * powers[:len(buf)])
+    sums = np.concatenate(([np.uint64(0)], sums))
+    url_hash = (sums[url_end] - sums[url_start]) * inverses[url_start]
+    url_hash ^= (url_end - url_start).astype(np.uint64) * np.uint64(0x9e3779b97f4a7c15)
+
+    return {
+        'timestamp': timestamp[ok],
+        'content_length': content_length[ok],
+        'depth': depth[ok].astype(np.int32),
+        'status_code': status_code[ok].astype(np.int16),
+        'priority': priority[ok],
+        'host_id': mapping[inverse.ravel()],
+        'url_hash': url_hash,
+    }
+
+def _parse_range(path, start, stop):
+    # Columns and hosts of the lines in bytes start..stop of a TSV log (start is a line start, stop a line end)
+    hosts, host_ids, chunks = [], {}, []
+    powers, inverses = None, None
+
+    with open(path, 'rb') as file, mmap(file.fileno(), 0, access=ACCESS_READ) as mapped:
+        buf = np.frombuffer(mapped, dtype=np.uint8)
+        position, chunk = start, None
+        while position < stop:
+            # Cut at the last newline in the chunk (or extend past one longer line)
+            end = mapped.rfind(b'\n', position, min(position + CHUNK_BYTES, stop))
+            if end < 0: end = mapped.find(b'\n', position, stop)
+            if end < 0: break # torn last line
+            chunk = np.concatenate((buf[position:end + 1], np.zeros(PADDING, dtype=np.uint8)))
+            if powers is None or len(powers) < len(chunk): powers, inverses = _powers(max(len(chunk), CHUNK_BYTES + PADDING))
+
+            columns = _parse_chunk(chunk, powers, inverses, hosts, host_ids)
+            if columns is not None: chunks.append(columns)
+            position = end + 1
+        del buf, chunk # release the buffer views before the map closes
+
+    return _concatenate(chunks), hosts
+
+def _ranges(path, processes):
+    # Split a log into about one byte range per process, cut after newlines
+    size = getsize(path)
+    step = max(size // processes, CHUNK_BYTES)
+    ranges, start = [], 0
+    with open(path, 'rb') as file, mmap(file.fileno(), 0, access=ACCESS_READ) as mapped:
+        while start < size:
+            end = mapped.find(b'\n', min(start + step, size - 1))
+            stop = size if end < 0 else end + 1
+            ranges.append((path, start, stop))
+            start = stop
+    return ranges
+
+def _load_tsv(paths, processes):
+    ranges = [part for path in paths if getsize(path) for part in _ranges(path, processes)]
+    if processes > 1 and len(ranges) > 1:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            parts = list(pool.map(_parse_range, *zip(*ranges)))
+    else:
+        parts = [_parse_range(*part) for part in ranges]
+
+    # Renumber each part's hosts into one host list
+    hosts, host_ids, chunks = [], {}, []
+    for columns, part_hosts in parts:
+        mapping = np.empty(len(part_hosts), dtype=np.int64)
+        for index, host in enumerate(part_hosts):
+            if host not in host_ids:
+                host_ids[host] = len(hosts)
+                hosts.append(host)
+            mapping[index] = host_ids[host]
+        columns['host_id'] = mapping[columns['host_id']]
+        chunks.append(columns)
+    return _concatenate(chunks), hosts
+
+def _load_binary(paths):
+    # Binary records are length-prefixed, so they're read record by record
+    hosts, host_ids, rows = [], {}, []
+    for path in paths:
+        for url, timestamp, content_length, depth, status_code, priority in read_binary_log(path):
+            host = urlsplit(url).netloc
+            if host not in host_ids:
+                host_ids[host] = len(hosts)
+                hosts.append(host)
+            rows.append((timestamp, content_length, depth, status_code, priority, host_ids[host], hash(url) & 0xffffffffffffffff))
+
+    if not rows: return _concatenate([]), hosts
+    columns = list(zip(*rows))
+    dtypes = (np.float64, np.int64, np.int32, np.int16, np.float64, np.int64, np.uint64)
+    return {name: np.array(column, dtype=dtype) for name, column, dtype in zip(COLUMNS, columns, dtypes)}, hosts
+
+def _concatenate(chunks):
+    if not chunks:
+        dtypes = (np.float64, np.int64, np.int32, np.int16, np.float64, np.int64, np.uint64)
+        return {name: np.empty(0, dtype=dtype) for name, dtype in zip(COLUMNS, dtypes)}
+    return {name: np.concatenate([chunk[name] for chunk in chunks]) for name in COLUMNS}
+
+def load_log(path, processes=1):
+    # Page log (TSV or binary .bin, including its rotated files) as ({column: array}, hosts);
+    # TSV logs are split into byte ranges parsed by a pool of processes when processes > 1
+    format = 'binary' if path.endswith('.bin') else 'tsv'
+    paths = [file for file in data_files(path, format) if exists(file)]
+    return _load_binary(paths) if format == 'binary' else _load_tsv(paths, processes)
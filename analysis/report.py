@@ -0,0 +1,99 @@
+from argparse import ArgumentParser
+from os import cpu_count
+from time import time
+
+import numpy as np
+
+from analysis.columns import load_log
+from utils.url import get_superdomain
+
+def throughput(columns, bucket):
+    # Pages and bytes per bucket of seconds since the first fetch (rows are logged in completion order, not sorted)
+    timestamp = columns['timestamp']
+    index = ((timestamp - timestamp.min()) // bucket).astype(np.int64)
+    pages = np.bincount(index)
+    size = np.bincount(index, weights=columns['content_length'])
+    return pages, size
+
+def status_mix(columns):
+    codes, counts = np.unique(columns['status_code'], return_counts=True)
+    order = np.argsort(-counts, kind='stable')
+    return codes[order], counts[order]
+
+def superdomain_bytes(columns, hosts):
+    # Bytes summed per host, then per superdomain (hosts are few, so only they go through get_superdomain)
+    host_bytes = np.bincount(columns['host_id'], weights=columns['content_length'], minlength=len(hosts))
+    superdomains, host_superdomain = np.unique([get_superdomain(host) for host in hosts] or [''], return_inverse=True)
+    size = np.bincount(host_superdomain.ravel()[:len(hosts)], weights=host_bytes, minlength=len(superdomains))
+    order = np.argsort(-size, kind='stable')
+    return superdomains[order], size[order]
+
+def depth_distribution(columns):
+    return np.bincount(columns['depth'])
+
+def priority_by_arrival(columns, groups):
+    # Mean priority of each slice of the log in arrival order, and the rank correlation between the two
+    priority = columns['priority']
+    count = len(priority)
+    group = np.arange(count) * groups // count
+    means = np.bincount(group, weights=priority, minlength=groups) / np.maximum(np.bincount(group, minlength=groups), 1)
+
+    # Spearman: Pearson correlation of ranks (arrival order is already a rank; tied priorities share their mean rank)
+    _, inverse, ties = np.unique(priority, return_inverse=True, return_counts=True)
+    ranks = (np.cumsum(ties) - (ties + 1) / 2)[inverse.ravel()]
+    correlation = np.corrcoef(np.arange(count), ranks)[0, 1] if count > 1 and priority.std() > 0 else 0.0
+    return means, correlation
+
+def duplicate_ratio(columns):
+    count = len(columns['url_hash'])
+    return 1 - len(np.unique(columns['url_hash'])) / count if count else 0.0
+
+def report(path, bucket=60, top=20, groups=10, processes=1):
+    start = time()
+    columns, hosts = load_log(path, processes)
+    load_time = time() - start
+    count = len(columns['timestamp'])
+
+    print(f'Log: {path}')
+    print(f'Records: {count} ({len(hosts)} hosts, parsed in {load_time:.2f} seconds)')
+    if not count: return
+
+    pages, size = throughput(columns, bucket)
+    span = columns['timestamp'].max() - columns['timestamp'].min()
+    print(f'\nThroughput ({bucket}s buckets, {span:.2f} seconds total):')
+    for index, (bucket_pages, bucket_size) in enumerate(zip(pages, size)):
+        print(f'{index * bucket:>8}s  {bucket_pages / bucket:8.2f} pages/s  {bucket_size / bucket / 1e6:8.2f} MB/s')
+
+    codes, counts = status_mix(columns)
+    print('\nStatus codes:')
+    for code, code_count in zip(codes, counts):
+        print(f'{code} responses: {code_count} ({code_count / count:.1%})')
+
+    superdomains, superdomain_size = superdomain_bytes(columns, hosts)
+    print(f'\nBytes per superdomain (top {top} of {len(superdomains)}):')
+    for superdomain, total in zip(superdomains[:top], superdomain_size[:top]):
+        print(f'{superdomain}: {int(total)}')
+
+    print('\nDepth distribution:')
+    for depth, depth_count in enumerate(depth_distribution(columns)):
+        if depth_count: print(f'Depth {depth}: {depth_count}')
+
+    means, correlation = priority_by_arrival(columns, groups)
+    print(f'\nPriority by arrival order ({groups} slices, rank correlation {correlation:.3f}):')
+    for index, mean in enumerate(means):
+        print(f'{index * 100 // groups:>3}%  {mean:.6f}')
+
+    print(f'\nDuplicate ratio: {duplicate_ratio(columns):.4%}')
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Summarize a crawl log (TSV, or binary .bin)')
+    parser.add_argument('paths', nargs='+', help='log files (rotated files are included)')
+    parser.add_argument('--bucket', type=int, default=60, help='seconds per throughput bucket')
+    parser.add_argument('--top', type=int, default=20, help='superdomains listed by bytes')
+    parser.add_argument('--groups', type=int, default=10, help='arrival-order slices for the priority trend')
+    parser.add_argument('--processes', type=int, default=cpu_count(), help='processes parsing TSV logs')
+    args = parser.parse_args()
+
+    for index, path in enumerate(args.paths):
+        if index: print()
+        report(path, args.bucket, args.top, args.groups, args.processes)
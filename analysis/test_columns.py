@@ -0,0 +1,68 @@
+from datetime import datetime
+from itertools import islice
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import numpy as np
+import pytest
+
+import analysis.columns
+from analysis.columns import load_log
+from analysis.report import status_mix, depth_distribution, duplicate_ratio
+from logger.sink import LogSink
+
+def reference(lines):
+    # Slow per-line parse of TSV records, to check the vectorized one against
+    rows = []
+    for line in lines:
+        url, timestamp, content_length, depth, status_code, priority = line.rstrip('\n').split('\t')
+        rows.append((url, datetime.fromisoformat(timestamp).timestamp(), int(content_length), int(depth), int(status_code), float(priority)))
+    return rows
+
+def check(columns, hosts, rows):
+    assert len(columns['timestamp']) == len(rows)
+    assert np.allclose(columns['timestamp'], [row[1] for row in rows], rtol=0, atol=1e-5)
+    assert columns['content_length'].tolist() == [row[2] for row in rows]
+    assert columns['depth'].tolist() == [row[3] for row in rows]
+    assert columns['status_code'].tolist() == [row[4] for row in rows]
+    assert np.allclose(columns['priority'], [row[5] for row in rows], rtol=0, atol=1e-6)
+    assert [hosts[host_id] for host_id in columns['host_id']] == [urlsplit(row[0]).netloc for row in rows]
+
+@pytest.fixture
+def log_lines():
+    # A slice of the bundled crawl log (including ftp:// URLs), plus records in other time zones and a bad line
+    with open(Path(__file__).parent.parent / 'crawl_log1.txt', encoding='utf-8') as log: lines = list(islice(log, 2000))
+    return lines + [
+        'https://example.com/caf\xe9?q=1\t2025-10-01T23:10:41-04:30\t5\t3\t404\t12.250000\n',
+        'not a record\n',
+        'https://example.com/\t2025-10-01T23:10:41.500000+02:00\t7\t1\t200\t0.100000\n',
+    ]
+
+def test_tsv_log(tmp_path, log_lines, monkeypatch):
+    path = tmp_path / 'crawl_log.txt'
+    path.write_text(''.join(log_lines) + 'https://torn.example.com/\t2025', encoding='utf-8')
+    rows = reference(line for line in log_lines if line != 'not a record\n')
+
+    # Small chunks, so records are parsed across many vectorized passes
+    monkeypatch.setattr(analysis.columns, 'CHUNK_BYTES', 4096)
+    check(*load_log(str(path)), rows)
+
+def test_binary_log(tmp_path, log_lines):
+    rows = reference(line for line in log_lines if line != 'not a record\n')
+    sink = LogSink(str(tmp_path / 'crawl_log.txt'), format='binary')
+    for url, _, content_length, depth, status_code, priority in rows: sink.record(url, None, content_length, depth, status_code, priority)
+    sink.close()
+
+    columns, hosts = load_log(str(tmp_path / 'crawl_log.bin'))
+    check(columns, hosts, [row[:1] + (0.0,) + row[2:] for row in rows])
+
+def test_report_columns():
+    columns = {
+        'status_code': np.array([200, 404, 200, 200], dtype=np.int16),
+        'depth': np.array([0, 1, 1, 3], dtype=np.int32),
+        'url_hash': np.array([1, 2, 2, 3], dtype=np.uint64),
+    }
+    codes, counts = status_mix(columns)
+    assert codes.tolist() == [200, 404] and counts.tolist() == [3, 1]
+    assert depth_distribution(columns).tolist() == [1, 2, 0, 1]
+    assert duplicate_ratio(columns) == 0.25
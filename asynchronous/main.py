@@ -1,45 +1,80 @@
-from asyncio import run, get_event_loop
-from collections import defaultdict
-from heapq import heappush, heappop
+from asyncio import run, get_running_loop
+from os.path import join
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
 
 from aiohttp import ClientSession
 
 from query.ddg import query_ddg
-from fetcher.robots import is_allowed
+from frontier.politeness import Frontier
+from checkpoint.journal import Checkpoint, restore
+from fetcher.connection import make_connector
+from fetcher.dns import default_dns
+from fetcher.robots import is_allowed, RobotsCache, AsyncRobotsResolver
 from utils.url import clean_url, is_valid_url, is_cgi_url, is_blocked_extension
+from utils.priority import make_host_scorer
+from utils.seen import new_seen_store
+from utils.state import Accumulator, ThreadCounts, StripedCounts, StripedSets
+from utils.concurrency import ConcurrencyLimit
+from utils.health import HostHealth
+from utils.simhash import SimHashIndex
+from utils.traps import TrapDetector
 from logger.log import log_summary
-from asynchronous.worker import crawl_pages
-from config import QUERY, MAX_PAGES, MAX_TIMEOUTS, MAX_CONCURRENT_REQUESTS, DEBUG
+from logger.sink import LogSink
+from asynchronous.worker import crawl_with_tasks
+from config import QUERY, MAX_PAGES, MAX_TIME, MAX_CONCURRENT_REQUESTS, ADAPTIVE_CONCURRENCY, NEAR_DUPLICATES, PARSE_PROCESSES, CHECKPOINT_DIR, CHECKPOINT_INTERVAL, DEBUG
 
-async def main():
+async def main(resume=False, seeds=None, max_concurrent=MAX_CONCURRENT_REQUESTS, max_pages=MAX_PAGES, max_time=MAX_TIME, adaptive=ADAPTIVE_CONCURRENCY):
     shared_state = {
-        # Limits
-        'max_timeouts': MAX_TIMEOUTS,
-        
         # URL states
-        'scheduled': set(),     # URLs scheduled to be visited (in heap)
-        'visited': set(),       # URLs that were fetched
-        'disallowed': set(),    # URLs blocked by robots.txt
-        'robots_cache': {},     # Stores robot parser per domain
-        'timeout_counts': {},   # Count timeout-related fetch failures per domain
+        'scheduled': new_seen_store(),  # URLs scheduled to be visited (in frontier)
+        'visited': new_seen_store(),    # URLs that were fetched
+        'disallowed': new_seen_store(), # URLs blocked by robots.txt
+        'robots_cache': RobotsCache(), # Compiled robots.txt rules per host (bounded LRU)
+        'near_duplicates': SimHashIndex() if NEAR_DUPLICATES else None, # Content fingerprints of crawled pages
+        'traps': TrapDetector(),        # Per-host URL budgets and link yield (crawler-trap heuristics)
+        'host_health': HostHealth(),   # Circuit breaker per host (backoff, then drop after repeated failures)
         
-        # Stats (for log)
-        'total_bytes': 0,                           # Total bytes of fetched pages
-        'status_counts': {},                        # Count responses per HTTP status code
-        'domain_crawl_counts': {},                  # Count pages successfully crawled per domain
-        'superdomain_domains': defaultdict(set),    # Track unique domains under each superdomain
+        # Stats (for log; same thread-safe types as the multithreaded version so logging is shared)
+        'total_bytes': Accumulator(),               # Total bytes of fetched pages
+        'status_counts': ThreadCounts(),            # Count responses per HTTP status code
+        'domain_crawl_counts': StripedCounts(),     # Count pages successfully crawled per domain
+        'superdomain_domains': StripedSets(),       # Track unique domains under each superdomain
+
+        # Exit flag
+        'exit': False,  # Set once page or time limit is reached
     }
 
     if DEBUG:
         shared_state.update({
-            'skipped_invalid': 0,   # Total invalid URLs skipped
-            'skipped_dupes': 0,     # Total duplicate URLs skipped
-            'skipped_robots': 0,    # Total robots-blocked URLs skipped
-            'skipped_timeout': 0,   # Total URLs skipped due to timeout failures
+            'skipped_invalid': Accumulator(),   # Total invalid URLs skipped
+            'skipped_dupes': Accumulator(),     # Total duplicate URLs skipped
+            'skipped_robots': Accumulator(),    # Total robots-blocked URLs skipped
+            'skipped_timeout': Accumulator(),   # Total URLs skipped due to hosts dropped after failures
+            'skipped_near_dupes': Accumulator(), # Total near-duplicate pages whose links were not expanded
+            'skipped_traps': Accumulator(),     # Total URLs skipped over their host's discovered-URL budget
         })
+
+    # Reload state and frontier from the last checkpoint (before anything holds on to the robots cache)
+    checkpoint_dir, elapsed, restored = join(CHECKPOINT_DIR, 'asynchronous'), 0, []
+    if resume: restored, elapsed = restore(shared_state, checkpoint_dir)
+    shared_state['checkpoint'] = Checkpoint(checkpoint_dir, resume=resume) if CHECKPOINT_INTERVAL else None
     
-    seeds = query_ddg(QUERY, max_results=10)
-    max_heap = [] # Simulated max-heap using -priority
+    # Optional process pool for decoding and link extraction (scales parsing across cores)
+    if PARSE_PROCESSES: shared_state['parse_pool'] = ProcessPoolExecutor(max_workers=PARSE_PROCESSES)
+
+    # Adjusts the number of in-flight fetches at runtime, starting from max_concurrent
+    limiter = shared_state['concurrency'] = ConcurrencyLimit(max_concurrent) if adaptive else None
+
+    if seeds is None: seeds = query_ddg(QUERY, max_results=10) if not resume else [] # a resumed crawl continues from its checkpointed frontier
+    frontier = Frontier(shared_state['robots_cache'], make_host_scorer(shared_state), journal=shared_state['checkpoint'], health=shared_state['host_health'], dns=default_dns) # Per-host back queues, hosts re-scored on pop
+
+    # Requeue checkpointed items (they passed the robots.txt check when first enqueued)
+    for item in restored:
+        if item[1] in shared_state['scheduled'] or item[1] in shared_state['visited']: continue
+        frontier.push(item)
+        shared_state['scheduled'].add(item[1])
+    if resume: print(f'[RESUME] Restored {len(shared_state["visited"])} visited pages and {len(frontier)} frontier items')
     
     # Seed initial crawl queue
     for seed in seeds:
@@ -48,7 +83,7 @@ async def main():
 
         # Skip if already handled or invalid
         if (
-            seed in shared_state['scheduled']       # Already in heap
+            seed in shared_state['scheduled']       # Already in frontier
             or seed in shared_state['disallowed']   # Blocked by robots.txt
             or not is_valid_url(seed)               # Invalid scheme
             or is_cgi_url(seed)                     # CGI script
@@ -62,31 +97,31 @@ async def main():
             if DEBUG: print('Skipping', seed)
             continue
         
-        heappush(max_heap, (0, seed, 0)) # (-priority, url, depth)
+        frontier.push((0, seed, 0)) # (-priority, url, depth)
         shared_state['scheduled'].add(seed)
     
-    start_time = get_event_loop().time()
-    log = open('log_async.txt', 'w')
+    start_time = get_running_loop().time() - elapsed # counts time already spent before a resume
+    log = LogSink('log_async.txt', append=resume) # buffered, written by a background thread
 
-    async with ClientSession() as session:
-        # Crawl loop using max heap (priority-based BFS)
-        while max_heap and len(shared_state['visited']) < MAX_PAGES:
-            # Prepare batch of next URLs to fetch
-            batch = []
-            while max_heap and len(batch) < MAX_CONCURRENT_REQUESTS and len(shared_state['visited']) + len(batch) < MAX_PAGES:
-                batch.append(heappop(max_heap))
+    # Keep-alive connections capped per host, resolved through the shared DNS cache
+    async with ClientSession(connector=make_connector(limiter.maximum if limiter is not None else max_concurrent)) as session:
+        # Background robots.txt resolver (shares robots cache, parks links to unresolved hosts)
+        shared_state['robots_resolver'] = AsyncRobotsResolver(shared_state['robots_cache'], session)
 
-            # Fetch concurrently
-            links = await crawl_pages(batch, shared_state, log, session)
+        # Crawl loop over the frontier (priority-based BFS, polite per host) with a continuously refilled task pool
+        await crawl_with_tasks(frontier, shared_state, log, session, max_concurrent, max_pages, max_time, start_time)
 
-            # Enqueue new links
-            for link in links:
-                heappush(max_heap, link)
+    default_dns.shutdown()
 
     # Log crawl summary
-    total_time = get_event_loop().time() - start_time
+    total_time = get_running_loop().time() - start_time
     log_summary(log, shared_state, total_time)
     log.close()
+    frontier.close()
+    if PARSE_PROCESSES: shared_state['parse_pool'].shutdown()
+    if shared_state['checkpoint'] is not None: shared_state['checkpoint'].close()
 
 if __name__ == '__main__':
-    run(main())
\ No newline at end of file
+    parser = ArgumentParser(description='Asynchronous web crawler')
+    parser.add_argument('--resume', action='store_true', help='continue the last crawl from its checkpoint')
+    run(main(parser.parse_args().resume))
\ No newline at end of file
@@ -0,0 +1,108 @@
+from asyncio import run, sleep, all_tasks, current_task, get_running_loop
+from datetime import datetime, timezone
+
+import pytest
+
+import asynchronous.worker
+import fetcher.robots
+from asynchronous.worker import crawl_with_tasks
+from fetcher.robots import AsyncRobotsResolver
+from frontier.politeness import Frontier
+from multithread.main import new_state
+
+class PageRecorder:
+    # Stands in for the page log
+    def __init__(self):
+        self.urls = []
+
+    def write(self, line):
+        self.urls.append(line.split('\t', 1)[0])
+
+    def flush(self):
+        pass
+
+class StubWeb:
+    # Fetches take delay seconds (slow_delay for URLs containing 'slow'); each page links to `links` new hosts
+    def __init__(self, delay=0.01, slow_delay=0.5, links=0):
+        self.delay = delay
+        self.slow_delay = slow_delay
+        self.links = links
+        self.started = []
+        self.finished = [] # (loop time, url)
+        self.next_host = 0
+
+    async def fetch(self, url, session, decode=True):
+        self.started.append(url)
+        await sleep(self.slow_delay if 'slow' in url else self.delay)
+        self.finished.append((get_running_loop().time(), url))
+
+        hosts = range(self.next_host, self.next_host + self.links)
+        self.next_host += self.links
+        html = '<html><body>' + ''.join(f'<a href="http://host{index}.com">link</a>' for index in hosts) + '</body></html>'
+        meta = {'status_code': 200, 'content_length': len(html), 'content_type': 'text/html', 'timestamp': datetime.now(timezone.utc).isoformat()}
+        return url, html, meta
+
+@pytest.fixture
+def web(monkeypatch):
+    web = StubWeb()
+    monkeypatch.setattr(asynchronous.worker, 'fetch_page_async', web.fetch)
+
+    # Every host allows everything
+    async def fetch_robots(*args): return None
+    monkeypatch.setattr(fetcher.robots, '_fetch_robots_async', fetch_robots)
+    return web
+
+def crawl(seeds, max_tasks=2, max_pages=1000, max_time=60):
+    # Run crawl_with_tasks from the seeds ((priority, url) pairs); returns the state, log and seconds taken
+    state, log = new_state(), PageRecorder()
+
+    async def main():
+        state['robots_resolver'] = AsyncRobotsResolver(state['robots_cache'], session=None)
+        frontier = Frontier(state['robots_cache'], min_delay=0, memory_items=0)
+        for priority, url in seeds:
+            frontier.push((priority, url, 0))
+            state['scheduled'].add(url)
+
+        start_time = get_running_loop().time()
+        await crawl_with_tasks(frontier, state, log, None, max_tasks, max_pages, max_time, start_time)
+
+        # Nothing is left running once the crawl returns
+        assert all_tasks() == {current_task()}
+        return get_running_loop().time() - start_time
+
+    return state, log, run(main())
+
+def test_slow_fetch_does_not_hold_up_other_slots(web):
+    seeds = [(-1, 'http://slow.com')] + [(0, f'http://fast{index}.com') for index in range(10)]
+    _, log, elapsed = crawl(seeds, max_tasks=2)
+    assert len(log.urls) == 11
+
+    # The other slot kept refilling while the slow fetch was in flight
+    slow_finished = dict((url, time) for time, url in web.finished)['http://slow.com']
+    assert all(time < slow_finished for time, url in web.finished if url != 'http://slow.com')
+    assert elapsed < web.slow_delay + 10 * web.delay
+
+def test_max_pages_stops_admission(web):
+    web.links = 3
+    state, log, _ = crawl([(0, 'http://start.com')], max_tasks=4, max_pages=10)
+    assert len(state['visited']) == 10
+    assert len(web.started) == 10
+    assert len(log.urls) == 10
+    assert state['exit']
+
+def test_max_time_stops_admission(web):
+    web.links, web.delay = 3, 0.05
+    state, _, elapsed = crawl([(0, 'http://start.com')], max_tasks=2, max_time=0.3)
+    assert state['exit']
+    assert 0.3 <= elapsed < 0.3 + 4 * web.delay
+    assert len(web.started) <= 2 * (0.3 / web.delay + 1)
+
+def test_in_flight_fetches_finish_before_return(web):
+    # The time limit is hit while the slow fetch is still running
+    web.links = 3
+    seeds = [(-1, 'http://slow.com'), (0, 'http://start.com')]
+    state, log, elapsed = crawl(seeds, max_tasks=2, max_time=0.1)
+    assert elapsed >= web.slow_delay
+    assert len(web.finished) == len(web.started)
+    assert 'http://slow.com' in log.urls
+    assert len(state['visited']) == len(web.started)
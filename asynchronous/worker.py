@@ -1,138 +1,189 @@
-from asyncio import gather
+from asyncio import wait, sleep, create_task, get_running_loop, FIRST_COMPLETED
+from time import time
 from urllib.parse import urlsplit
 
 from fetcher.page import fetch_page_async
-from fetcher.robots import is_allowed_async
-from parser.html import extract_links
-from utils.url import clean_url, get_superdomain, is_valid_url, is_cgi_url, is_blocked_extension
-from utils.priority import compute_priority
+from parser.links import extract_candidates, parse_page
+from utils.url import canonicalize
+from utils.admission import admit_link
 from logger.log import log_url
-from config import DEBUG
+from config import ROBOTS_POLL_INTERVAL, DEBUG
 
 async def crawl_page(item, state, log, session):
     priority, url, depth = item
 
-    # Fetch first to resolve any redirects
-    final_url, html, meta = await fetch_page_async(url, session)
-    final_url = clean_url(final_url)
+    # Fetch first to resolve any redirects (raw bytes if the parse process pool decodes them)
+    parse_pool = state.get('parse_pool')
+    fetch_start = get_running_loop().time()
+    final_url, html, meta = await fetch_page_async(url, session, decode=parse_pool is None)
 
-    # Extract domain and superdomain
+    # Feed latency and load-related failures (timeouts, connection errors, 429) to the concurrency controller
+    limiter = state.get('concurrency')
+    if limiter is not None: limiter.record(get_running_loop().time() - fetch_start, meta['status_code'] in (0, 429))
+
+    # Track host health (the frontier holds back hosts in backoff and discards dropped ones)
+    state['host_health'].record(urlsplit(url).netloc, meta)
+
+    # Normalize final URL and extract domain and superdomain (domain is the requested URL's host)
+    final_url, _, superdomain, _, _ = canonicalize(final_url)
     domain = urlsplit(url).netloc
-    superdomain = get_superdomain(final_url)
 
-    # Skip if already in robots block list
-    if not await is_allowed_async(final_url, state['robots_cache'], session):
+    # Skip if already in robots block list (awaits the shared robots.txt fetch if unresolved)
+    if not await state['robots_resolver'].wait(final_url):
         state['disallowed'].add(final_url)
         if DEBUG: print('Skipping', final_url)
         return []
 
-    # Skip if already visited
-    if final_url in state['visited']:
+    # Skip if already visited (another task may have landed on the same page through a redirect)
+    if not state['visited'].check_and_add(final_url):
         if DEBUG: print('Skipping', final_url)
         return []
-    state['visited'].add(final_url)
-
-    # Count timeout-related failures (status 0 and no content)
-    if meta['status_code'] == 0 and meta['content_length'] == 0:
-        state['timeout_counts'][domain] = state['timeout_counts'].get(domain, 0) + 1
 
     # Log result
     log_url(log, final_url, meta, depth, -priority)
     
     # Update crawl stats
-    state['total_bytes'] += meta['content_length']
-    state['status_counts'][meta['status_code']] = state['status_counts'].get(meta['status_code'], 0) + 1
+    state['total_bytes'].add(meta['content_length'])
+    state['status_counts'].add(meta['status_code'])
+
+    # Journal the visit so a resumed crawl rebuilds the same stats
+    checkpoint = state.get('checkpoint')
+    if checkpoint is not None: checkpoint.visited(final_url, domain, superdomain, meta, meta['status_code'] == 200 and bool(html))
 
     # Skip link extraction if fetch failed or content missing (or not html)
     if meta['status_code'] != 200 or not html: return []
 
     # Increment successful crawl count per domain
-    state['domain_crawl_counts'][domain] = state['domain_crawl_counts'].get(domain, 0) + 1
+    state['domain_crawl_counts'].add(domain)
 
     # Track unique domains per superdomain
-    state['superdomain_domains'][superdomain].add(domain)
+    state['superdomain_domains'].add(superdomain, domain)
+
+    # Extract, normalize and validate child links, and fingerprint the content (in a worker process if the parse pool is enabled)
+    near_duplicates = state.get('near_duplicates')
+    if limiter is not None: limiter.parse_started()
+    try:
+        if parse_pool is None: candidates, invalid, fingerprint = extract_candidates(html, final_url, fingerprint=near_duplicates is not None)
+        else: candidates, invalid, fingerprint = await get_running_loop().run_in_executor(parse_pool, parse_page, html, meta['content_type'], final_url, near_duplicates is not None)
+    except Exception as e:
+        if DEBUG: print(f'[ERROR] Failed to parse {final_url}: {e}')
+        return []
+    finally:
+        if limiter is not None: limiter.parse_finished()
+    if DEBUG: state['skipped_invalid'].add(invalid)
+
+    # Don't expand links of a near-duplicate of an already crawled page (it's logged all the same)
+    if fingerprint is not None and not near_duplicates.check_and_add(fingerprint):
+        if DEBUG:
+            print('Skipping links of near-duplicate', final_url)
+            state['skipped_near_dupes'].add()
+        return []
 
-    # Extract and enqueue child links
+    # Enqueue child links
     result = []
-    links = extract_links(html, final_url)
-    for link in links:
-        # Normalize URL: strip query, fragment, and trailing slash
-        link = clean_url(link)
+    for link, link_domain, link_superdomain in candidates:
+        item = admit_link(state, link, link_domain, link_superdomain, depth + 1, domain)
+        if item is not None: result.append(item)
+    state['traps'].page_expanded(domain)
 
-        # Extract domain and superdomain
-        link_domain = urlsplit(link).netloc
-        link_superdomain = get_superdomain(link)
+    # Return new links
+    return result
 
-        # Skip if invalid (bad scheme, CGI path, or blocked extension)
-        if not is_valid_url(link) or is_cgi_url(link) or is_blocked_extension(link):
-            if DEBUG:
-                print('Skipping', link)
-                state['skipped_invalid'] += 1
-            continue
-        
-        # Skip if already scheduled (in heap)
-        if link in state['scheduled']:
-            if DEBUG:
-                print('Skipping', link)
-                state['skipped_dupes'] += 1
+async def crawl_with_tasks(frontier, state, log, session, max_tasks, max_pages, max_time, start_time):
+    resolver = state['robots_resolver']
+    limiter = state.get('concurrency') # adapts the number of in-flight fetches (fixed at max_tasks if unset)
+    tasks = {} # task -> URL being crawled
+
+    # Fill the initial set of crawl tasks
+    _fill_task_pool(tasks, frontier, state, log, session, _pool_size(state, max_tasks), max_pages, max_time, start_time)
+
+    # Steady-state loop (start a new fetch as soon as any finishes)
+    while tasks or ((frontier or resolver.has_pending()) and not state['exit']):
+        if tasks:
+            # Wait for at least one task to finish (or the next host to become ready)
+            done, _ = await wait(tasks, timeout=_wait_timeout(frontier), return_when=FIRST_COMPLETED)
+        else:
+            # All queued hosts are in their politeness delay or waiting on robots.txt
+            done = set()
+            if frontier: await sleep(_wait_timeout(frontier))
+            else: await resolver.wait_ready()
+
+        # Enqueue new links from each task right away and free its host for the next fetch
+        # (the URL stays scheduled until its fetch is done, so it can't be enqueued again meanwhile)
+        for task in done:
+            url = tasks.pop(task)
+            frontier.done(url)
+            state['scheduled'].discard(url)
+            for link in task.result():
+                frontier.push(link)
+
+        # Enqueue parked links whose robots.txt has resolved
+        for link in release_pending(state):
+            frontier.push(link)
+
+        # Refill task pool (up to the current concurrency limit)
+        _fill_task_pool(tasks, frontier, state, log, session, _pool_size(state, max_tasks), max_pages, max_time, start_time)
+        if limiter is not None: limiter.in_flight(len(tasks))
+
+        # Periodic checkpoint (copied here, written in the background while tasks keep running)
+        if state.get('checkpoint') is not None: state['checkpoint'].maybe_snapshot(state, frontier, get_running_loop().time() - start_time)
+
+def _wait_timeout(frontier):
+    # Sleep until the next waiting host is ready, but keep polling pending robots.txt
+    # (ready hosts left undispatched mean the pool is full, so they don't shorten the wait)
+    next_ready = frontier.next_ready_time()
+    if next_ready is None or next_ready <= time(): return ROBOTS_POLL_INTERVAL
+    return min(ROBOTS_POLL_INTERVAL, next_ready - time())
+
+def _pool_size(state, max_tasks):
+    # Fetches to keep in flight (set by the concurrency controller if there is one)
+    limiter = state.get('concurrency')
+    return limiter.value if limiter is not None else max_tasks
+
+def _fill_task_pool(tasks, frontier, state, log, session, max_tasks, max_pages, max_time, start_time):
+    # Fill up task pool to capacity
+    while len(tasks) < max_tasks:
+        # Exit early if no more URLs to crawl
+        if not frontier: break
+
+        # Exit if max limits reached
+        page_count, total_time = len(state['visited']), get_running_loop().time() - start_time
+        if page_count >= max_pages or total_time >= max_time:
+            if not state['exit']: print(f'[EXIT] Reached limit — fetched {page_count} pages in {total_time:.2f} seconds')
+            state['exit'] = True
+            break
+
+        # Don't start more fetches than pages left (in-flight fetches count toward the limit)
+        if page_count + len(tasks) >= max_pages: break
+
+        # Pop next item from a host that is ready (None if every host is in its politeness delay)
+        item = frontier.pop()
+        if item is None: break
+
+        # Skip if already visited (e.g. reached through a redirect)
+        priority, url, depth = item
+        if url in state['visited']:
+            frontier.done(url)
+            state['scheduled'].discard(url)
             continue
 
-        # Skip if already fetched
-        if link in state['visited']:
-            if DEBUG:
-                print('Skipping', link)
-                state['skipped_dupes'] += 1
-            continue
+        # Start crawl task on the event loop
+        tasks[create_task(crawl_page((priority, url, depth), state, log, session))] = url
 
-        # Skip if already in robots block list
-        if link in state['disallowed']:
-            if DEBUG:
-                print('Skipping', link)
-                state['skipped_robots'] += 1
-            continue
-
-        # Skip if domain already exceeded timeout failure limit
-        if state['timeout_counts'].get(link_domain, 0) >= state['max_timeouts']:
-            if DEBUG:
-                print('Skipping', link)
-                state['skipped_timeout'] += 1
-            continue
+def release_pending(state):
+    result = []
 
-        # Skip if blocked by robots.txt
-        if not await is_allowed_async(link, state['robots_cache'], session):
-            state['disallowed'].add(link)
+    # Collect parked links whose robots.txt has resolved
+    for item, allowed in state['robots_resolver'].drain():
+        # Move disallowed links from the scheduled set to the robots block list
+        if not allowed:
+            state['scheduled'].discard(item[1])
+            state['disallowed'].add(item[1])
             if DEBUG:
-                print('Skipping', link)
-                state['skipped_robots'] += 1
+                print('Skipping', item[1])
+                state['skipped_robots'].add()
             continue
+        result.append(item)
 
-        # Get the domain's current crawl count
-        domain_crawl_count = state['domain_crawl_counts'].get(link_domain, 0)
-        
-        # Add domain to its superdomain set and get unique count
-        state['superdomain_domains'][link_superdomain].add(link_domain)
-        superdomain_domain_count = len(state['superdomain_domains'][link_superdomain])
-        
-        # Compute priority
-        priority = compute_priority(domain_crawl_count, superdomain_domain_count)
-        
-        # Enqueue
-        state['scheduled'].add(link)
-        result.append((-priority, link, depth + 1))
-
-    # Return new links
-    return result
-
-async def crawl_pages(batch, state, log, session):
-    result = []
-
-    # Submit all URLs in the batch to be processed concurrently
-    tasks = [crawl_page(item, state, log, session) for item in batch]
-    
-    # Wait for all tasks to complete
-    for links in await gather(*tasks):
-        # Add new links from each task
-        result.extend(links)
-
-    # Return all new links
+    # Return released links
     return result
\ No newline at end of file
@@ -0,0 +1,61 @@
+from asyncio import run
+from json import dump
+from sys import argv
+from time import time, perf_counter
+
+import multithread.worker
+import asynchronous.worker
+from multithread.main import main as multithread_main
+from asynchronous.main import main as asynchronous_main
+
+# Runs one crawl engine in its own process for the benchmark (so CPU time and peak RSS are the engine's alone):
+# python -m benchmark.engine ENGINE CONCURRENCY ADAPTIVE(0/1) MAX_PAGES MAX_TIME RESULT_FILE SEED...
+
+def _timed(fetch, latencies):
+    def timed_fetch(*args, **kwargs):
+        start = perf_counter()
+        try: return fetch(*args, **kwargs)
+        finally: latencies.append(perf_counter() - start)
+    return timed_fetch
+
+def _timed_async(fetch, latencies):
+    async def timed_fetch(*args, **kwargs):
+        start = perf_counter()
+        try: return await fetch(*args, **kwargs)
+        finally: latencies.append(perf_counter() - start)
+    return timed_fetch
+
+def _percentile(values, fraction):
+    if not values: return 0
+    values = sorted(values)
+    return values[min(int(fraction * len(values)), len(values) - 1)]
+
+def run_engine(engine, concurrency, adaptive, max_pages, max_time, seeds):
+    # Crawl with per-fetch timing (the worker modules look their fetch function up on every call)
+    latencies = []
+    start = time()
+    if engine == 'multithread':
+        multithread.worker.fetch_page = _timed(multithread.worker.fetch_page, latencies)
+        multithread_main(seeds=seeds, num_threads=concurrency, max_pages=max_pages, max_time=max_time, adaptive=adaptive)
+        log_path = 'log.txt'
+    else:
+        asynchronous.worker.fetch_page_async = _timed_async(asynchronous.worker.fetch_page_async, latencies)
+        run(asynchronous_main(seeds=seeds, max_concurrent=concurrency, max_pages=max_pages, max_time=max_time, adaptive=adaptive))
+        log_path = 'log_async.txt'
+    elapsed = time() - start
+
+    with open(log_path, encoding='utf-8', errors='replace') as log:
+        pages = sum(1 for line in log if line.count('\t') == 5)
+    return {
+        'pages': pages,
+        'elapsed': elapsed,
+        'fetches': len(latencies),
+        'latency_p50': _percentile(latencies, 0.5),
+        'latency_p99': _percentile(latencies, 0.99),
+    }
+
+if __name__ == '__main__':
+    engine, concurrency, adaptive, max_pages, max_time, result_path, *seeds = argv[1:]
+    result = run_engine(engine, int(concurrency), adaptive == '1', int(max_pages), float(max_time), seeds)
+    with open(result_path, 'w') as file:
+        dump(result, file)
@@ -0,0 +1,94 @@
+from asyncio import new_event_loop, sleep
+from multiprocessing import Process, Event
+from random import Random
+
+from aiohttp import web
+
+from simulation.graph import SyntheticGraph
+
+def farm_hosts(count, port):
+    # One loopback address per virtual host (127.0.1.1, 127.0.1.2, ...), so each is its own host to the crawler
+    # (Linux routes all of 127.0.0.0/8 to the loopback interface)
+    return [f'127.0.{1 + index // 254}.{1 + index % 254}:{port}' for index in range(count)]
+
+# Local HTTP server farm serving a synthetic link graph over many virtual hosts. Per host: latency (log-normal),
+# gzip or not, and robots.txt rules; per page: redirects and hung responses (longer than the crawler's timeout).
+# Bodies are padded to a realistic size so decoding, decompression and parsing cost what they would live.
+class Farm:
+    def __init__(self, hosts=200, port=8700, latency=0.05, gzip=0.5, disallow=0.2, crawl_delay=0.05, redirect=0.03, hang=0.005, hang_seconds=10, page_bytes=20000, seed=0):
+        self.names = farm_hosts(hosts, port)
+        self.graph = SyntheticGraph(names=self.names, seed=seed)
+        self.port = port
+        self.latency = latency              # median seconds before a host answers
+        self.gzip = gzip                    # share of hosts that compress (when the client accepts gzip)
+        self.disallow = disallow            # share of hosts whose robots.txt disallows part of the site
+        self.crawl_delay = crawl_delay      # share of hosts asking for a 2 second Crawl-delay
+        self.redirect = redirect            # share of pages redirecting to another page on their host
+        self.hang = hang                    # share of pages that never answer in time
+        self.hang_seconds = hang_seconds
+        self.page_bytes = page_bytes        # median page size
+        self.seed = seed
+        self.process = None
+
+    def seeds(self, count=10):
+        return self.graph.seeds(count)
+
+    def start(self):
+        # Serve from a separate process (so its CPU isn't counted against the crawler); returns once listening
+        ready = Event()
+        self.process = Process(target=self._serve, args=(ready,), daemon=True)
+        self.process.start()
+        ready.wait()
+
+    def stop(self):
+        self.process.terminate()
+        self.process.join()
+
+    def _host(self, host):
+        # (latency, gzip, robots.txt) of a host, drawn from the seed
+        rng = Random(f'{self.seed}:{host}')
+        rules = ['User-agent: *']
+        if rng.random() < self.disallow: rules.append('Disallow: /p1') # /p1, /p10-/p19, /p100...
+        if rng.random() < self.crawl_delay: rules.append('Crawl-delay: 2')
+        return self.latency * rng.lognormvariate(0, 1), rng.random() < self.gzip, '\n'.join(rules) + '\n'
+
+    async def _handle(self, request):
+        host, path = request.host, request.path
+        latency, compress, robots = self._host(host)
+        rng = Random(f'{self.seed}:{host}{path}')
+        await sleep(latency * rng.lognormvariate(0, 0.5))
+
+        if path == '/robots.txt': return web.Response(text=robots)
+
+        url = f'http://{host}' + ('' if path == '/' else path)
+        links = self.graph.links(url)
+        if links is None: raise web.HTTPNotFound()
+
+        # Slow enough to time out, or a redirect to another page of the host
+        if rng.random() < self.hang: await sleep(self.hang_seconds)
+        internal = [link for link in links if link.startswith(f'http://{host}/')]
+        if internal and rng.random() < self.redirect: raise web.HTTPMovedPermanently(internal[0])
+
+        # Links plus filler text up to the page's size
+        body = '<html><head><title>Page</title></head><body>\n' + ''.join(f'<p><a href="{link}">Link {index}</a></p>\n' for index, link in enumerate(links))
+        size = int(self.page_bytes * rng.lognormvariate(0, 0.8))
+        filler = '<p>Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor.</p>\n'
+        body += filler * max(0, (size - len(body)) // len(filler)) + '</body></html>\n'
+
+        response = web.Response(text=body, content_type='text/html')
+        if compress: response.enable_compression()
+        return response
+
+    def _serve(self, ready):
+        loop = new_event_loop()
+        app = web.Application()
+        app.router.add_get('/{path:.*}', self._handle)
+        runner = web.AppRunner(app, access_log=None)
+        loop.run_until_complete(runner.setup())
+
+        # One listening socket per virtual host address
+        for name in self.names:
+            address = name.rsplit(':', 1)[0]
+            loop.run_until_complete(web.TCPSite(runner, address, self.port, backlog=1024).start())
+        ready.set()
+        loop.run_forever()
@@ -0,0 +1,61 @@
+from argparse import ArgumentParser
+from json import load
+from os import environ, wait4, pathsep, getcwd
+from os.path import join
+from subprocess import Popen, DEVNULL
+from sys import executable, platform
+from tempfile import TemporaryDirectory
+
+from benchmark.farm import Farm
+
+ENGINES = ('multithread', 'asynchronous')
+
+def run_engine(engine, concurrency, adaptive, max_pages, max_time, seeds):
+    # Run one crawl in a child process (in a scratch directory for its log and checkpoints) and
+    # add the child's CPU time and peak RSS to its own numbers
+    with TemporaryDirectory() as directory:
+        result_path = join(directory, 'result.json')
+        env = dict(environ, PYTHONPATH=pathsep.join(filter(None, (getcwd(), environ.get('PYTHONPATH')))))
+        command = [executable, '-m', 'benchmark.engine', engine, str(concurrency), str(int(adaptive)), str(max_pages), str(max_time), result_path, *seeds]
+        process = Popen(command, cwd=directory, env=env, stdout=DEVNULL)
+        _, status, usage = wait4(process.pid, 0)
+        process.returncode = status
+        if status: raise RuntimeError(f'{engine} exited with status {status}')
+
+        with open(result_path) as file:
+            result = load(file)
+    result['cpu'] = usage.ru_utime + usage.ru_stime
+    result['peak_rss'] = usage.ru_maxrss * (1 if platform == 'darwin' else 1024) # bytes on macOS, KB on Linux
+    return result
+
+def print_row(engine, concurrency, adaptive, result):
+    pages_per_second = result['pages'] / result['elapsed'] if result['elapsed'] else 0
+    concurrency = f'{concurrency}+' if adaptive else str(concurrency) # + marks an adaptive run starting there
+    print(f"{engine:<13}{concurrency:>6}{result['pages']:>8}{pages_per_second:>10.1f}"
+          f"{result['latency_p50'] * 1000:>10.1f}{result['latency_p99'] * 1000:>10.1f}"
+          f"{result['cpu']:>9.2f}{result['peak_rss'] / 2 ** 20:>10.1f}")
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Benchmark the crawl engines against a local server farm')
+    parser.add_argument('--engines', choices=ENGINES, nargs='+', default=list(ENGINES), help='engines to run')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[10, 50, 100], help='NUM_THREADS / MAX_CONCURRENT_REQUESTS values')
+    parser.add_argument('--adaptive', choices=('off', 'on', 'both'), default='off', help='fixed concurrency, adaptive (starting from each value), or both')
+    parser.add_argument('--hosts', type=int, default=200, help='virtual hosts in the farm')
+    parser.add_argument('--pages', type=int, default=2000, help='max pages per run')
+    parser.add_argument('--time', type=float, default=120, help='max seconds per run')
+    parser.add_argument('--latency', type=float, default=0.05, help='median server latency in seconds')
+    parser.add_argument('--port', type=int, default=8700, help='port every virtual host listens on')
+    parser.add_argument('--seed', type=int, default=0, help='random seed for the graph and host profiles')
+    args = parser.parse_args()
+
+    farm = Farm(args.hosts, args.port, args.latency, seed=args.seed)
+    farm.start()
+    try:
+        print(f"{'engine':<13}{'conc':>6}{'pages':>8}{'pages/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'cpu s':>9}{'rss MB':>10}")
+        modes = {'off': (False,), 'on': (True,), 'both': (False, True)}[args.adaptive]
+        for engine in args.engines:
+            for concurrency in args.concurrency:
+                for adaptive in modes:
+                    print_row(engine, concurrency, adaptive, run_engine(engine, concurrency, adaptive, args.pages, args.time, farm.seeds()))
+    finally:
+        farm.stop()
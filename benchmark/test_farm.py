@@ -0,0 +1,46 @@
+from asyncio import run
+
+from aiohttp import ClientSession
+import pytest
+
+from benchmark.engine import _percentile
+from benchmark.farm import Farm, farm_hosts
+from fetcher.page import fetch_page, fetch_page_async
+from fetcher.robots import _fetch_robots
+
+@pytest.fixture(scope='module')
+def farm():
+    # Every host compresses and disallows /p1*, nothing hangs or redirects
+    farm = Farm(hosts=3, port=18731, latency=0.001, gzip=1, disallow=1, crawl_delay=0, redirect=0, hang=0, page_bytes=5000)
+    farm.start()
+    yield farm
+    farm.stop()
+
+def test_farm_hosts():
+    assert farm_hosts(256, 80)[:2] == ['127.0.1.1:80', '127.0.1.2:80']
+    assert farm_hosts(256, 80)[254] == '127.0.2.1:80'
+
+def test_fetch_from_farm(farm):
+    seed = farm.seeds(1)[0]
+    final_url, html, meta = fetch_page(seed)
+    assert final_url == seed and meta['status_code'] == 200
+    assert '<a href="http://' in html
+
+    # Missing pages are 404s
+    assert fetch_page(seed + '/p100000')[2]['status_code'] == 404
+
+def test_fetch_async_from_farm(farm):
+    async def fetch(url):
+        async with ClientSession() as session:
+            return await fetch_page_async(url, session)
+    seed = farm.seeds(1)[0]
+    assert run(fetch(seed))[1] == fetch_page(seed)[1]
+
+def test_gzipped_robots_from_farm(farm):
+    rules = _fetch_robots(farm.seeds(1)[0])
+    assert rules is not None and not rules.allows('/p12') and rules.allows('/p2')
+
+def test_percentile():
+    assert _percentile([], 0.5) == 0
+    assert _percentile([3, 1, 2, 4], 0.5) == 3
+    assert _percentile(list(range(100)), 0.99) == 99
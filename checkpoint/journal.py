@@ -0,0 +1,202 @@
+from os import listdir, makedirs, remove, replace
+from os.path import join, exists
+from shutil import copyfileobj
+from pickle import dump, load, HIGHEST_PROTOCOL
+from threading import Lock, Thread
+from time import time
+
+from frontier.spill import _parse_item
+from config import CHECKPOINT_INTERVAL, DEBUG
+
+SNAPSHOT_FILE = 'snapshot.pkl'
+JOURNAL_PREFIX = 'journal-'
+RUN_PREFIX = 'spill-' # copies of the frontier's spilled runs referenced by the snapshot
+JOURNAL_FLUSH_INTERVAL = 1 # seconds of events a crash may lose
+
+# State entries saved in snapshots (everything else is rebuilt on start)
+SNAPSHOT_KEYS = (
+    'visited', 'disallowed', 'robots_cache', 'host_health', 'near_duplicates', 'traps',
+    'total_bytes', 'status_counts', 'domain_crawl_counts', 'superdomain_domains',
+    'skipped_invalid', 'skipped_dupes', 'skipped_robots', 'skipped_timeout', 'skipped_near_dupes', 'skipped_traps',
+)
+
+def _segment_number(name):
+    return int(name[len(JOURNAL_PREFIX):-len('.log')])
+
+def _segments(directory):
+    # Journal segment numbers in the directory, oldest first
+    return sorted(_segment_number(name) for name in listdir(directory) if name.startswith(JOURNAL_PREFIX))
+
+def _copy(value):
+    # Point-in-time copy of a state entry that workers keep mutating while it is pickled
+    return value.copy() if hasattr(value, 'copy') else value
+
+# Crawl checkpoints: an append-only journal of frontier and visit events, compacted by periodic
+# snapshots of the state dict and frontier. Snapshots are copied in the scheduler and pickled in
+# a background thread, so workers never wait on disk. Spilled frontier runs aren't read in by the
+# scheduler: the snapshot keeps handles on their unread part, which the writer copies next to it.
+class Checkpoint:
+    def __init__(self, directory, interval=CHECKPOINT_INTERVAL, resume=False):
+        self.directory = directory
+        self.interval = interval
+        self.lock = Lock()  # journal writes come from the scheduler and every worker
+        self.writer = None  # background snapshot thread
+        self.last_snapshot = time()
+        makedirs(directory, exist_ok=True)
+
+        # Fresh crawl starts from an empty directory; a resumed one appends after the existing segments
+        if not resume: self.clear()
+        segments = _segments(directory)
+        self.segment = segments[-1] + 1 if segments else 0
+        self.journal = self._open(self.segment)
+        self.last_flush = time()
+
+    def enqueued(self, item):
+        priority, url, depth = item
+        self._write(f'E\t{priority!r}\t{url}\t{depth}\n')
+
+    def dispatched(self, url):
+        self._write(f'D\t{url}\n')
+
+    def finished(self, url):
+        self._write(f'F\t{url}\n')
+
+    def visited(self, url, domain, superdomain, meta, crawled):
+        self._write(f"V\t{url}\t{domain}\t{superdomain}\t{meta['status_code']}\t{meta['content_length']}\t{int(crawled)}\n")
+
+    def maybe_snapshot(self, state, frontier, elapsed):
+        # Called from the scheduler loop; skipped while the previous snapshot is still being written
+        if time() - self.last_snapshot < self.interval: return
+        if self.writer is not None and self.writer.is_alive(): return
+        self.last_snapshot = time()
+
+        # Events from here on go to a new segment, which is replayed on top of this snapshot
+        segment = self._rotate()
+        items, runs = frontier.snapshot()
+        snapshot = {
+            'segment': segment,
+            'elapsed': elapsed,
+            'frontier': items,
+            'runs': [], # run file names, filled in by the writer
+            'state': {key: _copy(state[key]) for key in SNAPSHOT_KEYS if key in state},
+        }
+
+        self.writer = Thread(target=self._save, args=(snapshot, runs), daemon=True)
+        self.writer.start()
+
+    def close(self):
+        # Wait for an in-progress snapshot and flush the journal
+        if self.writer is not None: self.writer.join()
+        with self.lock:
+            self.journal.close()
+
+    def clear(self):
+        for name in listdir(self.directory):
+            if name.startswith((JOURNAL_PREFIX, RUN_PREFIX, SNAPSHOT_FILE)): remove(join(self.directory, name))
+
+    def _open(self, segment):
+        return open(join(self.directory, f'{JOURNAL_PREFIX}{segment}.log'), 'a', encoding='utf-8', errors='surrogatepass', buffering=1 << 16)
+
+    def _write(self, line):
+        with self.lock:
+            self.journal.write(line)
+
+            # Flush about once a second rather than per event
+            if time() - self.last_flush >= JOURNAL_FLUSH_INTERVAL:
+                self.journal.flush()
+                self.last_flush = time()
+
+    def _rotate(self):
+        with self.lock:
+            self.journal.close()
+            self.segment += 1
+            self.journal = self._open(self.segment)
+            self.last_flush = time()
+            return self.segment
+
+    def _save(self, snapshot, runs):
+        # Write to a temporary file and swap it in, so a crash mid-write keeps the previous snapshot
+        path = join(self.directory, SNAPSHOT_FILE)
+        try:
+            # Copy the unread part of each spilled run (under names of this snapshot's segment)
+            for index, run in enumerate(runs):
+                name = f"{RUN_PREFIX}{snapshot['segment']}-{index}.tsv"
+                with run, open(join(self.directory, name), 'w', encoding='utf-8', errors='surrogatepass') as copy:
+                    copyfileobj(run, copy)
+                snapshot['runs'].append(name)
+
+            with open(path + '.tmp', 'wb') as file:
+                dump(snapshot, file, protocol=HIGHEST_PROTOCOL)
+            replace(path + '.tmp', path)
+        except Exception as e:
+            print(f'[WARNING] Failed to write checkpoint: {e}')
+            for run in runs: run.close()
+            self._remove_runs(lambda name: name.startswith(f"{RUN_PREFIX}{snapshot['segment']}-"))
+            return
+
+        # Segments and run copies before the snapshot are covered by it
+        for segment in _segments(self.directory):
+            if segment < snapshot['segment']: remove(join(self.directory, f'{JOURNAL_PREFIX}{segment}.log'))
+        self._remove_runs(lambda name: name not in snapshot['runs'])
+        if DEBUG: print(f"[CHECKPOINT] Saved {len(snapshot['frontier'])} frontier items and {len(snapshot['runs'])} spilled runs")
+
+    def _remove_runs(self, matches):
+        for name in listdir(self.directory):
+            if name.startswith(RUN_PREFIX) and matches(name): remove(join(self.directory, name))
+
+def restore(state, directory):
+    # Load the latest snapshot into state and replay the journal after it; returns (frontier items, elapsed)
+    snapshot = {'segment': 0, 'elapsed': 0, 'frontier': [], 'runs': [], 'state': {}}
+    path = join(directory, SNAPSHOT_FILE)
+    if exists(path):
+        with open(path, 'rb') as file:
+            snapshot = load(file)
+    state.update(snapshot['state'])
+
+    # Items owed a fetch: queued (pending) or dispatched but never finished (in flight)
+    pending = {item[1]: item for item in snapshot['frontier']}
+    for name in snapshot['runs']:
+        with open(join(directory, name), encoding='utf-8', errors='surrogatepass') as run:
+            for line in run:
+                item = _parse_item(line)
+                pending[item[1]] = item
+    in_flight = {}
+
+    for segment in _segments(directory) if exists(directory) else []:
+        if segment < snapshot['segment']: continue
+        with open(join(directory, f'{JOURNAL_PREFIX}{segment}.log'), encoding='utf-8', errors='surrogatepass') as journal:
+            for line in journal:
+                # Skip a torn last line from a crash
+                if not line.endswith('\n'): break
+                try:
+                    _replay(line.rstrip('\n').split('\t'), state, pending, in_flight)
+                except (ValueError, IndexError):
+                    if DEBUG: print(f'[WARNING] Skipping bad journal line {line!r}')
+
+    # Fetches cut off by the crash are retried
+    items = list(pending.values()) + list(in_flight.values())
+    return items, snapshot['elapsed']
+
+def _replay(fields, state, pending, in_flight):
+    event = fields[0]
+
+    if event == 'E':
+        pending[fields[2]] = (float(fields[1]), fields[2], int(fields[3]))
+
+    elif event == 'D':
+        item = pending.pop(fields[1], None)
+        if item is not None: in_flight[fields[1]] = item
+
+    elif event == 'F':
+        in_flight.pop(fields[1], None)
+
+    elif event == 'V':
+        # Same stats updates the workers make (events already in the snapshot are skipped)
+        url, domain, superdomain, status, length, crawled = fields[1], fields[2], fields[3], int(fields[4]), int(fields[5]), fields[6] == '1'
+        if not state['visited'].check_and_add(url): return
+
+        state['total_bytes'].add(length)
+        state['status_counts'].add(status)
+        if crawled:
+            state['domain_crawl_counts'].add(domain)
+            state['superdomain_domains'].add(superdomain, domain)
@@ -0,0 +1,104 @@
+from os import listdir
+from os.path import join
+from pickle import load
+
+from checkpoint.journal import Checkpoint, restore
+from frontier.politeness import Frontier
+from frontier.spill import SpillStore, _DiskRun
+from multithread.main import new_state
+
+META = {'status_code': 200, 'content_length': 1000}
+
+def crawl_a(checkpoint):
+    # a.com is fetched and crawled, b.com dispatched but cut off, c.com still queued
+    for url in ('http://a.com/', 'http://b.com/', 'http://c.com/'): checkpoint.enqueued((-1.5, url, 1))
+    checkpoint.dispatched('http://a.com/')
+    checkpoint.visited('http://a.com/', 'a.com', 'a.com', META, True)
+    checkpoint.finished('http://a.com/')
+    checkpoint.dispatched('http://b.com/')
+
+def test_replay_journal(tmp_path):
+    checkpoint = Checkpoint(tmp_path)
+    crawl_a(checkpoint)
+    checkpoint.close()
+
+    state = new_state()
+    items, elapsed = restore(state, tmp_path)
+    assert sorted(items) == [(-1.5, 'http://b.com/', 1), (-1.5, 'http://c.com/', 1)]
+    assert elapsed == 0
+    assert 'http://a.com/' in state['visited']
+    assert state['total_bytes'].value == 1000
+    assert state['status_counts'].get(200) == 1
+    assert state['domain_crawl_counts'].get('a.com') == 1
+
+def test_replay_on_top_of_snapshot(tmp_path):
+    state = new_state()
+    checkpoint = Checkpoint(tmp_path, interval=0)
+    frontier = Frontier(memory_items=0)
+    frontier.push((-1.0, 'http://d.com/', 0))
+    state['visited'].add('http://z.com/')
+    checkpoint.maybe_snapshot(state, frontier, 12.5)
+    checkpoint.writer.join()
+    crawl_a(checkpoint)
+    checkpoint.close()
+
+    # Resuming appends to a new segment, and only segments after the snapshot are kept
+    checkpoint = Checkpoint(tmp_path, resume=True)
+    checkpoint.finished('http://b.com/')
+    checkpoint.close()
+    assert sorted(name for name in listdir(tmp_path) if name.startswith('journal-')) == ['journal-1.log', 'journal-2.log']
+
+    state = new_state()
+    items, elapsed = restore(state, tmp_path)
+    assert sorted(items) == [(-1.5, 'http://c.com/', 1), (-1.0, 'http://d.com/', 0)]
+    assert elapsed == 12.5
+    assert 'http://z.com/' in state['visited'] and 'http://a.com/' in state['visited']
+
+def test_torn_line_ignored(tmp_path):
+    checkpoint = Checkpoint(tmp_path)
+    checkpoint.enqueued((-1.0, 'http://a.com/', 0))
+    checkpoint.close()
+    with open(join(tmp_path, 'journal-0.log'), 'a') as journal: journal.write('E\t-1.0\thttp://b.c')
+
+    items, _ = restore(new_state(), tmp_path)
+    assert items == [(-1.0, 'http://a.com/', 0)]
+
+def test_fresh_crawl_clears_directory(tmp_path):
+    checkpoint = Checkpoint(tmp_path)
+    crawl_a(checkpoint)
+    checkpoint.close()
+    Checkpoint(tmp_path).close()
+    assert restore(new_state(), tmp_path) == ([], 0)
+
+def test_spilled_runs_snapshot_by_reference(tmp_path, monkeypatch):
+    directory = tmp_path / 'checkpoint'
+    frontier = Frontier(min_delay=0, memory_items=2)
+    frontier.spill.close()
+    frontier.spill = SpillStore(directory=tmp_path, run_size=3)
+    urls = [f'http://host{index}.com/' for index in range(10)]
+    for index, url in enumerate(urls): frontier.push((-1.0 - index, url, 0))
+
+    # Take some items out of the runs before the snapshot
+    first = frontier.pop()
+    frontier.done(first[1])
+
+    # The scheduler never reads spilled runs back in
+    def read_back(run): raise AssertionError('spilled run read into memory')
+    monkeypatch.setattr(_DiskRun, 'remaining', read_back)
+    checkpoint = Checkpoint(directory, interval=0)
+    checkpoint.maybe_snapshot(new_state(), frontier, 1.0)
+    checkpoint.writer.join()
+    checkpoint.close()
+
+    with open(directory / 'snapshot.pkl', 'rb') as file: snapshot = load(file)
+    assert snapshot['runs'] and all((directory / name).exists() for name in snapshot['runs'])
+    assert len(snapshot['frontier']) < 9
+
+    # Copies outlive the frontier's own run files
+    while frontier:
+        item = frontier.pop()
+        frontier.done(item[1])
+    frontier.close()
+
+    items, _ = restore(new_state(), directory)
+    assert sorted(url for _, url, _ in items) == sorted(url for url in urls if url != first[1])
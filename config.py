@@ -7,11 +7,123 @@ MAX_PAGES = 10000
 # Max crawl time in seconds
 MAX_TIME = 1800
 
-# Max allowed fetch failures per domain (status 0, no content)
-MAX_TIMEOUTS = 2
+# Per-host circuit breaker (see utils/health.py): a host gets no fetches for HOST_BACKOFF seconds after
+# HOST_FAILURE_THRESHOLD consecutive timeouts, connection errors or 5xx responses (at once on a DNS failure,
+# 429, or 503 with Retry-After), doubling per consecutive backoff up to HOST_MAX_BACKOFF, and longer if the
+# server's Retry-After asks (up to the same cap). One probe fetch is let through after each backoff; a host still
+# failing after HOST_MAX_BACKOFFS backoffs in a row is dropped for the rest of the crawl
+HOST_FAILURE_THRESHOLD = 2
+HOST_BACKOFF = 30
+HOST_MAX_BACKOFF = 600
+HOST_MAX_BACKOFFS = 4
 
 # Thread/concurrent limit (used in both multithread and async)
 NUM_THREADS = MAX_CONCURRENT_REQUESTS = 50
 
+# Adapt the number of in-flight fetches at runtime (starting from the limit above), between CONCURRENCY_MIN and
+# CONCURRENCY_MAX: once per CONCURRENCY_WINDOW seconds it is cut by CONCURRENCY_BACKOFF when the error/timeout rate
+# rises CONCURRENCY_ERROR_MARGIN above its usual level or parsing backs up, shrunk when latency passes
+# CONCURRENCY_LATENCY_TOLERANCE times its usual level, and grown otherwise (see utils/concurrency.py)
+ADAPTIVE_CONCURRENCY = True
+CONCURRENCY_MIN = 10
+CONCURRENCY_MAX = 500
+CONCURRENCY_WINDOW = 1
+CONCURRENCY_ERROR_MARGIN = 0.1
+CONCURRENCY_LATENCY_TOLERANCE = 1.5
+CONCURRENCY_BACKOFF = 0.75
+
+# Skip link expansion on pages whose SimHash content fingerprint (text shingles and links) is within
+# NEAR_DUPLICATE_DISTANCE bits of an already crawled page (mirrors, syndicated copies; see utils/simhash.py)
+NEAR_DUPLICATES = True
+NEAR_DUPLICATE_DISTANCE = 3
+
+# Crawler-trap heuristics. Links longer than MAX_URL_LENGTH, with more than MAX_PATH_DEPTH path segments, with
+# repeating path segments (a segment, or a block of segments in a row, more than MAX_SEGMENT_REPEATS times) or a
+# session ID in the path are invalid. Links to a host past HOST_URL_BUDGET discovered URLs are dropped. Once
+# LOW_YIELD_PAGES of a host's pages were expanded, its links are demoted by LOW_YIELD_DEMOTION (priority factor)
+# while its pages average fewer than LOW_YIELD_LINKS new links each, and so is any link whose path repeats a
+# block of segments once (/a/b/a/b, see utils/traps.py)
+MAX_URL_LENGTH = 256
+MAX_PATH_DEPTH = 10
+MAX_SEGMENT_REPEATS = 2
+HOST_URL_BUDGET = 2000
+LOW_YIELD_PAGES = 20
+LOW_YIELD_LINKS = 2
+LOW_YIELD_DEMOTION = 0.25
+
+# Hosts whose registered domain and validity are memoized by the URL canonicalizer
+URL_CACHE_SIZE = 100000
+
+# Max decoded page size in bytes (larger pages are dropped mid-download)
+MAX_PAGE_BYTES = 5 * 1024 * 1024
+
+# Max open connections per host and seconds an idle keep-alive connection is kept (sync pool and aiohttp)
+MAX_CONNECTIONS_PER_HOST = 4
+CONNECTION_IDLE_TIMEOUT = 30
+
+# Seconds resolved host addresses are cached and failed lookups are cached, max hosts kept, and threads resolving
+# hosts ahead of their first fetch as they enter the frontier (one cache for sync and aiohttp fetches)
+DNS_CACHE_TTL = 300
+DNS_FAILURE_TTL = 60
+DNS_CACHE_SIZE = 100000
+DNS_THREADS = 8
+
+# Worker processes that decode pages and extract/normalize links (0 = parse inside fetch threads/coroutines)
+PARSE_PROCESSES = 0
+
+# Min seconds between fetches to the same host, and cap on robots.txt Crawl-delay
+POLITENESS_DELAY = 1
+MAX_CRAWL_DELAY = 30
+
+# Max frontier items kept in memory (0 = no limit); overflow spills to sorted runs of FRONTIER_SPILL_RUN items
+# in FRONTIER_SPILL_DIR (None = system temp dir)
+FRONTIER_MEMORY_ITEMS = 1000000
+FRONTIER_SPILL_RUN = 100000
+FRONTIER_SPILL_DIR = None
+
+# URL-seen store for visited/scheduled/disallowed: 'fingerprint' (64-bit hashes, ~16 bytes per URL) or 'set' (exact strings)
+SEEN_STORE = 'fingerprint'
+
+# Expected URLs per store for its Bloom filter front (10 bits each; 0 disables the filter)
+SEEN_BLOOM_CAPACITY = 1000000
+
+# Directory for the crawl journal and state snapshots (one subdirectory per engine, resume with --resume),
+# and seconds between snapshots (0 disables checkpointing)
+CHECKPOINT_DIR = 'checkpoints'
+CHECKPOINT_INTERVAL = 60
+
+# Page log format: 'tsv' (one line per page) or 'binary' (compact records, see logger/sink.py). A writer thread
+# flushes every LOG_FLUSH_LINES records or LOG_FLUSH_INTERVAL seconds and rotates past LOG_ROTATE_BYTES (0 = never)
+LOG_FORMAT = 'tsv'
+LOG_FLUSH_LINES = 1000
+LOG_FLUSH_INTERVAL = 1
+LOG_ROTATE_BYTES = 0
+
+# Lock stripes for per-host crawl counters shared by worker threads (power of two)
+STATE_STRIPES = 64
+
+# Crawler processes in distributed mode (links are routed to shards by superdomain), and how many links
+# (or seconds) are batched before forwarding them to another shard
+SHARDS = 4
+SHARD_BATCH = 100
+SHARD_FLUSH_INTERVAL = 0.5
+
+# Background threads resolving robots.txt (one shared fetch per host)
+ROBOTS_THREADS = 10
+
+# Max hosts kept in the robots.txt cache (least recently used are evicted)
+ROBOTS_CACHE_SIZE = 50000
+
+# Seconds robots.txt rules stay cached (Cache-Control max-age, kept within these bounds) and how long failures are cached
+ROBOTS_CACHE_TTL = 86400
+ROBOTS_MIN_TTL = 60
+ROBOTS_FAILURE_TTL = 3600
+
+# Seconds the scheduler waits before re-checking links parked on unresolved robots.txt
+ROBOTS_POLL_INTERVAL = 0.5
+
+# Max seconds a fetched page waits on its host's robots.txt (then it's allowed, as if the fetch had failed)
+ROBOTS_WAIT_TIMEOUT = 30
+
 # Toggle verbose logging (skipped counts, skips, warnings, errors)
 DEBUG = False
\ No newline at end of file
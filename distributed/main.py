@@ -0,0 +1,124 @@
+from time import time
+from os import remove
+from os.path import exists
+from shutil import copyfileobj
+from queue import Empty
+from argparse import ArgumentParser
+from urllib.parse import urlsplit
+from multiprocessing import Process
+from concurrent.futures import ProcessPoolExecutor
+
+from query.ddg import query_ddg
+from frontier.politeness import Frontier
+from fetcher.robots import RobotsResolver
+from fetcher.dns import default_dns
+from distributed.shard import ShardGroup, Shard, shard_of
+from utils.url import clean_url, get_superdomain, is_valid_url, is_cgi_url, is_blocked_extension
+from utils.priority import make_host_scorer
+from utils.concurrency import ConcurrencyLimit
+from logger.log import log_summary
+from logger.sink import LogSink, data_path, data_files
+from multithread.main import new_state
+from multithread.worker import crawl_with_workers
+from config import QUERY, MAX_PAGES, MAX_TIME, NUM_THREADS, ADAPTIVE_CONCURRENCY, ROBOTS_THREADS, PARSE_PROCESSES, SHARDS, DEBUG
+
+# State each shard reports for the merged summary
+SUMMARY_KEYS = (
+    'visited', 'total_bytes', 'status_counts', 'domain_crawl_counts', 'superdomain_domains',
+    'skipped_invalid', 'skipped_dupes', 'skipped_robots', 'skipped_timeout', 'skipped_near_dupes', 'skipped_traps',
+)
+
+def run_shard(group, index, start_time):
+    # One crawler process: owns the frontier, seen sets, robots cache and counters of its superdomains
+    state = new_state()
+    state['shard'] = Shard(group, index)
+    state['robots_resolver'] = RobotsResolver(state['robots_cache'], max_workers=ROBOTS_THREADS)
+    if PARSE_PROCESSES: state['parse_pool'] = ProcessPoolExecutor(max_workers=PARSE_PROCESSES)
+    state['concurrency'] = ConcurrencyLimit(NUM_THREADS) if ADAPTIVE_CONCURRENCY else None
+
+    # Starts empty; seeds and links arrive through the shard's inbox
+    frontier = Frontier(state['robots_cache'], make_host_scorer(state), health=state['host_health'], dns=default_dns)
+    log = LogSink(f'log_shard{index}.txt')
+
+    crawl_with_workers(frontier, state, log, NUM_THREADS, MAX_PAGES, MAX_TIME, start_time)
+    state['robots_resolver'].shutdown()
+    default_dns.shutdown()
+    if PARSE_PROCESSES: state['parse_pool'].shutdown()
+
+    log.close()
+    frontier.close()
+    group.results.put((index, {key: state[key] for key in SUMMARY_KEYS if key in state}))
+
+def merge_states(results):
+    # Combine shard stats for log_summary (shards own disjoint superdomains, so counters just add up)
+    merged = new_state()
+    for _, state in sorted(results, key=lambda result: result[0]):
+        merged['visited'].update(state['visited'])
+        merged['total_bytes'].add(state['total_bytes'].value)
+        for key in ('status_counts', 'domain_crawl_counts'):
+            for name, count in state[key].items():
+                merged[key].add(name, count)
+        for superdomain, domains in state['superdomain_domains'].items():
+            for domain in domains: merged['superdomain_domains'].add(superdomain, domain)
+        if DEBUG:
+            for key in ('skipped_invalid', 'skipped_dupes', 'skipped_robots', 'skipped_timeout', 'skipped_near_dupes', 'skipped_traps'):
+                merged[key].add(state[key].value)
+    return merged
+
+def main(num_shards=SHARDS):
+    group = ShardGroup(num_shards)
+
+    # Route seeds to the shards owning them (sent before the shards start, so none can finish early)
+    seeds = query_ddg(QUERY, max_results=10)
+    batches = [[] for _ in range(num_shards)]
+    for seed in seeds:
+        # Normalize URL: strip query, fragment, and trailing slash
+        seed = clean_url(seed)
+
+        # Skip if invalid (the owning shard runs the duplicate and robots.txt checks)
+        if not is_valid_url(seed) or is_cgi_url(seed) or is_blocked_extension(seed): continue
+
+        superdomain = get_superdomain(seed)
+        batches[shard_of(superdomain, num_shards)].append((seed, urlsplit(seed).netloc, superdomain, 0))
+    for index, batch in enumerate(batches):
+        if batch: group.send(index, batch)
+
+    # Launch one crawler process per shard
+    start_time = time()
+    processes = [Process(target=run_shard, args=(group, index, start_time)) for index in range(num_shards)]
+    for process in processes: process.start()
+
+    # Collect shard results (before joining, so large results don't block the shards from exiting)
+    results = []
+    while len(results) < num_shards:
+        try:
+            results.append(group.results.get(timeout=1))
+            continue
+        except Empty:
+            pass
+
+        # Stop every shard at the time limit, or if one died without reporting
+        if time() - start_time >= MAX_TIME or any(process.exitcode not in (None, 0) for process in processes):
+            group.stop.set()
+        if not any(process.is_alive() for process in processes):
+            print(f'[ERROR] {num_shards - len(results)} shard(s) exited without reporting')
+            break
+    for process in processes: process.join()
+    total_time = time() - start_time
+
+    # Merge shard logs (records, including rotated files) into one log, then add the combined summary
+    with open(data_path('log_distributed.txt'), 'wb') as merged:
+        for index in range(num_shards):
+            for path in data_files(f'log_shard{index}.txt'):
+                if not exists(path): continue
+                with open(path, 'rb') as shard_log: copyfileobj(shard_log, merged)
+                remove(path)
+            if exists(f'log_shard{index}.txt'): remove(f'log_shard{index}.txt') # binary logs' (empty) text file
+    log = LogSink('log_distributed.txt', append=True)
+    log_summary(log, merge_states(results), total_time)
+    log.close()
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Host-sharded multi-process web crawler')
+    parser.add_argument('--shards', type=int, default=SHARDS, help='number of crawler processes')
+    main(parser.parse_args().shards)
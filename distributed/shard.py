@@ -0,0 +1,110 @@
+from multiprocessing import Queue, Lock, Event, Value, Array
+from queue import Empty
+from threading import Lock as ThreadLock
+from time import time
+from zlib import crc32
+
+from utils.seen import new_seen_store
+from config import SHARD_BATCH, SHARD_FLUSH_INTERVAL
+
+def shard_of(superdomain, count):
+    # Owning shard of a superdomain (crc32 rather than hash(), which is salted per process)
+    return crc32(superdomain.encode('utf-8', 'surrogatepass')) % count
+
+# Shared by every shard process: one inbox per shard, the global page counter and the bookkeeping
+# used to detect that every shard is idle with no batch in transit
+class ShardGroup:
+    def __init__(self, count):
+        self.count = count
+        self.inboxes = [Queue() for _ in range(count)]
+        self.results = Queue()                          # (index, stats) reported by each shard at the end
+        self.pages = Value('q', 0)                      # pages fetched by all shards
+        self.lock = Lock()                              # guards the arrays below
+        self.sent = Array('q', count, lock=False)       # batches sent to each shard
+        self.received = Array('q', count, lock=False)   # batches each shard picked up
+        self.idle = Array('b', count, lock=False)       # shard has no work left
+        self.stop = Event()     # a limit was reached (or a shard died)
+        self.finished = Event() # all shards idle and nothing in transit
+
+    def send(self, index, batch):
+        # Count before sending, so the batch is never unaccounted for while in transit
+        with self.lock:
+            self.sent[index] += 1
+        self.inboxes[index].put(batch)
+
+# One process's view of the group: forwards links it doesn't own and picks up the ones sent to it
+class Shard:
+    def __init__(self, group, index, batch_size=SHARD_BATCH, flush_interval=SHARD_FLUSH_INTERVAL):
+        self.group = group
+        self.index = index
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.outboxes = [[] for _ in range(group.count)]
+        self.forwarded = new_seen_store()   # links already sent (each is sent at most once)
+        self.lock = ThreadLock()            # workers forward links concurrently
+        self.picked = []                    # batches picked up while waiting idle
+        self.last_flush = time()
+
+    def owns(self, superdomain):
+        return shard_of(superdomain, self.group.count) == self.index
+
+    def forward(self, link, link_domain, link_superdomain, depth):
+        with self.lock:
+            if link in self.forwarded: return
+            self.forwarded.add(link)
+            self.outboxes[shard_of(link_superdomain, self.group.count)].append((link, link_domain, link_superdomain, depth))
+
+    def flush(self, force=False):
+        # Send outboxes once one is full or the flush interval has passed
+        if not force and time() - self.last_flush < self.flush_interval and all(len(outbox) < self.batch_size for outbox in self.outboxes):
+            return
+        with self.lock:
+            outboxes, self.outboxes = self.outboxes, [[] for _ in range(self.group.count)]
+        self.last_flush = time()
+
+        for index, batch in enumerate(outboxes):
+            if batch: self.group.send(index, batch)
+
+    def receive(self):
+        # Links sent to this shard as (link, domain, superdomain, depth), without blocking
+        picked, self.picked, batches = self.picked, [], []
+        inbox = self.group.inboxes[self.index]
+        while True:
+            try: batches.append(inbox.get_nowait())
+            except Empty: break
+        self._mark_busy(len(batches))
+        return [link for batch in picked + batches for link in batch]
+
+    def wait_idle(self, timeout):
+        # Nothing left to crawl here: flush, mark idle (finishing the crawl if every shard is) and wait for links
+        self.flush(force=True)
+        group = self.group
+        with group.lock:
+            group.idle[self.index] = 1
+            if all(group.idle) and sum(group.sent) == sum(group.received): group.finished.set()
+
+        try: self.picked.append(group.inboxes[self.index].get(timeout=timeout))
+        except Empty: return
+        self._mark_busy(1)
+
+    def count_page(self):
+        with self.group.pages.get_lock():
+            self.group.pages.value += 1
+
+    def page_count(self):
+        return self.group.pages.value
+
+    def stop(self):
+        self.group.stop.set()
+
+    def stopped(self):
+        return self.group.stop.is_set()
+
+    def finished(self):
+        return self.group.finished.is_set()
+
+    def _mark_busy(self, batches):
+        if not batches: return
+        with self.group.lock:
+            self.group.received[self.index] += batches
+            self.group.idle[self.index] = 0
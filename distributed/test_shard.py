@@ -0,0 +1,59 @@
+from distributed.main import merge_states
+from distributed.shard import ShardGroup, Shard, shard_of
+from multithread.main import new_state
+
+def owned_by(index, count):
+    # Some superdomain owned by shard index
+    return next(name for name in (f'site{number}.com' for number in range(1000)) if shard_of(name, count) == index)
+
+def test_shard_of_is_stable():
+    assert shard_of('example.com', 4) == shard_of('example.com', 4)
+    assert {shard_of(f'site{number}.com', 4) for number in range(100)} == {0, 1, 2, 3}
+
+def test_forward_and_finish():
+    group = ShardGroup(2)
+    first, second = Shard(group, 0), Shard(group, 1)
+    superdomain = owned_by(1, 2)
+    assert second.owns(superdomain) and not first.owns(superdomain)
+
+    # Links are forwarded once, in batches, to the owning shard
+    link = (f'http://{superdomain}/page', superdomain, superdomain, 2)
+    first.forward(*link)
+    first.forward(*link)
+    first.flush(force=True)
+    second.wait_idle(5)
+    assert second.receive() == [link]
+    assert not group.finished.is_set()
+
+    # Done once every shard is idle and no batch is in transit
+    first.wait_idle(0.01)
+    assert not first.finished()
+    second.wait_idle(0.01)
+    assert first.finished() and second.finished()
+
+def test_page_counter_and_stop():
+    group = ShardGroup(2)
+    first, second = Shard(group, 0), Shard(group, 1)
+    first.count_page()
+    second.count_page()
+    assert first.page_count() == 2
+    second.stop()
+    assert first.stopped()
+
+def test_merge_states():
+    states = []
+    for index, domain in enumerate(('a.com', 'b.com')):
+        state = new_state()
+        state['visited'].add(f'http://{domain}/')
+        state['total_bytes'].add(100)
+        state['status_counts'].add(200)
+        state['domain_crawl_counts'].add(domain)
+        state['superdomain_domains'].add(domain, domain)
+        states.append((index, state))
+
+    merged = merge_states(states)
+    assert len(merged['visited']) == 2
+    assert merged['total_bytes'].value == 200
+    assert merged['status_counts'].get(200) == 2
+    assert merged['domain_crawl_counts'].get('b.com') == 1
+    assert merged['superdomain_domains'].count('a.com') == 1
@@ -0,0 +1,222 @@
+from http.client import HTTPConnection, HTTPSConnection, RemoteDisconnected
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlsplit, urljoin
+from threading import Condition
+from ssl import create_default_context
+from socket import getdefaulttimeout
+from time import time
+
+from aiohttp import TCPConnector
+
+from fetcher.dns import default_dns, CachedResolver
+from config import MAX_CONNECTIONS_PER_HOST, CONNECTION_IDLE_TIMEOUT, DEBUG
+
+REDIRECT_CODES = {301, 302, 303, 307, 308}
+MAX_REDIRECTS = 10 # same limit as urllib
+
+# Raised when a connection can't be established (e.g. DNS failure, connection refused or timed out),
+# as opposed to a failure after connecting (e.g. read timeout)
+class ConnectError(URLError):
+    pass
+
+# Response from a pooled connection (urlopen-like: geturl, getcode, headers, read)
+class PooledResponse:
+    def __init__(self, pool, key, conn, response, url):
+        self.pool = pool
+        self.key = key
+        self.conn = conn
+        self.response = response
+        self.url = url
+        self.headers = response.headers
+        self.released = False
+
+    def geturl(self):
+        return self.url
+
+    def getcode(self):
+        return self.response.status
+
+    def read(self, amt=None):
+        data = self.response.read(amt)
+
+        # Hand connection back once the body is fully consumed
+        if self.response.isclosed(): self._release(not self.response.will_close)
+        return data
+
+    def close(self):
+        # Body not fully read, so the connection can't be reused
+        self._release(False)
+
+    def _release(self, reusable):
+        if self.released: return
+        self.released = True
+        self.pool.release(self.key, self.conn, reusable)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+# Keep-alive connections per (scheme, netloc), shared by all threads
+class ConnectionPool:
+    def __init__(self, max_per_host=MAX_CONNECTIONS_PER_HOST, idle_timeout=CONNECTION_IDLE_TIMEOUT, dns=default_dns, wait_timeout=None):
+        self.max_per_host = max_per_host
+        self.idle_timeout = idle_timeout
+        self.wait_timeout = wait_timeout # max seconds to wait for a free host slot (defaults to the socket timeout)
+        self.dns = dns # resolves hosts through the shared DNS cache
+        self.context = create_default_context()
+        self.cond = Condition()
+        self.idle = {}      # (scheme, netloc) -> [(connection, last_used)]
+        self.active = {}    # (scheme, netloc) -> connections currently checked out
+        self.last_sweep = time()
+
+    def urlopen(self, url, headers=None):
+        # Follow redirects manually so each hop can reuse its host's connections
+        for _ in range(MAX_REDIRECTS + 1):
+            response = self._request(url, headers or {})
+            status = response.getcode()
+
+            location = response.headers.get('Location')
+            if status in REDIRECT_CODES and location:
+                # Drain (redirect bodies are tiny) so the connection is reused
+                try:
+                    response.read()
+                except BaseException:
+                    response.close()
+                    raise
+                url = urljoin(url, location)
+                continue
+
+            # Raise HTTP errors like urlopen does
+            if status >= 400:
+                response.close()
+                raise HTTPError(url, status, response.response.reason, response.headers, None)
+
+            return response
+
+        response.close()
+        raise HTTPError(url, status, 'Too many redirects', response.headers, None)
+
+    def release(self, key, conn, reusable):
+        parked = False
+        with self.cond:
+            # Free the host slot
+            self.active[key] -= 1
+            if not self.active[key]: del self.active[key]
+
+            # Park reusable connection as idle (up to the per-host limit)
+            idle = self.idle.setdefault(key, [])
+            if reusable and len(idle) < self.max_per_host:
+                idle.append((conn, time()))
+                parked = True
+            elif not idle:
+                del self.idle[key]
+
+            self.cond.notify_all()
+            expired = self._sweep()
+
+        # Close outside the lock
+        if not parked and conn is not None: conn.close()
+        for conn in expired: conn.close()
+
+    def close(self):
+        with self.cond:
+            idle, self.idle = self.idle, {}
+        for conns in idle.values():
+            for conn, _ in conns: conn.close()
+
+    def _request(self, url, headers):
+        scheme, netloc, path, query, _ = urlsplit(url)
+        key = (scheme, netloc)
+        target = (path or '/') + (f'?{query}' if query else '')
+
+        # Retry once on a fresh connection if a reused one turns out to be stale
+        for attempt in range(2):
+            conn, reused = self._acquire(key)
+            try:
+                conn.request('GET', target, headers=headers)
+                response = conn.getresponse()
+                return PooledResponse(self, key, conn, response, url)
+
+            except (RemoteDisconnected, BrokenPipeError, ConnectionResetError) as e:
+                self.release(key, conn, False)
+                if reused and attempt == 0:
+                    if DEBUG: print(f'[WARNING] Stale connection to {netloc}, reconnecting')
+                    continue
+                raise URLError(e)
+
+            # Wrap network-level errors (e.g. DNS failure, connection timeout) like urlopen does
+            # (the socket is only set once connected)
+            except OSError as e:
+                connected = conn.sock is not None
+                self.release(key, conn, False)
+                if not connected: raise ConnectError(e)
+                raise URLError(e)
+
+            except BaseException:
+                self.release(key, conn, False)
+                raise
+
+    def _acquire(self, key):
+        with self.cond:
+            # Wait for a free slot on this host (bounded, so a leaked slot can't hang a worker)
+            timeout = self.wait_timeout or getdefaulttimeout() or self.idle_timeout
+            if not self.cond.wait_for(lambda: self.active.get(key, 0) < self.max_per_host, timeout):
+                raise URLError(f'timed out waiting for a connection to {key[1]}')
+            self.active[key] = self.active.get(key, 0) + 1
+
+            # Reuse most recently parked connection that hasn't gone idle for too long
+            idle, expired, conn = self.idle.get(key, []), [], None
+            while idle:
+                candidate, last_used = idle.pop()
+                if time() - last_used < self.idle_timeout:
+                    conn = candidate
+                    break
+                expired.append(candidate)
+            if not idle: self.idle.pop(key, None)
+
+        for candidate in expired: candidate.close()
+        if conn is not None: return conn, True
+
+        # Open a new connection (socket is connected lazily on first request)
+        try:
+            return self._connect(*key), False
+        except BaseException:
+            self.release(key, None, False)
+            raise
+
+    def _connect(self, scheme, netloc):
+        if scheme == 'https': conn = HTTPSConnection(netloc, context=self.context)
+        elif scheme == 'http': conn = HTTPConnection(netloc)
+        else: raise URLError(f'unknown url type: {scheme}')
+
+        # Look the host up in the DNS cache instead of a blocking getaddrinfo per connection
+        conn._create_connection = self.dns.create_connection
+        return conn
+
+    def _sweep(self):
+        # Evict idle connections past the idle timeout (at most once per timeout period)
+        now, expired = time(), []
+        if now - self.last_sweep < self.idle_timeout: return expired
+        self.last_sweep = now
+
+        for key in list(self.idle):
+            fresh = [(conn, last_used) for conn, last_used in self.idle[key] if now - last_used < self.idle_timeout]
+            expired.extend(conn for conn, last_used in self.idle[key] if now - last_used >= self.idle_timeout)
+            if fresh: self.idle[key] = fresh
+            else: del self.idle[key]
+        return expired
+
+# Shared by page and robots.txt fetches
+default_pool = ConnectionPool()
+
+def make_connector(limit):
+    # Matching tuning for the async engine's aiohttp session
+    return TCPConnector(
+        limit=limit,                                # total open connections
+        limit_per_host=MAX_CONNECTIONS_PER_HOST,    # same per-host cap as the sync pool
+        keepalive_timeout=CONNECTION_IDLE_TIMEOUT,  # idle eviction
+        resolver=CachedResolver(default_dns),       # shared DNS cache (with prefetching and negative caching)
+        use_dns_cache=False,                        # already cached by the resolver
+    )
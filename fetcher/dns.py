@@ -0,0 +1,148 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future
+from socket import getaddrinfo, gaierror, socket, SOCK_STREAM, AF_UNSPEC, AI_NUMERICHOST, AI_NUMERICSERV, _GLOBAL_DEFAULT_TIMEOUT
+from threading import Lock
+from asyncio import get_running_loop
+from time import time
+
+from aiohttp.abc import AbstractResolver
+
+from config import DNS_CACHE_TTL, DNS_FAILURE_TTL, DNS_CACHE_SIZE, DNS_THREADS, DEBUG
+
+PREFETCH_BACKLOG = 1000 # max lookups queued for prefetch (beyond that, hosts are resolved on first fetch)
+
+def _with_port(infos, port, family):
+    # Cached addresses (resolved without a port) for one port and address family
+    return [
+        (info_family, kind, proto, name, (sockaddr[0], port) + sockaddr[2:])
+        for info_family, kind, proto, name, sockaddr in infos
+        if family == AF_UNSPEC or info_family == family
+    ]
+
+# In-process DNS cache shared by the sync connection pool, robots.txt fetches and the aiohttp resolver.
+# Addresses are cached for DNS_CACHE_TTL seconds and failed lookups for DNS_FAILURE_TTL; a host being
+# resolved is looked up once, with every other caller waiting on that lookup. Hosts entering the
+# frontier are resolved ahead of time by background threads, so workers rarely wait on DNS.
+class DnsCache:
+    def __init__(self, ttl=DNS_CACHE_TTL, failure_ttl=DNS_FAILURE_TTL, max_size=DNS_CACHE_SIZE, max_workers=DNS_THREADS, resolver=getaddrinfo):
+        self.ttl = ttl
+        self.failure_ttl = failure_ttl
+        self.max_size = max_size
+        self.max_workers = max_workers
+        self.resolver = resolver    # getaddrinfo-compatible (e.g. a local stub resolver for testing)
+        self.entries = OrderedDict()  # host -> (expiry time, addrinfo list or gaierror args), least recently resolved first
+        self.inflight = {}          # host -> Future of the lookup in progress
+        self.lock = Lock()
+        self.executor = None        # prefetch threads (started on first prefetch)
+
+    def resolve(self, host, port=0, family=AF_UNSPEC):
+        # getaddrinfo results for host (blocks on a lookup if not cached); raises gaierror if it doesn't resolve
+        with self.lock:
+            infos = self._cached(host)
+            if infos is None:
+                future = self.inflight.get(host)
+                owner = future is None
+                if owner: future = self.inflight[host] = Future()
+        if infos is None:
+            if owner: self._lookup(host, future)
+            infos = future.result()
+        return _with_port(infos, port, family)
+
+    def cached(self, host, port=0, family=AF_UNSPEC):
+        # Like resolve, but None instead of waiting if the host isn't cached
+        with self.lock:
+            infos = self._cached(host)
+        return _with_port(infos, port, family) if infos is not None else None
+
+    def prefetch(self, host):
+        # Start resolving a host in the background (no-op if cached, in progress or the backlog is full)
+        if not host: return
+        with self.lock:
+            if self._cached(host, raise_failure=False) is not None or host in self.inflight: return
+            if len(self.inflight) >= PREFETCH_BACKLOG: return
+            if self.executor is None: self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='dns')
+            future = self.inflight[host] = Future()
+        self.executor.submit(self._lookup, host, future)
+
+    def create_connection(self, address, timeout=_GLOBAL_DEFAULT_TIMEOUT, source_address=None, *args, **kwargs):
+        # socket.create_connection through the cache (installed as http.client's connection factory)
+        host, port = address
+        error = None
+        for family, kind, proto, _, sockaddr in self.resolve(host, port):
+            sock = None
+            try:
+                sock = socket(family, kind, proto)
+                if timeout is not _GLOBAL_DEFAULT_TIMEOUT: sock.settimeout(timeout)
+                if source_address: sock.bind(source_address)
+                sock.connect(sockaddr)
+                return sock
+            except OSError as e:
+                error = e
+                if sock is not None: sock.close()
+        raise error if error is not None else OSError(f'getaddrinfo returned no addresses for {host}')
+
+    def shutdown(self):
+        # Drop queued prefetches, failing anyone waiting on a lookup (lookups already running finish in the
+        # background and still fill the cache; the next resolve of a failed host looks it up again)
+        with self.lock:
+            executor, self.executor = self.executor, None
+            for host, future in self.inflight.items():
+                future.set_exception(OSError(f'DNS cache shut down while resolving {host}'))
+            self.inflight.clear()
+        if executor is not None: executor.shutdown(wait=False, cancel_futures=True)
+
+    def _cached(self, host, raise_failure=True):
+        # Caller must hold the lock
+        entry = self.entries.get(host)
+        if entry is None: return None
+        expiry, value = entry
+        if expiry <= time():
+            del self.entries[host]
+            return None
+        if isinstance(value, list): return value
+        if raise_failure: raise gaierror(*value)
+        return value
+
+    def _lookup(self, host, future):
+        try:
+            infos = self.resolver(host, None, AF_UNSPEC, SOCK_STREAM)
+            entry = (time() + self.ttl, infos)
+        except gaierror as e:
+            if DEBUG: print(f'[DNS] Failed to resolve {host}: {e}')
+            infos, entry = e, (time() + self.failure_ttl, e.args)
+        except BaseException as e:
+            # Not a DNS answer (e.g. interrupted), so nothing is cached
+            infos, entry = e, None
+
+        with self.lock:
+            if self.inflight.get(host) is future: del self.inflight[host]
+            if entry is not None:
+                self.entries.pop(host, None)
+                self.entries[host] = entry
+                if len(self.entries) > self.max_size: self.entries.popitem(last=False)
+
+            # Already failed if the cache was shut down meanwhile
+            if future.done(): return
+            if isinstance(infos, BaseException): future.set_exception(infos)
+            else: future.set_result(infos)
+
+# aiohttp resolver backed by a DnsCache, so the async engine shares the cache and its prefetching
+class CachedResolver(AbstractResolver):
+    def __init__(self, cache):
+        self.cache = cache
+
+    async def resolve(self, host, port=0, family=AF_UNSPEC):
+        # Cache hits are answered on the event loop; misses are looked up in a thread
+        infos = self.cache.cached(host, port, family)
+        if infos is None: infos = await get_running_loop().run_in_executor(None, self.cache.resolve, host, port, family)
+        if not infos: raise OSError(f'DNS lookup of {host} returned no addresses')
+        return [
+            {'hostname': host, 'host': sockaddr[0], 'port': sockaddr[1], 'family': info_family, 'proto': proto, 'flags': AI_NUMERICHOST | AI_NUMERICSERV}
+            for info_family, _, proto, _, sockaddr in infos
+        ]
+
+    async def close(self):
+        pass
+
+# Shared by every fetch in the process
+default_dns = DnsCache()
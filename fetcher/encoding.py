@@ -0,0 +1,55 @@
+from codecs import lookup, BOM_UTF8, BOM_UTF16_LE, BOM_UTF16_BE
+from re import compile as compile_regex, search, IGNORECASE
+from threading import Lock
+
+from chardet import detect
+
+SNIFF_BYTES = 4096      # Where to look for <meta charset> (spec says 1024, but long <head>s are common)
+DETECT_BYTES = 16384    # Prefix handed to chardet when everything else fails
+HOST_CACHE_SIZE = 10000 # Hosts whose statistically detected encoding is remembered
+
+META_CHARSET = compile_regex(rb'''<meta[^>]+charset\s*=\s*["']?\s*([\w.:-]+)''', IGNORECASE)
+
+host_encodings = {} # host -> encoding detected by chardet
+host_encodings_lock = Lock()
+
+def _known(encoding):
+    # Normalized codec name, or None if Python doesn't know it
+    try:
+        return lookup(encoding).name
+    except (LookupError, TypeError):
+        return None
+
+def detect_encoding(raw_bytes, content_type, host=None):
+    # Get charset from Content-Type header if present
+    charset_match = search(r'charset=([^\s;]+)', content_type, IGNORECASE)
+    if charset_match: return charset_match.group(1).strip('"\'')
+
+    # Byte order mark
+    if raw_bytes.startswith(BOM_UTF8): return 'utf-8-sig'
+    if raw_bytes.startswith((BOM_UTF16_LE, BOM_UTF16_BE)): return 'utf-16'
+
+    # <meta charset> or <meta http-equiv="Content-Type" content="...; charset=..."> near the top
+    meta_match = META_CHARSET.search(raw_bytes, 0, SNIFF_BYTES)
+    if meta_match:
+        encoding = _known(meta_match.group(1).decode('ascii', errors='ignore'))
+        if encoding: return encoding
+
+    # Valid UTF-8 (including plain ASCII) is by far the most common case
+    try:
+        raw_bytes.decode('utf-8')
+        return 'utf-8'
+    except UnicodeDecodeError:
+        pass
+
+    # Sites rarely mix encodings, so reuse an earlier guess for this host (one lookup, as other threads may evict it)
+    encoding = host_encodings.get(host) if host else None
+    if encoding: return encoding
+
+    # Otherwise guess encoding from a prefix of the raw bytes (fallback to UTF-8)
+    encoding = _known(detect(raw_bytes[:DETECT_BYTES])['encoding']) or 'utf-8'
+    if host:
+        with host_encodings_lock:
+            if len(host_encodings) >= HOST_CACHE_SIZE: host_encodings.pop(next(iter(host_encodings)))
+            host_encodings[host] = encoding
+    return encoding
@@ -1,35 +1,118 @@
-from urllib.request import urlopen, Request
 from urllib.error import HTTPError, URLError
 from datetime import datetime, timezone
-from io import BytesIO
-from gzip import GzipFile
-from re import search, IGNORECASE
-from socket import timeout
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+from socket import timeout, gaierror
+from zlib import decompressobj, MAX_WBITS, error as ZlibError
 
-from aiohttp import ClientResponseError, ClientConnectorError
-from chardet import detect
+from aiohttp import ClientResponseError, ClientConnectorError, ClientConnectorDNSError, ConnectionTimeoutError
 
-from config import DEBUG
+# Brotli is optional (only advertised if installed)
+try:
+    from brotli import Decompressor as BrotliDecompressor
+except ImportError:
+    BrotliDecompressor = None
+
+from fetcher.connection import default_pool, ConnectError
+from fetcher.encoding import detect_encoding
+from config import MAX_PAGE_BYTES, DEBUG
+
+CHUNK_SIZE = 64 * 1024
+BROTLI_SLICE = 1024 # Input fed per call to brotli versions without an output limit (before 1.2)
 
 HEADERS = {
     'Accept': 'text/html',
+    'Accept-Encoding': 'gzip, deflate, br' if BrotliDecompressor else 'gzip, deflate',
     # Browser headers to avoid blocks
     'Accept-Language': 'en-US,en;q=0.9',
     'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/140.0.0.0 Safari/537.36'
 }
 
-def _detect_encoding(raw_bytes, content_type):
-    # Get charset from Content-Type header if present
-    charset_match = search(r'charset=([^\s;]+)', content_type, IGNORECASE)
-    if charset_match: return charset_match.group(1)
-    
-    # Otherwise guess encoding from raw bytes
-    detected = detect(raw_bytes)
-    
-    # Fallback to UTF-8
-    return detected['encoding'] or 'utf-8'
+# Raised when a page decodes to more than MAX_PAGE_BYTES
+class PageTooLarge(Exception):
+    pass
+
+class _Decompressor:
+    def __init__(self, content_encoding):
+        self.content_encoding = content_encoding
+        self.started = False
+        if content_encoding in ('gzip', 'x-gzip'): self.zlib = decompressobj(16 + MAX_WBITS)
+        elif content_encoding == 'deflate': self.zlib = decompressobj()
+        elif content_encoding == 'br' and BrotliDecompressor: self.brotli = BrotliDecompressor()
+        else: self.content_encoding = None # identity (or unsupported, passed through)
+
+    def feed(self, chunk, limit):
+        if self.content_encoding is None: return chunk
+        if self.content_encoding == 'br': return self._feed_brotli(chunk, limit)
+
+        # Some servers send raw deflate without the zlib header
+        try:
+            data = self.zlib.decompress(chunk, limit + 1)
+        except ZlibError:
+            if self.content_encoding != 'deflate' or self.started: raise
+            self.zlib = decompressobj(-MAX_WBITS)
+            data = self.zlib.decompress(chunk, limit + 1)
+        self.started = True
+
+        # Output was cut at the limit, so the page is too large
+        if self.zlib.unconsumed_tail: raise PageTooLarge()
+        return data
+
+    def _feed_brotli(self, chunk, limit):
+        # Output stops growing one byte past the limit, so the page is too large if it gets there
+        if hasattr(self.brotli, 'can_accept_more_data'):
+            data = self.brotli.process(chunk, output_buffer_limit=limit + 1)
+            if len(data) > limit: raise PageTooLarge()
+            return data
+
+        # Older versions can't limit output, so feed small slices and check the size after each
+        data = bytearray()
+        for start in range(0, len(chunk), BROTLI_SLICE):
+            data += self.brotli.process(chunk[start:start + BROTLI_SLICE])
+            if len(data) > limit: raise PageTooLarge()
+        return bytes(data)
+
+def _retry_after(value):
+    # Seconds from a Retry-After header (delay in seconds or an HTTP date), None if missing or invalid
+    if not value: return None
+    value = value.strip()
+    if value.isdigit(): return int(value)
+    try:
+        return max(0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+def _error_kind(error):
+    # Failure class of a network-level error for the host health tracker (utils/health.py)
+    if isinstance(error, ClientConnectorDNSError): return 'dns'
+    if isinstance(error, ConnectError): return 'dns' if isinstance(error.reason, gaierror) else 'connect'
+    if isinstance(error, (ClientConnectorError, ConnectionTimeoutError)): return 'connect'
+    return 'read'
+
+def _read_body(response, max_bytes=MAX_PAGE_BYTES):
+    # Read and decompress incrementally, aborting once the decoded size passes max_bytes
+    decompressor = _Decompressor(response.headers.get('Content-Encoding', '').strip().lower())
+    body = bytearray()
+
+    while True:
+        chunk = response.read(CHUNK_SIZE)
+        if not chunk: break
+        body += decompressor.feed(chunk, max_bytes - len(body))
+        if len(body) > max_bytes: raise PageTooLarge()
+
+    return bytes(body)
+
+async def _read_body_async(response, max_bytes=MAX_PAGE_BYTES):
+    # aiohttp decompresses while streaming, so only the size cap is applied here
+    body = bytearray()
 
-def fetch_page(url):
+    async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+        body += chunk
+        if len(body) > max_bytes: raise PageTooLarge()
+
+    return bytes(body)
+
+def fetch_page(url, decode=True):
     meta = {
         'status_code': 0,
         'content_length': 0,
@@ -38,54 +121,63 @@ def fetch_page(url):
 
     try:
         print('Fetching', url)
-        request = Request(url, headers=HEADERS)
-        response = urlopen(request)
-        final_url = response.geturl() # resolved URL after any redirects
+        # Reuse a pooled keep-alive connection (released once the body is read or on exit)
+        with default_pool.urlopen(url, HEADERS) as response:
+            final_url = response.geturl() # resolved URL after any redirects
 
-        # Update metadata after successful fetch
-        meta['status_code'] = response.getcode() or 0
-        meta['timestamp'] = datetime.now(timezone.utc).isoformat()
+            # Update metadata after successful fetch
+            meta['status_code'] = response.getcode() or 0
+            meta['timestamp'] = datetime.now(timezone.utc).isoformat()
+            retry_after = _retry_after(response.headers.get('Retry-After'))
+            if retry_after is not None: meta['retry_after'] = retry_after
 
-        # Skip non-HTML content (e.g. image, pdf, etc.)
-        content_type = response.headers.get('Content-Type', '')
-        if 'text/html' not in content_type:
-            if DEBUG: print('Skipping non-html content')
-            return final_url, None, meta
-        
-        # Read raw response
-        try:
-            raw_bytes = response.read()
-        except timeout:
-            if DEBUG: print(f'[TIMEOUT] Reading from {url} took too long')
-            return final_url, None, meta
+            # Skip non-HTML content (e.g. image, pdf, etc.)
+            content_type = response.headers.get('Content-Type', '')
+            if 'text/html' not in content_type:
+                if DEBUG: print('Skipping non-html content')
+                return final_url, None, meta
         
-        # Decompress if gzipped
-        if response.headers.get('Content-Encoding') == 'gzip':
-            if DEBUG: print('Decompressing gzip content')
-            buffer = BytesIO(raw_bytes)
-            raw_bytes = GzipFile(fileobj=buffer).read() # decompressed
+            # Read raw response (decompressed while streaming)
+            try:
+                raw_bytes = _read_body(response)
+            except timeout:
+                meta['error'] = 'read'
+                if DEBUG: print(f'[TIMEOUT] Reading from {url} took too long')
+                return final_url, None, meta
+            except PageTooLarge:
+                if DEBUG: print(f'[SKIP] {url} is larger than {MAX_PAGE_BYTES} bytes')
+                return final_url, None, meta
+
+            # Hand back raw bytes if decoding happens elsewhere (e.g. parse process pool)
+            meta['content_type'] = content_type
+            if not decode:
+                meta['content_length'] = len(raw_bytes)
+                return final_url, raw_bytes, meta
         
-        # Detect encoding
-        encoding = _detect_encoding(raw_bytes, content_type)
-        try:
-            # Decode to HTML
-            html = raw_bytes.decode(encoding, errors='replace')
-        except Exception as e:
-            if DEBUG: print(f'[ERROR] Failed to decode {url} using {encoding}: {e}')
-            return final_url, None, meta
+            # Detect encoding
+            encoding = detect_encoding(raw_bytes, content_type, urlsplit(final_url).netloc)
+            try:
+                # Decode to HTML
+                html = raw_bytes.decode(encoding, errors='replace')
+            except Exception as e:
+                if DEBUG: print(f'[ERROR] Failed to decode {url} using {encoding}: {e}')
+                return final_url, None, meta
         
-        meta['content_length'] = len(raw_bytes)
-        return final_url, html, meta
+            meta['content_length'] = len(raw_bytes)
+            return final_url, html, meta
     
     # Handle HTTP response errors (e.g. 404, 403, 500)
     except HTTPError as e:
         meta['status_code'] = e.code
         meta['timestamp'] = datetime.now(timezone.utc).isoformat()
+        retry_after = _retry_after(e.headers.get('Retry-After') if e.headers else None)
+        if retry_after is not None: meta['retry_after'] = retry_after
         if DEBUG: print(f'[ERROR] Failed to fetch {url}: {e}')
         return url, None, meta
 
     # Handle network-level errors (e.g. DNS failure, connection timeout)
     except URLError as e:
+        meta['error'] = _error_kind(e)
         if DEBUG: print(f'[ERROR] Failed to fetch {url}: {e}')
         return url, None, meta
     
@@ -94,7 +186,7 @@ def fetch_page(url):
         if DEBUG: print(f'[ERROR] Failed to fetch {url}: {e}')
         return url, None, meta
 
-async def fetch_page_async(url, session):
+async def fetch_page_async(url, session, decode=True):
     meta = {
         'status_code': 0,
         'content_length': 0,
@@ -109,6 +201,8 @@ async def fetch_page_async(url, session):
             # Update metadata after successful fetch
             meta['status_code'] = response.status
             meta['timestamp'] = datetime.now(timezone.utc).isoformat()
+            retry_after = _retry_after(response.headers.get('Retry-After'))
+            if retry_after is not None: meta['retry_after'] = retry_after
 
             # Skip non-HTML content (e.g. image, pdf, etc.)
             content_type = response.headers.get('Content-Type', '')
@@ -116,13 +210,21 @@ async def fetch_page_async(url, session):
                 if DEBUG: print('Skipping non-html content')
                 return final_url, None, meta
 
-            # Read raw response
-            raw_bytes = await response.read()
+            # Read raw response (aiohttp handles decompression)
+            try:
+                raw_bytes = await _read_body_async(response)
+            except PageTooLarge:
+                if DEBUG: print(f'[SKIP] {url} is larger than {MAX_PAGE_BYTES} bytes')
+                return final_url, None, meta
 
-            # aiohttp handles gzip decompression
+            # Hand back raw bytes if decoding happens elsewhere (e.g. parse process pool)
+            meta['content_type'] = content_type
+            if not decode:
+                meta['content_length'] = len(raw_bytes)
+                return final_url, raw_bytes, meta
 
             # Detect encoding
-            encoding = _detect_encoding(raw_bytes, content_type)
+            encoding = detect_encoding(raw_bytes, content_type, urlsplit(final_url).netloc)
             try:
                 # Decode to HTML
                 html = raw_bytes.decode(encoding, errors='replace')
@@ -137,13 +239,22 @@ async def fetch_page_async(url, session):
     except ClientResponseError as e:
         meta['status_code'] = e.status
         meta['timestamp'] = datetime.now(timezone.utc).isoformat()
+        retry_after = _retry_after(e.headers.get('Retry-After') if e.headers else None)
+        if retry_after is not None: meta['retry_after'] = retry_after
         if DEBUG: print(f'[ERROR] Failed to fetch {url}: {e}')
         return url, None, meta
 
     # Handle network-level errors (e.g. DNS failure, connection timeout)
     except ClientConnectorError as e:
+        meta['error'] = _error_kind(e)
         if DEBUG: print(f'[ERROR] Failed to fetch {url}: {e}')
         return url, None, meta
+
+    # Handle timeouts (connecting, or waiting on the response)
+    except TimeoutError as e:
+        meta['error'] = _error_kind(e)
+        if DEBUG: print(f'[TIMEOUT] Fetching {url} took too long')
+        return url, None, meta
     
     # Handle unexpected errors
     except Exception as e:
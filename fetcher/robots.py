@@ -1,54 +1,405 @@
-from urllib.robotparser import RobotFileParser
+from urllib.error import HTTPError
 from urllib.parse import urlparse, urljoin
+from collections import OrderedDict
+from bisect import bisect_left, bisect_right
+from os.path import commonprefix
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from threading import Lock, Condition
+from asyncio import Event, ensure_future
+from re import compile as compile_regex, escape, search
+from time import time
 
-from config import DEBUG
+from fetcher.connection import default_pool
+from fetcher.page import HEADERS, _read_body
+from config import ROBOTS_CACHE_SIZE, ROBOTS_CACHE_TTL, ROBOTS_MIN_TTL, ROBOTS_FAILURE_TTL, ROBOTS_WAIT_TIMEOUT, DEBUG
 
-def is_allowed(url, cache, user_agent='*'):
-    parse_result = urlparse(url)
-    base_url = f'{parse_result.scheme}://{parse_result.netloc}'
+# Compiled Allow/Disallow rules for one host (longest match wins, ties go to Allow)
+class RobotsRules:
+    __slots__ = ('prefixes', 'allowed', 'patterns', 'crawl_delay', 'ttl')
+
+    def __init__(self, ttl=ROBOTS_CACHE_TTL):
+        self.prefixes = []      # sorted plain rule paths
+        self.allowed = []       # allow flag of each prefix
+        self.patterns = []      # (length, allow, regex) for rules with * or $ wildcards
+        self.crawl_delay = None # Crawl-delay in seconds (if given)
+        self.ttl = ttl          # Seconds this entry may be cached
+
+    @classmethod
+    def parse(cls, lines, user_agent='*', ttl=ROBOTS_CACHE_TTL):
+        # Group rules by user-agent (consecutive user-agent lines share one group)
+        groups, agents, in_rules = {}, [], False
+        for line in lines:
+            line = line.split('#', 1)[0].strip()
+            if ':' not in line: continue
+            field, value = line.split(':', 1)
+            field, value = field.strip().lower(), value.strip()
+
+            if field == 'user-agent':
+                if in_rules: agents, in_rules = [], False
+                agents.append(value.lower())
+                for agent in agents: groups.setdefault(agent, [])
+            elif field in ('allow', 'disallow', 'crawl-delay') and agents:
+                in_rules = True
+                for agent in agents: groups[agent].append((field, value))
+
+        # Use the most specific group naming this agent, falling back to *
+        user_agent = user_agent.lower()
+        matches = [agent for agent in groups if agent != '*' and agent in user_agent]
+        rules = groups[max(matches, key=len)] if matches else groups.get('*', [])
+
+        # Compile selected group
+        compiled = cls(ttl)
+        for field, value in rules:
+            if field == 'crawl-delay':
+                try: compiled.crawl_delay = float(value)
+                except ValueError: pass
+            elif value:
+                compiled.add(value, field == 'allow')
+        return compiled
+
+    @classmethod
+    def allow_all(cls, ttl=ROBOTS_CACHE_TTL):
+        return cls(ttl)
+
+    @classmethod
+    def disallow_all(cls, ttl=ROBOTS_CACHE_TTL):
+        rules = cls(ttl)
+        rules.add('/', False)
+        return rules
+
+    def add(self, path, allow):
+        # Wildcard rules aren't plain prefixes, so match them with a regex instead
+        if '*' in path or path.endswith('$'):
+            anchored = path.endswith('$')
+            pattern = '.*'.join(escape(part) for part in path.rstrip('$').split('*'))
+            self.patterns.append((len(path), allow, compile_regex(pattern + ('$' if anchored else ''))))
+            return
+
+        # Keep prefixes sorted (the same path listed twice is allowed if either rule allows it)
+        index = bisect_left(self.prefixes, path)
+        if index < len(self.prefixes) and self.prefixes[index] == path:
+            self.allowed[index] = self.allowed[index] or allow
+        else:
+            self.prefixes.insert(index, path)
+            self.allowed.insert(index, allow)
+
+    def allows(self, path):
+        if path == '/robots.txt': return True
+
+        best_length, best_allow = -1, True
+        index = self._longest_prefix(path)
+        if index >= 0: best_length, best_allow = len(self.prefixes[index]), self.allowed[index]
+
+        # Wildcard rules compete on pattern length
+        for length, allow, regex in self.patterns:
+            if length >= best_length and regex.match(path):
+                if length > best_length or allow: best_length, best_allow = length, allow
+
+        return best_allow
+
+    def _longest_prefix(self, path):
+        # Index of the longest rule prefix of path (-1 if none). The closest rule sorting at or before
+        # path is either that prefix, or shares a shorter common prefix with path that the match must
+        # fit in, so narrow the path to it and search the rules before again.
+        prefixes, end = self.prefixes, len(self.prefixes)
+        while end:
+            index = bisect_right(prefixes, path, 0, end) - 1
+            if index < 0: return -1
+            rule = prefixes[index]
+            if path.startswith(rule): return index
+            path, end = commonprefix((rule, path)), index
+        return -1
+
+# Bounded LRU of compiled rules per scheme://netloc with per-entry expiry
+class RobotsCache:
+    def __init__(self, max_size=ROBOTS_CACHE_SIZE):
+        self.max_size = max_size
+        self.entries = OrderedDict() # base_url -> (rules or None, expires_at)
+        self.lock = Lock()
+
+    def __contains__(self, base_url):
+        return self._lookup(base_url) is not None
+
+    def __getitem__(self, base_url):
+        entry = self._lookup(base_url)
+        if entry is None: raise KeyError(base_url)
+        return entry[0]
+
+    def __setitem__(self, base_url, rules):
+        # Failed fetches (None) are only cached briefly so the host gets retried
+        ttl = rules.ttl if rules is not None else ROBOTS_FAILURE_TTL
+        with self.lock:
+            self.entries[base_url] = (rules, time() + ttl)
+            self.entries.move_to_end(base_url)
+
+            # Evict least recently used hosts past the size cap
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, base_url, default=None):
+        entry = self._lookup(base_url)
+        return entry[0] if entry is not None else default
+
+    def copy(self):
+        # Point-in-time copy (compiled rules are shared, they are never modified), e.g. for checkpoints
+        cache = RobotsCache(self.max_size)
+        with self.lock:
+            cache.entries = self.entries.copy()
+        return cache
+
+    def __getstate__(self):
+        # Locks can't be pickled, so drop it and make a fresh one on load
+        state = self.__dict__.copy()
+        del state['lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = Lock()
+
+    def crawl_delay(self, base_url):
+        entry = self._lookup(base_url)
+        return entry[0].crawl_delay if entry and entry[0] is not None else None
+
+    def _lookup(self, base_url):
+        with self.lock:
+            entry = self.entries.get(base_url)
+            if entry is None: return None
+
+            # Drop expired entries so the caller refetches robots.txt
+            if entry[1] <= time():
+                del self.entries[base_url]
+                return None
+
+            self.entries.move_to_end(base_url)
+            return entry
+
+_MISSING = object() # Cache miss marker (None means robots.txt failed and everything is allowed)
+
+def _split_url(url):
+    # Cheap scheme://netloc and path split (avoids a full urlparse per link)
+    start = url.find('://')
+    if start == -1:
+        parse_result = urlparse(url)
+        return f'{parse_result.scheme}://{parse_result.netloc}', parse_result.path or '/'
+
+    end = url.find('/', start + 3)
+    if end == -1: return url, '/'
+    return url[:end], url[end:].split('#', 1)[0]
+
+def _base_url(url):
+    return _split_url(url)[0]
+
+def _can_fetch(rules, url):
+    return rules is None or rules.allows(_split_url(url)[1])  # If None, allow everything
+
+def _cache_ttl(headers):
+    # Respect Cache-Control max-age, within the configured bounds (max-age=0 would expire before the rules are used)
+    match = search(r'max-age=(\d+)', headers.get('Cache-Control', ''))
+    return max(ROBOTS_MIN_TTL, min(int(match.group(1)), ROBOTS_CACHE_TTL)) if match else ROBOTS_CACHE_TTL
+
+def _rules_for_status(status_code):
+    # Same semantics as RobotFileParser: 401/403 block everything, other 4xx allow everything
+    if status_code in (401, 403): return RobotsRules.disallow_all(ROBOTS_FAILURE_TTL)
+    if 400 <= status_code < 500: return RobotsRules.allow_all()
+    return RobotsRules.disallow_all(ROBOTS_FAILURE_TTL) # 5xx: unreachable, so don't crawl yet
+
+def _fetch_robots(base_url, user_agent='*'):
     robots_url = urljoin(base_url, '/robots.txt')
 
-    # Use cached parser if available
-    if base_url in cache:
-        rp = cache[base_url]
-        return rp is None or rp.can_fetch(user_agent, url)  # If None, allow everything
-    
-    rp = RobotFileParser()
-    rp.set_url(robots_url)
-    
     try:
-        rp.read()
-        cache[base_url] = rp
-        return rp.can_fetch(user_agent, url)
-    
+        # Share keep-alive connections with page fetches (and their Content-Encoding handling)
+        with default_pool.urlopen(robots_url, HEADERS) as response:
+            lines = _read_body(response).decode('utf-8', errors='replace').splitlines()
+            return RobotsRules.parse(lines, user_agent, _cache_ttl(response.headers))
+
+    except HTTPError as e:
+        return _rules_for_status(e.code)
+
     except Exception as e:
         # Print warning, but still allow crawl
         if DEBUG: print(f'[WARNING] Failed to fetch {robots_url}: {e}')
-        cache[base_url] = None
-        return True
+        return None
 
-async def is_allowed_async(url, cache, session, user_agent='*'):
-    parse_result = urlparse(url)
-    base_url = f'{parse_result.scheme}://{parse_result.netloc}'
+async def _fetch_robots_async(base_url, session, user_agent='*'):
     robots_url = urljoin(base_url, '/robots.txt')
 
-    # Use cached parser if available
-    if base_url in cache:
-        rp = cache[base_url]
-        return rp is None or rp.can_fetch(user_agent, url)  # If None, allow everything
-
-    rp = RobotFileParser()
-
     try:
         async with session.get(robots_url, timeout=5) as response:
-            # Read and parse lines
-            content = await response.text()
-            rp.parse(content.splitlines())
-            cache[base_url] = rp
-            return rp.can_fetch(user_agent, url)
+            if response.status >= 400: return _rules_for_status(response.status)
+
+            # Read and compile lines
+            content = await response.text(errors='replace')
+            return RobotsRules.parse(content.splitlines(), user_agent, _cache_ttl(response.headers))
 
     except Exception as e:
         # Print warning, but still allow crawl
         if DEBUG: print(f'[WARNING] Failed to fetch {robots_url}: {e}')
-        cache[base_url] = None
-        return True
\ No newline at end of file
+        return None
+
+def is_allowed(url, cache, user_agent='*'):
+    base_url = _base_url(url)
+
+    # Use cached parser if available
+    if base_url not in cache:
+        cache[base_url] = _fetch_robots(base_url, user_agent)
+
+    return _can_fetch(cache[base_url], url)
+
+async def is_allowed_async(url, cache, session, user_agent='*'):
+    base_url = _base_url(url)
+
+    # Use cached parser if available
+    if base_url not in cache:
+        cache[base_url] = await _fetch_robots_async(base_url, session, user_agent)
+
+    return _can_fetch(cache[base_url], url)
+
+# Resolves robots.txt in background threads with at most one in-flight fetch per host.
+# Links to unresolved hosts are parked in a pending area and released once the host resolves.
+class RobotsResolver:
+    def __init__(self, cache, max_workers=8, user_agent='*', fetch=_fetch_robots):
+        self.cache = cache
+        self.user_agent = user_agent
+        self.fetch = fetch  # base_url, user_agent -> RobotsRules (or None to allow everything)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.lock = Lock()
+        self.ready_cond = Condition(self.lock)
+        self.inflight = {}  # base_url -> Future of the shared robots.txt fetch
+        self.pending = {}   # base_url -> items waiting on that fetch
+        self.ready = []     # (item, allowed) pairs released by finished fetches
+
+    def status(self, url):
+        # True/False if the host is resolved, None if it is not yet known
+        base_url, path = _split_url(url)
+        rules = self.cache.get(base_url, _MISSING)
+        if rules is _MISSING: return None
+        return rules is None or rules.allows(path)
+
+    def defer(self, url, item):
+        # Park item until the host's robots.txt resolves (returns False if it already has)
+        base_url = _base_url(url)
+        with self.lock:
+            if base_url in self.cache: return False
+            self.pending.setdefault(base_url, []).append(item)
+            self._submit(base_url)
+            return True
+
+    def wait(self, url, timeout=ROBOTS_WAIT_TIMEOUT):
+        # Block on the shared fetch for this host (used once a page has already been fetched)
+        allowed = self.status(url)
+        if allowed is not None: return allowed
+
+        base_url = _base_url(url)
+        with self.lock:
+            if base_url in self.cache: return _can_fetch(self.cache[base_url], url)
+            future = self._submit(base_url)
+
+        # Judge by the fetched rules (the cache entry may already be gone again); a fetch that doesn't
+        # finish in time counts as failed, which allows everything
+        try:
+            return _can_fetch(future.result(timeout), url)
+        except TimeoutError:
+            if DEBUG: print(f'[WARNING] Timed out waiting for {base_url}/robots.txt')
+            return True
+
+    def drain(self):
+        # Hand over all released items to the scheduler
+        with self.lock:
+            ready, self.ready = self.ready, []
+        return ready
+
+    def has_pending(self):
+        with self.lock:
+            return bool(self.pending or self.ready)
+
+    def wait_ready(self, timeout):
+        # Sleep until at least one pending host resolves
+        with self.ready_cond:
+            if not self.ready: self.ready_cond.wait(timeout)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _submit(self, base_url):
+        # Caller must hold the lock
+        future = self.inflight.get(base_url)
+        if future is None:
+            future = self.executor.submit(self._resolve, base_url)
+            self.inflight[base_url] = future
+        return future
+
+    def _resolve(self, base_url):
+        rules = self.fetch(base_url, self.user_agent)
+        with self.ready_cond:
+            self.cache[base_url] = rules
+            self.inflight.pop(base_url, None)
+
+            # Release links that were waiting on this host
+            for item in self.pending.pop(base_url, []):
+                self.ready.append((item, _can_fetch(rules, item[1])))
+            self.ready_cond.notify_all()
+        return rules
+
+# Asyncio counterpart of RobotsResolver (runs entirely on the event loop, so no locks needed)
+class AsyncRobotsResolver:
+    def __init__(self, cache, session, user_agent='*'):
+        self.cache = cache
+        self.session = session
+        self.user_agent = user_agent
+        self.inflight = {}  # base_url -> Task of the shared robots.txt fetch
+        self.pending = {}   # base_url -> items waiting on that fetch
+        self.ready = []     # (item, allowed) pairs released by finished fetches
+        self.ready_event = Event()
+
+    def status(self, url):
+        base_url, path = _split_url(url)
+        rules = self.cache.get(base_url, _MISSING)
+        if rules is _MISSING: return None
+        return rules is None or rules.allows(path)
+
+    def defer(self, url, item):
+        base_url = _base_url(url)
+        if base_url in self.cache: return False
+        self.pending.setdefault(base_url, []).append(item)
+        self._submit(base_url)
+        return True
+
+    async def wait(self, url):
+        allowed = self.status(url)
+        if allowed is not None: return allowed
+
+        rules = await self._submit(_base_url(url))
+        return _can_fetch(rules, url)
+
+    def drain(self):
+        ready, self.ready = self.ready, []
+        self.ready_event.clear()
+        return ready
+
+    def has_pending(self):
+        return bool(self.pending or self.ready)
+
+    async def wait_ready(self):
+        await self.ready_event.wait()
+
+    def _submit(self, base_url):
+        task = self.inflight.get(base_url)
+        if task is None:
+            task = ensure_future(self._resolve(base_url))
+            self.inflight[base_url] = task
+        return task
+
+    async def _resolve(self, base_url):
+        rules = await _fetch_robots_async(base_url, self.session, self.user_agent)
+        self.cache[base_url] = rules
+        self.inflight.pop(base_url, None)
+
+        # Release links that were waiting on this host
+        for item in self.pending.pop(base_url, []):
+            self.ready.append((item, _can_fetch(rules, item[1])))
+        self.ready_event.set()
+        return rules
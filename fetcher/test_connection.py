@@ -0,0 +1,140 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socket import socket
+from threading import Thread
+from time import sleep
+from http.client import IncompleteRead
+from urllib.error import HTTPError, URLError
+
+import pytest
+
+from fetcher.connection import ConnectionPool, ConnectError
+
+class Handler(BaseHTTPRequestHandler):
+    # Keep-alive server: /redirect redirects to /, /truncated is a redirect whose body is cut short,
+    # /missing is a 404, anything else is a small page
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.clients.append(self.client_address)
+        if self.path == '/truncated':
+            self.send_response(302)
+            self.send_header('Location', '/')
+            self.send_header('Content-Length', '100')
+            self.end_headers()
+            self.wfile.write(b'moved')
+            self.close_connection = True
+            return
+        if self.path == '/redirect':
+            self.send_response(302)
+            self.send_header('Location', '/')
+            body = b''
+        elif self.path == '/missing':
+            self.send_response(404)
+            body = b'not found'
+        else:
+            self.send_response(200)
+            body = f'page {self.path}'.encode()
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    server.clients = []
+    server.url = f'http://127.0.0.1:{server.server_address[1]}'
+    Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def pool():
+    pool = ConnectionPool()
+    yield pool
+    pool.close()
+
+def test_keep_alive_reuses_connection(server, pool):
+    for path in ('/a', '/b', '/c'):
+        with pool.urlopen(server.url + path) as response:
+            assert response.read() == f'page {path}'.encode()
+    assert len(server.clients) == 3
+    assert len(set(server.clients)) == 1
+
+def test_unread_body_closes_connection(server, pool):
+    with pool.urlopen(server.url + '/a'): pass
+    with pool.urlopen(server.url + '/b') as response: response.read()
+    assert len(set(server.clients)) == 2
+
+def test_redirects_followed(server, pool):
+    with pool.urlopen(server.url + '/redirect') as response:
+        assert response.geturl() == server.url + '/'
+        assert response.getcode() == 200
+        assert response.read() == b'page /'
+
+def test_http_error(server, pool):
+    with pytest.raises(HTTPError) as error:
+        pool.urlopen(server.url + '/missing')
+    assert error.value.code == 404
+
+    # The slot was released, so the host can be fetched again
+    with pool.urlopen(server.url + '/a') as response: response.read()
+
+def test_connect_error(pool):
+    # Port that nothing listens on
+    with socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    with pytest.raises(ConnectError):
+        pool.urlopen(f'http://127.0.0.1:{port}/')
+
+def test_truncated_redirect_releases_slot(server):
+    pool = ConnectionPool(max_per_host=2, wait_timeout=1)
+    try:
+        for _ in range(3):
+            with pytest.raises(IncompleteRead):
+                pool.urlopen(server.url + '/truncated')
+        assert not pool.active
+
+        with pool.urlopen(server.url + '/a') as response:
+            assert response.read() == b'page /a'
+    finally:
+        pool.close()
+
+def test_per_host_cap(server):
+    pool = ConnectionPool(max_per_host=1, wait_timeout=0.2)
+    try:
+        held = pool.urlopen(server.url + '/a')
+
+        # The only slot is checked out, so the next fetch to the host gives up instead of hanging
+        with pytest.raises(URLError):
+            pool.urlopen(server.url + '/b')
+
+        held.read()
+        with pool.urlopen(server.url + '/b') as response:
+            assert response.read() == b'page /b'
+        assert len(set(server.clients)) == 1
+    finally:
+        pool.close()
+
+def test_idle_eviction(server):
+    pool = ConnectionPool(idle_timeout=0.1)
+    try:
+        with pool.urlopen(server.url + '/a') as response: response.read()
+        assert ('http', server.url[7:]) in pool.idle
+        sleep(0.2)
+
+        # Releasing a connection to another host sweeps out the expired one
+        other = server.url.replace('127.0.0.1', 'localhost')
+        with pool.urlopen(other + '/b') as response: response.read()
+        assert ('http', server.url[7:]) not in pool.idle
+
+        # And the next fetch to the first host opens a new connection
+        with pool.urlopen(server.url + '/c') as response: response.read()
+        assert len(set(server.clients)) == 3
+    finally:
+        pool.close()
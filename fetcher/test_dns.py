@@ -0,0 +1,111 @@
+from asyncio import run
+from socket import socket, gaierror, AF_INET, AF_INET6, SOCK_STREAM, IPPROTO_TCP, EAI_NONAME
+from threading import Event, Thread
+from concurrent.futures import ThreadPoolExecutor
+from time import sleep
+
+import pytest
+
+from fetcher.dns import DnsCache, CachedResolver
+
+ADDRESSES = {'example.com': '192.0.2.1', 'example.org': '192.0.2.2'}
+
+class StubResolver:
+    # getaddrinfo over ADDRESSES, counting lookups (and blocking them until released if gate is given)
+    def __init__(self, gate=None):
+        self.gate = gate
+        self.calls = []
+
+    def __call__(self, host, port, family=0, kind=0):
+        self.calls.append(host)
+        if self.gate is not None: self.gate.wait(5)
+        if host not in ADDRESSES: raise gaierror(EAI_NONAME, 'Name or service not known')
+        return [(AF_INET, SOCK_STREAM, IPPROTO_TCP, '', (ADDRESSES[host], 0)), (AF_INET6, SOCK_STREAM, IPPROTO_TCP, '', ('2001:db8::1', 0, 0, 0))]
+
+def test_resolve_caches_addresses():
+    resolver = StubResolver()
+    cache = DnsCache(resolver=resolver)
+    assert cache.cached('example.com') is None
+    assert cache.resolve('example.com', 443, AF_INET) == [(AF_INET, SOCK_STREAM, IPPROTO_TCP, '', ('192.0.2.1', 443))]
+    assert cache.resolve('example.com', 80)[1][4] == ('2001:db8::1', 80, 0, 0)
+    assert cache.cached('example.com', 80, AF_INET)[0][4] == ('192.0.2.1', 80)
+    assert resolver.calls == ['example.com']
+
+def test_failures_cached_briefly():
+    resolver = StubResolver()
+    cache = DnsCache(failure_ttl=0.05, resolver=resolver)
+    for _ in range(2):
+        with pytest.raises(gaierror): cache.resolve('missing.example')
+    assert resolver.calls == ['missing.example']
+
+    sleep(0.1)
+    with pytest.raises(gaierror): cache.resolve('missing.example')
+    assert len(resolver.calls) == 2
+
+def test_concurrent_resolves_share_one_lookup():
+    gate = Event()
+    resolver = StubResolver(gate)
+    cache = DnsCache(resolver=resolver)
+    with ThreadPoolExecutor(4) as executor:
+        results = [executor.submit(cache.resolve, 'example.com') for _ in range(4)]
+        sleep(0.05)
+        gate.set()
+        assert len({tuple(result.result()) for result in results}) == 1
+    assert resolver.calls == ['example.com']
+
+def test_lru_eviction():
+    cache = DnsCache(max_size=1, resolver=StubResolver())
+    cache.resolve('example.com')
+    cache.resolve('example.org')
+    assert cache.cached('example.com') is None
+    assert cache.cached('example.org') is not None
+
+def test_prefetch():
+    resolver = StubResolver()
+    cache = DnsCache(resolver=resolver)
+    cache.prefetch('example.com')
+    cache.prefetch('example.com')
+    assert cache.resolve('example.com')
+    assert resolver.calls == ['example.com']
+    cache.shutdown()
+
+def test_shutdown_fails_waiting_resolves():
+    gate = Event()
+    resolver = StubResolver(gate)
+    cache = DnsCache(max_workers=1, resolver=resolver)
+
+    # example.com blocks the only prefetch thread, so example.org stays queued
+    cache.prefetch('example.com')
+    cache.prefetch('example.org')
+    errors = []
+    def resolve():
+        try: cache.resolve('example.org')
+        except OSError as e: errors.append(e)
+    waiter = Thread(target=resolve)
+    waiter.start()
+    sleep(0.05)
+
+    cache.shutdown()
+    waiter.join(1)
+    assert not waiter.is_alive() and len(errors) == 1
+
+    # Nothing is left in flight, so the host is looked up again
+    gate.set()
+    assert cache.resolve('example.org')[0][4] == ('192.0.2.2', 0)
+    cache.prefetch('example.net')
+    assert 'example.net' in cache.inflight or 'example.net' in resolver.calls
+    cache.shutdown()
+
+def test_create_connection_through_cache():
+    with socket() as server:
+        server.bind(('127.0.0.1', 0))
+        server.listen()
+        cache = DnsCache(resolver=lambda host, port, family=0, kind=0: [(AF_INET, SOCK_STREAM, IPPROTO_TCP, '', ('127.0.0.1', 0))])
+        with cache.create_connection(('local.test', server.getsockname()[1]), timeout=1) as sock:
+            assert sock.getpeername() == server.getsockname()
+
+def test_aiohttp_resolver():
+    resolver = CachedResolver(DnsCache(resolver=StubResolver()))
+    hosts = run(resolver.resolve('example.com', 443, AF_INET))
+    assert [(host['hostname'], host['host'], host['port']) for host in hosts] == [('example.com', '192.0.2.1', 443)]
+    with pytest.raises(gaierror): run(resolver.resolve('missing.example'))
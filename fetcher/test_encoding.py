@@ -0,0 +1,48 @@
+import pytest
+
+import fetcher.encoding
+from fetcher.encoding import detect_encoding, host_encodings
+
+LATIN1 = 'Café crème, déjà vu, à la carte. '.encode('iso-8859-1') * 20
+
+@pytest.fixture(autouse=True)
+def clear_host_cache():
+    host_encodings.clear()
+    yield
+    host_encodings.clear()
+
+def test_header_charset():
+    assert detect_encoding(b'abc', 'text/html; charset="windows-1252"') == 'windows-1252'
+
+def test_byte_order_mark():
+    assert detect_encoding(b'\xef\xbb\xbfabc', 'text/html') == 'utf-8-sig'
+    assert detect_encoding('abc'.encode('utf-16'), 'text/html') == 'utf-16'
+
+def test_meta_charset():
+    assert detect_encoding(b'<html><head><meta charset="ISO-8859-1"></head>', 'text/html') == 'iso8859-1'
+    assert detect_encoding(b'<meta http-equiv="Content-Type" content="text/html; charset=Shift_JIS">', 'text/html') == 'shift_jis'
+
+    # Unknown names fall through to the next step
+    assert detect_encoding(b'<meta charset="bogus">', 'text/html') == 'utf-8'
+
+def test_utf8_fast_path():
+    assert detect_encoding('Café'.encode('utf-8'), 'text/html') == 'utf-8'
+
+def test_detected_encoding_cached_per_host():
+    encoding = detect_encoding(LATIN1, 'text/html', 'example.com')
+    assert encoding != 'utf-8'
+    assert host_encodings['example.com'] == encoding
+    assert detect_encoding(b'\xe9t\xe9', 'text/html', 'example.com') == encoding
+
+def test_utf8_page_after_cached_guess():
+    detect_encoding(LATIN1, 'text/html', 'example.com')
+    assert detect_encoding('Café'.encode('utf-8'), 'text/html', 'example.com') == 'utf-8'
+
+class EvictedCache(dict):
+    # Host cache whose entry is evicted by another thread right after a membership check
+    def __contains__(self, host):
+        return True
+
+def test_host_evicted_during_lookup(monkeypatch):
+    monkeypatch.setattr(fetcher.encoding, 'host_encodings', EvictedCache())
+    assert detect_encoding(LATIN1, 'text/html', 'example.com') != 'utf-8'
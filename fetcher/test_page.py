@@ -0,0 +1,72 @@
+from gzip import compress as gzip_compress
+from io import BytesIO
+from socket import socket, gaierror, timeout
+from zlib import compress as zlib_compress, compressobj, MAX_WBITS
+
+import pytest
+
+from fetcher.connection import ConnectError
+from fetcher.page import PageTooLarge, _Decompressor, _read_body, _retry_after, _error_kind, fetch_page
+
+BODY = b'<html><body>' + b'<p>Hello, world!</p>' * 5000 + b'</body></html>'
+
+class Response(BytesIO):
+    # Just enough of a response for _read_body
+    def __init__(self, body, content_encoding=''):
+        super().__init__(body)
+        self.headers = {'Content-Encoding': content_encoding}
+
+def raw_deflate(data):
+    compressor = compressobj(wbits=-MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+ENCODINGS = [
+    ('', lambda data: data),
+    ('gzip', gzip_compress),
+    ('deflate', zlib_compress),
+    ('deflate', raw_deflate),   # sent without the zlib header by some servers
+]
+
+@pytest.mark.parametrize('content_encoding, compress', ENCODINGS)
+def test_read_body(content_encoding, compress):
+    assert _read_body(Response(compress(BODY), content_encoding)) == BODY
+    assert _read_body(Response(compress(BODY), content_encoding), len(BODY)) == BODY
+
+@pytest.mark.parametrize('content_encoding, compress', ENCODINGS)
+def test_read_body_too_large(content_encoding, compress):
+    with pytest.raises(PageTooLarge):
+        _read_body(Response(compress(BODY), content_encoding), len(BODY) - 1)
+
+def test_gzip_bomb_stops_at_limit():
+    with pytest.raises(PageTooLarge):
+        _Decompressor('gzip').feed(gzip_compress(bytes(64 * 1024 * 1024)), 1024 * 1024)
+
+def test_brotli():
+    brotli = pytest.importorskip('brotli')
+    assert _read_body(Response(brotli.compress(BODY), 'br')) == BODY
+    with pytest.raises(PageTooLarge):
+        _read_body(Response(brotli.compress(BODY), 'br'), len(BODY) - 1)
+
+    # A single chunk that expands far past the limit is cut off while decompressing
+    with pytest.raises(PageTooLarge):
+        _Decompressor('br').feed(brotli.compress(bytes(64 * 1024 * 1024), quality=1), 1024 * 1024)
+
+def test_retry_after():
+    assert _retry_after(None) is None
+    assert _retry_after(' 120 ') == 120
+    assert _retry_after('Wed, 21 Oct 2015 07:28:00 GMT') == 0
+    assert _retry_after('soon') is None
+
+def test_error_kind():
+    assert _error_kind(ConnectError(gaierror(-2, 'Name or service not known'))) == 'dns'
+    assert _error_kind(ConnectError(ConnectionRefusedError())) == 'connect'
+    assert _error_kind(timeout('timed out')) == 'read'
+
+def test_fetch_error_meta():
+    # Port that nothing listens on
+    with socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    _, html, meta = fetch_page(f'http://127.0.0.1:{port}/')
+    assert html is None
+    assert meta['status_code'] == 0 and meta['error'] == 'connect'
@@ -0,0 +1,219 @@
+from gzip import compress
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread, Event
+from asyncio import run
+from urllib.robotparser import RobotFileParser
+from itertools import product
+import tracemalloc
+
+import pytest
+
+import fetcher.robots
+from fetcher.robots import RobotsRules, RobotsCache, RobotsResolver, AsyncRobotsResolver, _cache_ttl, _fetch_robots, is_allowed
+from config import ROBOTS_CACHE_TTL, ROBOTS_MIN_TTL
+
+ROBOTS_TXT = b'User-agent: *\nDisallow: /private\n'
+
+class RobotsHandler(BaseHTTPRequestHandler):
+    # Serves ROBOTS_TXT for every path (gzipped if the server was started with gzip=True)
+    def do_GET(self):
+        body = compress(ROBOTS_TXT) if self.server.gzip else ROBOTS_TXT
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', str(len(body)))
+        if self.server.gzip: self.send_header('Content-Encoding', 'gzip')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def serve(gzip):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), RobotsHandler)
+    server.gzip = gzip
+    Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+@pytest.fixture(params=[False, True], ids=['identity', 'gzip'])
+def base_url(request):
+    server = serve(request.param)
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+    server.server_close()
+
+def test_fetch_robots_decodes_content_encoding(base_url):
+    rules = _fetch_robots(base_url)
+    assert rules is not None
+    assert not rules.allows('/private/page')
+    assert rules.allows('/public')
+
+def test_is_allowed_gzipped_disallow(base_url):
+    cache = RobotsCache()
+    assert not is_allowed(f'{base_url}/private', cache)
+    assert is_allowed(f'{base_url}/index.html', cache)
+
+def test_cache_ttl_bounds():
+    assert _cache_ttl({}) == ROBOTS_CACHE_TTL
+    assert _cache_ttl({'Cache-Control': 'public, max-age=600'}) == 600
+    assert _cache_ttl({'Cache-Control': 'max-age=0'}) == ROBOTS_MIN_TTL
+    assert _cache_ttl({'Cache-Control': f'max-age={ROBOTS_CACHE_TTL * 2}'}) == ROBOTS_CACHE_TTL
+
+def expired_rules(*args):
+    # Rules that are already stale when cached
+    return RobotsRules.parse(ROBOTS_TXT.decode().splitlines(), ttl=0)
+
+def test_wait_uses_fetched_rules():
+    resolver = RobotsResolver(RobotsCache(), fetch=expired_rules)
+    try:
+        assert resolver.wait('http://example.com/index.html') is True
+        assert resolver.wait('http://example.com/private') is False
+    finally:
+        resolver.shutdown()
+
+def test_async_wait_uses_fetched_rules(monkeypatch):
+    async def fetch(*args):
+        return expired_rules()
+    monkeypatch.setattr(fetcher.robots, '_fetch_robots_async', fetch)
+
+    async def check():
+        resolver = AsyncRobotsResolver(RobotsCache(), session=None)
+        return await resolver.wait('http://example.com/index.html'), await resolver.wait('http://example.com/private')
+    assert run(check()) == (True, False)
+
+def test_wait_times_out_on_stuck_fetch():
+    gate = Event()
+    def stuck(base_url, user_agent):
+        gate.wait(5)
+        return RobotsRules.disallow_all()
+    resolver = RobotsResolver(RobotsCache(), fetch=stuck)
+    try:
+        # Judged allowed, as if the fetch had failed
+        assert resolver.wait('http://example.com/private', timeout=0.1) is True
+    finally:
+        gate.set()
+        resolver.shutdown()
+
+def test_resolver_defers_until_resolved():
+    gate = Event()
+    def fetch(base_url, user_agent):
+        gate.wait(5)
+        return RobotsRules.parse(ROBOTS_TXT.decode().splitlines())
+    resolver = RobotsResolver(RobotsCache(), fetch=fetch)
+    try:
+        # Links to an unresolved host are parked, with one fetch shared by all of them
+        assert resolver.status('http://example.com/a') is None
+        assert resolver.defer('http://example.com/a', (-1, 'http://example.com/a', 0))
+        assert resolver.defer('http://example.com/private', (-1, 'http://example.com/private', 0))
+        assert len(resolver.inflight) == 1
+        assert resolver.has_pending() and resolver.drain() == []
+
+        gate.set()
+        resolver.wait_ready(5)
+        assert sorted(resolver.drain()) == [((-1, 'http://example.com/a', 0), True), ((-1, 'http://example.com/private', 0), False)]
+        assert not resolver.has_pending()
+
+        # Resolved hosts are answered from the cache
+        assert not resolver.defer('http://example.com/b', (-1, 'http://example.com/b', 0))
+        assert resolver.status('http://example.com/b') is True
+    finally:
+        resolver.shutdown()
+
+def parse(text, user_agent='*'):
+    return RobotsRules.parse(text.strip().splitlines(), user_agent)
+
+def test_longest_match_wins():
+    rules = parse('''
+        User-agent: *
+        Disallow: /shop
+        Allow: /shop/public
+        Disallow: /shop/public/secret
+    ''')
+    assert rules.allows('/')
+    assert not rules.allows('/shop')
+    assert not rules.allows('/shopping')
+    assert rules.allows('/shop/public/item')
+    assert not rules.allows('/shop/public/secret/1')
+    assert rules.allows('/robots.txt')
+
+def test_tie_goes_to_allow():
+    rules = parse('''
+        User-agent: *
+        Disallow: /page
+        Allow: /page
+    ''')
+    assert rules.allows('/page')
+
+def test_wildcards():
+    rules = parse('''
+        User-agent: *
+        Disallow: /*.pdf$
+        Disallow: /search*q=
+        Allow: /search/help
+    ''')
+    assert not rules.allows('/files/report.pdf')
+    assert rules.allows('/files/report.pdf.html')
+    assert not rules.allows('/search?q=dogs')
+    assert rules.allows('/search/help')
+
+def test_user_agent_groups():
+    text = '''
+        User-agent: *
+        Disallow: /
+
+        User-agent: MyBot
+        User-agent: OtherBot
+        Disallow: /private
+        Crawl-delay: 2.5
+    '''
+    assert not parse(text).allows('/page')
+    rules = parse(text, 'MyBot/1.0')
+    assert rules.allows('/page') and not rules.allows('/private')
+    assert rules.crawl_delay == 2.5
+    assert parse('User-agent: other\nDisallow: /').allows('/page')
+
+def test_cache_expiry_and_eviction():
+    cache = RobotsCache(max_size=2)
+    cache['http://a.com'] = RobotsRules.allow_all()
+    cache['http://b.com'] = RobotsRules(ttl=0)
+    assert 'http://a.com' in cache
+    assert 'http://b.com' not in cache
+    assert cache.get('http://b.com', 'missing') == 'missing'
+
+    # Least recently used host is evicted
+    cache['http://b.com'] = None
+    cache['http://a.com']
+    cache['http://c.com'] = RobotsRules.disallow_all()
+    assert 'http://b.com' not in cache
+    assert 'http://a.com' in cache and 'http://c.com' in cache
+    assert cache.copy().get('http://c.com') is cache['http://c.com']
+
+def test_longest_prefix_matches_brute_force():
+    prefixes = ['/', '/a', '/ab', '/abc', '/a/b', '/b', '/ba']
+    paths = ['/', '/a', '/ab', '/abd', '/abcd', '/a/', '/a/b/c', '/aa', '/b', '/bb', '/c']
+    for allowed in product((True, False), repeat=len(prefixes)):
+        rules = RobotsRules()
+        for prefix, allow in zip(prefixes, allowed): rules.add(prefix, allow)
+        for path in paths:
+            longest = max((prefix for prefix in prefixes if path.startswith(prefix)), key=len)
+            assert rules.allows(path) == allowed[prefixes.index(longest)]
+
+def test_rules_stay_compact():
+    # 40 plain rules should take no more memory than the RobotFileParser they replace
+    lines = ['User-agent: *'] + [f'{"Allow" if i % 3 else "Disallow"}: /section-{i}/category/page-{i}.html' for i in range(40)]
+
+    def allocated(build):
+        tracemalloc.start()
+        try:
+            built = build()
+            return tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+
+    def stdlib():
+        parser = RobotFileParser()
+        parser.parse(lines)
+        return parser
+
+    size = allocated(lambda: RobotsRules.parse(lines))
+    assert size < 8 * 1024
+    assert size < allocated(stdlib)
@@ -0,0 +1,194 @@
+from heapq import heappush, heappop
+from time import time
+from urllib.parse import urlsplit
+
+from frontier.spill import SpillStore
+from config import POLITENESS_DELAY, MAX_CRAWL_DELAY, FRONTIER_MEMORY_ITEMS
+
+def _host(url):
+    return urlsplit(url).netloc
+
+# Mercator-style frontier: items wait in per-host back queues, and a ready heap hands out the best
+# host whose next allowed fetch time has passed (one in-flight fetch per host). Priority is kept per
+# host and re-scored lazily on pop, so hosts that got crawled a lot since enqueue sink in the heap (and
+# hosts whose score improved, e.g. once a trap demotion lifts, rise again).
+# Hosts backing off after failures wait out their backoff like a politeness delay, and dropped hosts'
+# queues are discarded whole, so their URLs are never scanned.
+class Frontier:
+    def __init__(self, robots_cache=None, scorer=None, min_delay=POLITENESS_DELAY, max_delay=MAX_CRAWL_DELAY, memory_items=FRONTIER_MEMORY_ITEMS, journal=None, health=None, dns=None, clock=time):
+        self.robots_cache = robots_cache
+        self.scorer = scorer or self._head_priority # host -> current priority
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.queues = {}        # host -> heap of (-priority, url, depth) (back queues)
+        self.ready = []         # (-host priority, host) for hosts that may be fetched now
+        self.ready_head = {}    # host -> -priority its live ready-heap entry was pushed with
+        self.waiting = []       # (next allowed time, host) for hosts still in their delay
+        self.next_time = {}     # host -> next allowed fetch time (kept after its queue empties)
+        self.busy = {}          # host -> item whose fetch is in flight
+        self.size = 0           # items in the back queues
+
+        # Back queues hold at most memory_items; the rest spills to sorted runs on disk (0 = no limit)
+        self.memory_items = memory_items
+        self.spill = SpillStore() if memory_items else None
+
+        # Optional checkpoint journal that records pushes, pops and finished fetches for replay
+        self.journal = journal
+
+        # Optional per-host circuit breaker (utils/health.py)
+        self.health = health
+
+        # Optional DNS cache (fetcher/dns.py) that resolves hosts in the background as they enter the frontier
+        self.dns = dns
+
+        # Source of the current time (the offline simulator passes a virtual clock)
+        self.clock = clock
+
+    def __len__(self):
+        return self.size + (len(self.spill) if self.spill else 0)
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def push(self, item):
+        if self.journal is not None: self.journal.enqueued(item)
+
+        # Once anything has spilled, new items go through the spill tier too so they compete in priority order
+        if self.spill is not None and (self.size >= self.memory_items or self.spill):
+            self.spill.push(item)
+            return
+        self._push_queue(item)
+
+    def _push_queue(self, item):
+        host = _host(item[1])
+        if self.health is not None and self.health.is_dropped(host): return
+        queue = self.queues.setdefault(host, [])
+        if not queue and self.dns is not None: self.dns.prefetch(urlsplit(item[1]).hostname)
+        heappush(queue, item)
+        self.size += 1
+
+        # Ready host whose priority went up (e.g. a better item with the default scorer)
+        if host in self.ready_head:
+            key = -self.scorer(host)
+            if key < self.ready_head[host]: self._make_ready(host, key)
+            return
+
+        # Busy or waiting hosts are re-queued once their fetch finishes or delay ends
+        if host in self.busy or len(queue) > 1: return
+
+        # New host goes to the ready or waiting heap
+        if self.next_time.get(host, 0) > self.clock(): heappush(self.waiting, (self.next_time[host], host))
+        else: self._make_ready(host)
+
+    def pop(self):
+        # Refill back queues with the best spilled items once they drain to half
+        if self.spill and self.size < self.memory_items // 2: self._refill(self.memory_items - self.size)
+
+        item = self._pop_ready()
+
+        # Every queued host is busy or in its delay, so pull in more spilled items (other hosts may be
+        # ready), letting the back queues grow to at most twice their limit
+        if item is None and self.spill and self.size < 2 * self.memory_items:
+            self._refill(max(self.memory_items // 10, 1))
+            item = self._pop_ready()
+
+        if item is not None and self.journal is not None: self.journal.dispatched(item[1])
+        return item
+
+    def close(self):
+        # Remove spill files
+        if self.spill is not None: self.spill.close()
+
+    def items(self):
+        # Every item still owed a fetch (queued, in flight or spilled), in no particular order
+        items = [item for queue in self.queues.values() for item in queue]
+        items.extend(self.busy.values())
+        if self.spill: items.extend(self.spill.items())
+        return items
+
+    def snapshot(self):
+        # Like items(), but spilled runs on disk come back as open handles instead of being read in
+        items = [item for queue in self.queues.values() for item in queue]
+        items.extend(self.busy.values())
+        if not self.spill: return items, []
+        spilled, runs = self.spill.snapshot()
+        return items + spilled, runs
+
+    def _refill(self, count):
+        for item in self.spill.pop_many(count):
+            self._push_queue(item)
+
+    def _pop_ready(self):
+        # Move hosts whose delay has passed into the ready heap
+        self._promote()
+
+        while self.ready:
+            key, host = heappop(self.ready)
+
+            # Skip stale entries (host was re-pushed with a different priority since)
+            if self.ready_head.get(host) != key: continue
+
+            # Lazily re-score: if the host's priority changed since it was pushed, push it back at the new one
+            # (a better score is also picked up when the host gets a new item, see _push_queue)
+            current = -self.scorer(host)
+            if current != key:
+                self._make_ready(host, current)
+                continue
+            del self.ready_head[host]
+
+            # Hand out the host's best item (with its current priority) and hold the host until the fetch is done
+            queue = self.queues[host]
+            _, url, depth = heappop(queue)
+            if not queue: del self.queues[host]
+            self.size -= 1
+            self.busy[host] = (current, url, depth)
+            return self.busy[host]
+
+        # Nothing ready yet (see next_ready_time)
+        return None
+
+    def done(self, url):
+        # Fetch finished: host may be fetched again after its politeness delay (or backoff, if longer)
+        host = _host(url)
+        if host not in self.busy: return
+        del self.busy[host]
+        if self.journal is not None: self.journal.finished(url)
+        self.next_time[host] = self.clock() + self._delay(url)
+        if self.health is not None:
+            # Discard a dropped host's queue in one go
+            if self.health.is_dropped(host):
+                self.size -= len(self.queues.pop(host, ()))
+                return
+            self.next_time[host] = max(self.next_time[host], self.health.retry_time(host))
+        if host in self.queues: heappush(self.waiting, (self.next_time[host], host))
+
+    def next_ready_time(self):
+        # Earliest time a waiting host becomes ready (None if nothing is waiting)
+        self._promote()
+        if self.ready: return self.clock()
+        return self.waiting[0][0] if self.waiting else None
+
+    def _make_ready(self, host, key=None):
+        if key is None: key = -self.scorer(host)
+        self.ready_head[host] = key
+        heappush(self.ready, (key, host))
+
+    def _head_priority(self, host):
+        # Default scorer: priority of the host's best queued item
+        return -self.queues[host][0][0]
+
+    def _promote(self):
+        now = self.clock()
+        while self.waiting and self.waiting[0][0] <= now:
+            _, host = heappop(self.waiting)
+            if host in self.queues and host not in self.busy and host not in self.ready_head:
+                self._make_ready(host)
+
+    def _delay(self, url):
+        # Honor robots.txt Crawl-delay (capped), but never go below the default delay
+        delay = self.min_delay
+        if self.robots_cache is not None:
+            parts = urlsplit(url)
+            crawl_delay = self.robots_cache.crawl_delay(f'{parts.scheme}://{parts.netloc}')
+            if crawl_delay: delay = max(delay, min(crawl_delay, self.max_delay))
+        return delay
@@ -0,0 +1,142 @@
+from heapq import heappush, heappop
+from os import remove, rmdir
+from os.path import join
+from tempfile import mkdtemp
+
+from config import FRONTIER_SPILL_RUN, FRONTIER_SPILL_DIR
+
+def _format_item(item):
+    priority, url, depth = item
+    return f'{priority!r}\t{url}\t{depth}\n'
+
+def _parse_item(line):
+    priority, url, depth = line.rstrip('\n').split('\t')
+    return (float(priority), url, int(depth))
+
+# Sorted run on disk, read back one item at a time
+class _DiskRun:
+    def __init__(self, path, items):
+        self.path = path
+        with open(path, 'w', encoding='utf-8', errors='surrogatepass') as run:
+            run.writelines(_format_item(item) for item in items)
+        self.file = open(path, encoding='utf-8', errors='surrogatepass')
+
+    def next(self):
+        line = self.file.readline()
+        if line: return _parse_item(line)
+        self.close()
+        return None
+
+    def remaining(self):
+        # Items not read back yet (through a second handle, so the merge position is untouched)
+        if self.file.closed: return []
+        with open(self.path, encoding='utf-8', errors='surrogatepass') as run:
+            run.seek(self.file.tell())
+            return [_parse_item(line) for line in run]
+
+    def snapshot(self):
+        # Open handle on the items not read back yet, which stays readable after the run is consumed
+        # and removed (None once exhausted)
+        if self.file.closed: return [], None
+        run = open(self.path, encoding='utf-8', errors='surrogatepass')
+        run.seek(self.file.tell())
+        return [], run
+
+    def close(self):
+        if self.file.closed: return
+        self.file.close()
+        remove(self.path)
+
+# Sorted run kept in memory (the unflushed buffer)
+class _MemoryRun:
+    def __init__(self, items):
+        self.items = items
+        self.position = 0
+
+    def next(self):
+        if self.position == len(self.items): return None
+        self.position += 1
+        return self.items[self.position - 1]
+
+    def remaining(self):
+        return self.items[self.position:]
+
+    def snapshot(self):
+        return self.remaining(), None
+
+    def close(self):
+        pass
+
+# Overflow tier of the frontier: items are buffered, written out as sorted runs, and merged back
+# lazily (k-way merge) so they come out in the same order a single heap would give.
+class SpillStore:
+    def __init__(self, directory=FRONTIER_SPILL_DIR, run_size=FRONTIER_SPILL_RUN):
+        self.directory = mkdtemp(prefix='frontier-', dir=directory)
+        self.run_size = run_size
+        self.buffer = []    # items not yet written to a run
+        self.runs = []      # heap of (head item, run id, run)
+        self.run_count = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def push(self, item):
+        self.buffer.append(item)
+        self.size += 1
+        if len(self.buffer) >= self.run_size: self._flush()
+
+    def pop_many(self, count):
+        # Merge the buffer in as an in-memory run so it competes with the on-disk runs
+        if self.buffer:
+            self.buffer.sort()
+            self._add_run(_MemoryRun(self.buffer))
+            self.buffer = []
+
+        # Take the best items across all runs
+        result = []
+        while self.runs and len(result) < count:
+            item, run_id, run = heappop(self.runs)
+            result.append(item)
+            following = run.next()
+            if following is not None: heappush(self.runs, (following, run_id, run))
+
+        self.size -= len(result)
+        return result
+
+    def items(self):
+        # Every spilled item, in no particular order (e.g. for checkpoints)
+        items = list(self.buffer)
+        for head, _, run in self.runs:
+            items.append(head)
+            items.extend(run.remaining())
+        return items
+
+    def snapshot(self):
+        # Spilled items held in memory, plus open handles on the unread part of each run file so a
+        # checkpoint can copy the runs without reading them back here
+        items, handles = list(self.buffer), []
+        for head, _, run in self.runs:
+            items.append(head)
+            remaining, handle = run.snapshot()
+            items.extend(remaining)
+            if handle is not None: handles.append(handle)
+        return items, handles
+
+    def close(self):
+        # Delete remaining run files and the spill directory
+        for _, _, run in self.runs: run.close()
+        self.runs, self.buffer, self.size = [], [], 0
+        rmdir(self.directory)
+
+    def _flush(self):
+        self.buffer.sort()
+        run = _DiskRun(join(self.directory, f'run-{self.run_count}.tsv'), self.buffer)
+        self.buffer = []
+        self._add_run(run)
+
+    def _add_run(self, run):
+        head = run.next()
+        if head is None: return
+        heappush(self.runs, (head, self.run_count, run))
+        self.run_count += 1
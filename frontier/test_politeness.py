@@ -0,0 +1,85 @@
+from time import sleep
+
+from fetcher.robots import RobotsCache, RobotsRules
+from frontier.politeness import Frontier
+from utils.health import HostHealth
+
+def test_pops_best_host_first():
+    frontier = Frontier(min_delay=0, memory_items=0)
+    frontier.push((-1, 'http://a.com/1', 0))
+    frontier.push((-3, 'http://b.com/1', 0))
+    frontier.push((-2, 'http://c.com/1', 0))
+    assert [frontier.pop()[1] for _ in range(3)] == ['http://b.com/1', 'http://c.com/1', 'http://a.com/1']
+    assert frontier.pop() is None
+
+def test_one_fetch_per_host_with_delay():
+    frontier = Frontier(min_delay=0.05, memory_items=0)
+    frontier.push((-2, 'http://a.com/1', 0))
+    frontier.push((-1, 'http://a.com/2', 0))
+    assert frontier.pop()[1] == 'http://a.com/1'
+
+    # Busy until done, then waiting out the politeness delay
+    assert frontier.pop() is None
+    frontier.done('http://a.com/1')
+    assert frontier.pop() is None
+    assert frontier.next_ready_time() is not None
+
+    sleep(0.06)
+    assert frontier.pop()[1] == 'http://a.com/2'
+    assert len(frontier) == 0
+
+def test_rescore_on_pop():
+    scores = {'a.com': 3, 'b.com': 2, 'c.com': 1}
+    frontier = Frontier(scorer=scores.get, min_delay=0, memory_items=0)
+    for host in scores: frontier.push((-1, f'http://{host}/', 0))
+
+    # a.com got worse since it was pushed, so it sinks below b.com
+    scores['a.com'] = 0
+    assert frontier.pop()[1] == 'http://b.com/'
+
+    # c.com got better, so it is handed out at its new priority
+    scores['c.com'] = 5
+    assert frontier.pop() == (-5, 'http://c.com/', 0)
+    assert frontier.pop() == (0, 'http://a.com/', 0)
+
+def test_crawl_delay_honored_and_capped():
+    cache = RobotsCache()
+    cache['http://slow.com'] = RobotsRules.parse(['User-agent: *', 'Crawl-delay: 30'])
+    cache['http://slower.com'] = RobotsRules.parse(['User-agent: *', 'Crawl-delay: 3600'])
+    frontier = Frontier(robots_cache=cache, min_delay=1, max_delay=60, memory_items=0)
+    assert frontier._delay('http://fast.com/page') == 1
+    assert frontier._delay('http://slow.com/page') == 30
+    assert frontier._delay('http://slower.com/page') == 60
+
+def test_busy_host_does_not_block_others():
+    frontier = Frontier(min_delay=60, memory_items=0)
+    frontier.push((-2, 'http://a.com/1', 0))
+    frontier.push((-1, 'http://a.com/2', 0))
+    frontier.push((-1, 'http://b.com/1', 0))
+    assert frontier.pop()[1] == 'http://a.com/1'
+    assert frontier.pop()[1] == 'http://b.com/1'
+    assert frontier.pop() is None
+    assert len(frontier) == 1
+
+def test_backoff_and_dropped_hosts():
+    health = HostHealth(threshold=1, backoff=60, max_backoffs=1)
+    frontier = Frontier(min_delay=0, memory_items=0, health=health)
+    for path in ('1', '2', '3'): frontier.push((-1, f'http://a.com/{path}', 0))
+    frontier.push((-2, 'http://b.com/1', 0))
+    frontier.push((-2, 'http://b.com/2', 0))
+
+    # A failing host waits out its backoff instead of the politeness delay
+    url = frontier.pop()[1]
+    assert url.startswith('http://b.com/')
+    health.record('b.com', {'status_code': 503})
+    frontier.done(url)
+    assert frontier.pop()[1].startswith('http://a.com/')
+    assert frontier.pop() is None
+
+    # Once dropped, the host's queue is discarded and new links to it are ignored
+    health.record('a.com', {'status_code': 0, 'error': 'dns'})
+    health.record('a.com', {'status_code': 0, 'error': 'dns'})
+    assert health.is_dropped('a.com')
+    frontier.done('http://a.com/1')
+    frontier.push((-1, 'http://a.com/4', 0))
+    assert len(frontier) == 1
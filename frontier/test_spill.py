@@ -0,0 +1,46 @@
+from os import listdir
+from random import Random
+
+from frontier.politeness import Frontier
+from frontier.spill import SpillStore
+
+def test_merged_in_priority_order(tmp_path):
+    items = [(-Random(index).random(), f'http://host{index}.com/caf\xe9/\udcff', index) for index in range(250)]
+    store = SpillStore(directory=tmp_path, run_size=40)
+    for item in items: store.push(item)
+    assert len(store) == 250
+    assert len(listdir(store.directory)) == 6
+    assert sorted(store.items()) == sorted(items)
+
+    # Best items across the runs and the unflushed buffer, a batch at a time (a late push still competes)
+    popped = store.pop_many(100) + store.pop_many(100)
+    store.push((-2.0, 'http://late.com/', 0))
+    popped += store.pop_many(100)
+    assert popped == sorted(items)[:200] + [(-2.0, 'http://late.com/', 0)] + sorted(items)[200:]
+    assert len(store) == 0
+
+    store.close()
+    assert listdir(tmp_path) == []
+
+def test_close_removes_runs(tmp_path):
+    store = SpillStore(directory=tmp_path, run_size=10)
+    for index in range(35): store.push((-index, f'http://host{index}.com/', 0))
+    store.pop_many(5)
+    store.close()
+    assert listdir(tmp_path) == []
+
+def test_frontier_spills_overflow():
+    frontier = Frontier(min_delay=0, memory_items=2)
+    urls = [f'http://host{index}.com/' for index in range(6)]
+    for index, url in reversed(list(enumerate(urls))): frontier.push((-index, url, 0))
+    assert len(frontier) == 6
+    assert sorted(item[1] for item in frontier.items()) == sorted(urls)
+
+    # Spilled items come back in priority order
+    popped = []
+    while frontier:
+        item = frontier.pop()
+        popped.append(item[1])
+        frontier.done(item[1])
+    assert popped == urls[::-1]
+    frontier.close()
@@ -1,16 +1,23 @@
 from collections import defaultdict
 
+from logger.sink import LogSink
 from utils.url import get_superdomain
 from config import DEBUG
 
 def log_url(log_file, url, meta, depth, priority):
+    # Buffered sink: just enqueue (its writer thread formats and flushes in batches)
+    if isinstance(log_file, LogSink):
+        log_file.record(url, meta['timestamp'], meta['content_length'], depth, meta['status_code'], priority)
+        return
+
+    # Plain file: write and flush right away
     line = f'{url}\t{meta["timestamp"]}\t{meta["content_length"]}\t{depth}\t{meta["status_code"]}\t{priority:.6f}\n'
     log_file.write(line)
     log_file.flush() # immediately write to disk
 
 def log_summary(log_file, state, total_time):
     total_pages = len(state['visited'])
-    total_bytes = state['total_bytes']
+    total_bytes = state['total_bytes'].value
     status_counts = state['status_counts']
     domain_crawl_counts = state['domain_crawl_counts']
 
@@ -22,16 +29,20 @@ def log_summary(log_file, state, total_time):
         log_file.write(f'{status_code} responses: {count}\n')
     
     if DEBUG:
-        skipped_invalid = state['skipped_invalid']
-        skipped_dupes = state['skipped_dupes']
-        skipped_robots = state['skipped_robots']
-        skipped_timeout = state['skipped_timeout']
+        skipped_invalid = state['skipped_invalid'].value
+        skipped_dupes = state['skipped_dupes'].value
+        skipped_robots = state['skipped_robots'].value
+        skipped_timeout = state['skipped_timeout'].value
+        skipped_near_dupes = state['skipped_near_dupes'].value
+        skipped_traps = state['skipped_traps'].value
 
         log_file.write('\nSkip Summary:\n')
         log_file.write(f'Invalid URLs: {skipped_invalid}\n')
         log_file.write(f'Duplicates: {skipped_dupes}\n')
         log_file.write(f'Blocked by robots.txt: {skipped_robots}\n')
-        log_file.write(f'Timeout failures: {skipped_timeout}\n')  
+        log_file.write(f'Timeout failures: {skipped_timeout}\n')
+        log_file.write(f'Near-duplicate pages (links not expanded): {skipped_near_dupes}\n')
+        log_file.write(f'Over host URL budget (likely traps): {skipped_traps}\n')  
 
     # Aggregate domain counts into superdomains
     superdomain_crawl_counts = defaultdict(int)
@@ -0,0 +1,136 @@
+from datetime import datetime
+from os import fsync, remove, replace
+from os.path import exists, splitext
+from queue import SimpleQueue, Empty
+from struct import Struct
+from threading import Thread, Event
+from time import time
+
+from config import LOG_FORMAT, LOG_FLUSH_LINES, LOG_FLUSH_INTERVAL, LOG_ROTATE_BYTES
+
+# Binary record: timestamp (epoch seconds), content length, depth, status, priority, URL length; UTF-8 URL follows.
+# Records have no file header, so binary logs (like TSV ones) can be concatenated.
+RECORD = Struct('<dqHhdI')
+
+_STOP = object() # Writer thread shutdown marker
+
+def data_path(path, format=LOG_FORMAT):
+    # File page records go to (binary logs swap the extension for .bin and keep text, e.g. the summary, at path)
+    return splitext(path)[0] + '.bin' if format == 'binary' else path
+
+def data_files(path, format=LOG_FORMAT):
+    # Rotated files (oldest first) followed by the current one
+    current = data_path(path, format)
+    files, index = [], 1
+    while exists(f'{current}.{index}'):
+        files.append(f'{current}.{index}')
+        index += 1
+    return files + [current]
+
+def read_binary_log(path):
+    # Yields (url, timestamp, content_length, depth, status_code, priority) from a binary log
+    with open(path, 'rb') as file:
+        while True:
+            header = file.read(RECORD.size)
+            if len(header) < RECORD.size: return # end (or a record torn by a crash)
+            timestamp, content_length, depth, status_code, priority, url_length = RECORD.unpack(header)
+            url = file.read(url_length)
+            if len(url) < url_length: return
+            yield url.decode('utf-8', errors='replace'), timestamp, content_length, depth, status_code, priority
+
+# Page log fed through a queue: workers only enqueue, and a writer thread formats, batches and flushes
+# (every flush_lines records or flush_interval seconds), rotating the file once it reaches rotate_bytes
+class LogSink:
+    def __init__(self, path, append=False, format=LOG_FORMAT, flush_lines=LOG_FLUSH_LINES, flush_interval=LOG_FLUSH_INTERVAL, rotate_bytes=LOG_ROTATE_BYTES):
+        self.binary = format == 'binary'
+        self.path = data_path(path, format)
+        self.flush_lines = flush_lines
+        self.flush_interval = flush_interval
+        self.rotate_bytes = rotate_bytes
+
+        # A fresh log also drops files rotated out by an earlier run
+        if not append:
+            for rotated in data_files(path, format)[:-1]: remove(rotated)
+        self.file = open(self.path, 'ab' if append else 'wb')
+        self.text = (open(path, 'a' if append else 'w') if self.binary else None) # summary text next to binary records
+        self.queue = SimpleQueue()
+        self.thread = Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def record(self, url, timestamp, content_length, depth, status_code, priority):
+        self.queue.put((url, timestamp, content_length, depth, status_code, priority))
+
+    def write(self, text):
+        # Plain text (e.g. the crawl summary), in order with the records
+        self.queue.put(text)
+
+    def flush(self):
+        # Block until everything queued so far is written out
+        done = Event()
+        self.queue.put(done)
+        done.wait()
+
+    def close(self):
+        self.queue.put(_STOP)
+        self.thread.join()
+        self._sync()
+        self.file.close()
+        if self.text is not None: self.text.close()
+
+    def _run(self):
+        pending, last_flush = 0, time()
+        while True:
+            # Wait for the next item, but no longer than the flush interval while anything is unflushed
+            timeout = max(self.flush_interval - (time() - last_flush), 0) if pending else None
+            try:
+                item = self.queue.get(timeout=timeout)
+            except Empty:
+                item = None
+
+            if item is _STOP: break
+            if isinstance(item, Event):
+                self._flush()
+                pending, last_flush = 0, time()
+                item.set()
+                continue
+            if item is not None:
+                self._write(item)
+                pending += 1
+
+            if pending >= self.flush_lines or (pending and time() - last_flush >= self.flush_interval):
+                self._flush()
+                pending, last_flush = 0, time()
+        self._flush()
+
+    def _write(self, item):
+        if isinstance(item, str):
+            if self.binary: self.text.write(item)
+            else: self.file.write(item.encode('utf-8', errors='replace'))
+            return
+
+        url, timestamp, content_length, depth, status_code, priority = item
+        if self.binary:
+            encoded = url.encode('utf-8', errors='replace')
+            epoch = datetime.fromisoformat(timestamp).timestamp() if timestamp else 0.0
+            self.file.write(RECORD.pack(epoch, content_length, min(depth, 0xffff), status_code, priority, len(encoded)) + encoded)
+        else:
+            self.file.write(f'{url}\t{timestamp}\t{content_length}\t{depth}\t{status_code}\t{priority:.6f}\n'.encode('utf-8', errors='replace'))
+
+        if self.rotate_bytes and self.file.tell() >= self.rotate_bytes: self._rotate()
+
+    def _flush(self):
+        self.file.flush()
+        if self.text is not None: self.text.flush()
+
+    def _sync(self):
+        self._flush()
+        fsync(self.file.fileno())
+
+    def _rotate(self):
+        # Make the full file durable before renaming it, so a crash leaves either the old name or the new one
+        self._sync()
+        self.file.close()
+        index = 1
+        while exists(f'{self.path}.{index}'): index += 1
+        replace(self.path, f'{self.path}.{index}')
+        self.file = open(self.path, 'wb')
@@ -0,0 +1,55 @@
+from os.path import exists
+
+import pytest
+
+from logger.sink import LogSink, data_files, data_path, read_binary_log
+
+TIMESTAMP = '2025-10-01T23:10:41.743326+00:00'
+RECORDS = [(f'https://example.com/caf\xe9/{index}', TIMESTAMP, 1000 + index, index % 4, 200, 0.5) for index in range(100)]
+
+def test_text_log(tmp_path):
+    path = str(tmp_path / 'crawl_log.txt')
+    sink = LogSink(path, format='text')
+    for record in RECORDS: sink.record(*record)
+    sink.write('Summary\n')
+    sink.close()
+
+    lines = open(path, encoding='utf-8').read().splitlines()
+    assert lines[0] == f'https://example.com/caf\xe9/0\t{TIMESTAMP}\t1000\t0\t200\t0.500000'
+    assert len(lines) == 101 and lines[-1] == 'Summary'
+
+def test_binary_log(tmp_path):
+    path = str(tmp_path / 'crawl_log.txt')
+    sink = LogSink(path, format='binary')
+    for record in RECORDS: sink.record(*record)
+    sink.write('Summary\n')
+    sink.flush()
+    assert open(path).read() == 'Summary\n'
+    sink.close()
+
+    records = list(read_binary_log(data_path(path, 'binary')))
+    assert len(records) == len(RECORDS)
+    url, timestamp, content_length, depth, status_code, priority = records[7]
+    assert (url, content_length, depth, status_code, priority) == ('https://example.com/caf\xe9/7', 1007, 3, 200, 0.5)
+    assert timestamp == pytest.approx(1759360241.743326)
+
+    # A record torn by a crash is dropped
+    with open(data_path(path, 'binary'), 'ab') as file: file.write(b'\x00' * 10)
+    assert len(list(read_binary_log(data_path(path, 'binary')))) == len(RECORDS)
+
+def test_rotation_and_append(tmp_path):
+    path = str(tmp_path / 'crawl_log.txt')
+    sink = LogSink(path, format='text', rotate_bytes=2000)
+    for record in RECORDS: sink.record(*record)
+    sink.close()
+
+    files = data_files(path, 'text')
+    assert len(files) > 2
+    lines = [line for name in files for line in open(name, encoding='utf-8').read().splitlines()]
+    assert [line.split('\t')[0] for line in lines] == [record[0] for record in RECORDS]
+
+    # Appending keeps rotated files, a fresh log drops them
+    LogSink(path, append=True, format='text').close()
+    assert data_files(path, 'text') == files
+    LogSink(path, format='text').close()
+    assert data_files(path, 'text') == [path] and not exists(files[0])
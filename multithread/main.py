@@ -1,76 +1,100 @@
 from time import time
-from collections import defaultdict
-from heapq import heappush
+from os.path import join
+from argparse import ArgumentParser
 from socket import setdefaulttimeout
-# from threading import Lock
+from concurrent.futures import ProcessPoolExecutor
 
 from query.ddg import query_ddg
-from fetcher.robots import is_allowed
+from frontier.politeness import Frontier
+from checkpoint.journal import Checkpoint, restore
+from fetcher.robots import is_allowed, RobotsCache, RobotsResolver
+from fetcher.dns import default_dns
 from utils.url import clean_url, is_valid_url, is_cgi_url, is_blocked_extension
+from utils.priority import make_host_scorer
+from utils.seen import new_seen_store
+from utils.state import Accumulator, ThreadCounts, StripedCounts, StripedSets
+from utils.concurrency import ConcurrencyLimit
+from utils.health import HostHealth
+from utils.simhash import SimHashIndex
+from utils.traps import TrapDetector
 from logger.log import log_summary
+from logger.sink import LogSink
 from multithread.worker import crawl_with_workers
-from config import QUERY, MAX_PAGES, MAX_TIME, MAX_TIMEOUTS, NUM_THREADS, DEBUG
+from config import QUERY, MAX_PAGES, MAX_TIME, NUM_THREADS, ADAPTIVE_CONCURRENCY, NEAR_DUPLICATES, ROBOTS_THREADS, PARSE_PROCESSES, CHECKPOINT_DIR, CHECKPOINT_INTERVAL, DEBUG
 
-# Set timeout for all socket operations (e.g. urlopen, RobotFileParser.read)
+# Set timeout for all socket operations (e.g. pooled page and robots.txt connections)
 setdefaulttimeout(5)
 
-def main():
+def new_state():
+    # Crawl state shared by the scheduler and worker threads (also one per shard in distributed mode)
     state = {
-        # Limits
-        'max_timeouts': MAX_TIMEOUTS,
-        
         # URL states
-        'scheduled': set(),     # URLs scheduled to be visited (in heap)
-        'visited': set(),       # URLs that were fetched
-        'disallowed': set(),    # URLs blocked by robots.txt
-        'robots_cache': {},     # Stores robot parser per domain
-        'timeout_counts': {},   # Count timeout-related fetch failures per domain
+        'scheduled': new_seen_store(),  # URLs scheduled to be visited (in frontier)
+        'visited': new_seen_store(),    # URLs that were fetched
+        'disallowed': new_seen_store(), # URLs blocked by robots.txt
+        'robots_cache': RobotsCache(), # Compiled robots.txt rules per host (bounded LRU)
+        'near_duplicates': SimHashIndex() if NEAR_DUPLICATES else None, # Content fingerprints of crawled pages
+        'traps': TrapDetector(),        # Per-host URL budgets and link yield (crawler-trap heuristics)
+        'host_health': HostHealth(),   # Circuit breaker per host (backoff, then drop after repeated failures)
         
-        # Stats (for log)
-        'total_bytes': 0,                           # Total bytes of fetched pages
-        'status_counts': {},                        # Count responses per HTTP status code
-        'domain_crawl_counts': {},                  # Count pages successfully crawled per domain
-        'superdomain_domains': defaultdict(set),    # Track unique domains under each superdomain
+        # Stats (for log; thread-safe: lock-striped per host, totals kept per thread and merged on read)
+        'total_bytes': Accumulator(),               # Total bytes of fetched pages
+        'status_counts': ThreadCounts(),            # Count responses per HTTP status code
+        'domain_crawl_counts': StripedCounts(),     # Count pages successfully crawled per domain
+        'superdomain_domains': StripedSets(),       # Track unique domains under each superdomain
 
         # Exit flag
         'exit': False,  # Global exit flag for workers
-
-        # Locks
-        # 'scheduled_lock': Lock(),
-        # 'visited_lock': Lock(),
-        # 'disallowed_lock': Lock(),
-        # 'robots_cache_lock': Lock(),
-        # 'timeout_counts_lock': Lock(),
-        # 'total_bytes_lock': Lock(),
-        # 'status_counts_lock': Lock(),
-        # 'domain_crawl_counts_lock': Lock(),
-        # 'superdomain_domains_lock': Lock(),
     }
 
     if DEBUG:
         state.update({
-            'skipped_invalid': 0,   # Total invalid URLs skipped
-            'skipped_dupes': 0,     # Total duplicate URLs skipped
-            'skipped_robots': 0,    # Total robots-blocked URLs skipped
-            'skipped_timeout': 0,   # Total URLs skipped due to timeout failures
-            # 'skipped_invalid_lock': Lock(),
-            # 'skipped_dupes_lock': Lock(),
-            # 'skipped_robots_lock': Lock(),
-            # 'skipped_timeout_lock': Lock(),
+            'skipped_invalid': Accumulator(),   # Total invalid URLs skipped
+            'skipped_dupes': Accumulator(),     # Total duplicate URLs skipped
+            'skipped_robots': Accumulator(),    # Total robots-blocked URLs skipped
+            'skipped_timeout': Accumulator(),   # Total URLs skipped due to hosts dropped after failures
+            'skipped_near_dupes': Accumulator(), # Total near-duplicate pages whose links were not expanded
+            'skipped_traps': Accumulator(),     # Total URLs skipped over their host's discovered-URL budget
         })
 
-    # Fetch seed URLs
-    seeds = query_ddg(QUERY, max_results=10)
+    return state
+
+def main(resume=False, seeds=None, num_threads=NUM_THREADS, max_pages=MAX_PAGES, max_time=MAX_TIME, adaptive=ADAPTIVE_CONCURRENCY):
+    state = new_state()
+
+    # Reload state and frontier from the last checkpoint (before anything holds on to the robots cache)
+    checkpoint_dir, elapsed, restored = join(CHECKPOINT_DIR, 'multithread'), 0, []
+    if resume: restored, elapsed = restore(state, checkpoint_dir)
+    state['checkpoint'] = Checkpoint(checkpoint_dir, resume=resume) if CHECKPOINT_INTERVAL else None
+
+    # Background robots.txt resolver (shares robots cache, parks links to unresolved hosts)
+    state['robots_resolver'] = RobotsResolver(state['robots_cache'], max_workers=ROBOTS_THREADS)
+
+    # Optional process pool for decoding and link extraction (scales parsing across cores)
+    if PARSE_PROCESSES: state['parse_pool'] = ProcessPoolExecutor(max_workers=PARSE_PROCESSES)
+
+    # Adjusts the number of in-flight fetches at runtime, starting from num_threads
+    state['concurrency'] = ConcurrencyLimit(num_threads) if adaptive else None
+
+    # Fetch seed URLs unless given (a resumed crawl continues from its checkpointed frontier instead)
+    if seeds is None: seeds = query_ddg(QUERY, max_results=10) if not resume else []
+
+    # Requeue checkpointed items (they passed the robots.txt check when first enqueued)
+    frontier = Frontier(state['robots_cache'], make_host_scorer(state), journal=state['checkpoint'], health=state['host_health'], dns=default_dns) # Per-host back queues, hosts re-scored on pop
+    for item in restored:
+        if item[1] in state['scheduled'] or item[1] in state['visited']: continue
+        frontier.push(item)
+        state['scheduled'].add(item[1])
+    if resume: print(f'[RESUME] Restored {len(state["visited"])} visited pages and {len(frontier)} frontier items')
 
     # Seed initial crawl queue
-    max_heap = [] # Simulated max-heap using -priority
     for seed in seeds:
         # Normalize URL: strip query, fragment, and trailing slash
         seed = clean_url(seed)
 
         # Skip if already handled or invalid
         if (
-            seed in state['scheduled']      # Already in heap
+            seed in state['scheduled']      # Already in frontier
             or seed in state['disallowed']  # Blocked by robots.txt
             or not is_valid_url(seed)       # Invalid scheme
             or is_cgi_url(seed)             # CGI script
@@ -84,20 +108,27 @@ def main():
             if DEBUG: print('Skipping', seed)
             continue
         
-        heappush(max_heap, (0, seed, 0)) # (-priority, url, depth)
+        frontier.push((0, seed, 0)) # (-priority, url, depth)
         state['scheduled'].add(seed)
 
-    # Start crawl timer and open log
-    start_time = time()
-    log = open('log.txt', 'w')
+    # Start crawl timer (counting time already spent before a resume) and open log
+    start_time = time() - elapsed
+    log = LogSink('log.txt', append=resume) # buffered, written by a background thread
 
     # Launch worker thread pool
-    crawl_with_workers(max_heap, state, log, NUM_THREADS, MAX_PAGES, MAX_TIME, start_time)
+    crawl_with_workers(frontier, state, log, num_threads, max_pages, max_time, start_time)
+    state['robots_resolver'].shutdown()
+    default_dns.shutdown()
+    if PARSE_PROCESSES: state['parse_pool'].shutdown()
 
     # Log crawl summary
     total_time = time() - start_time
     log_summary(log, state, total_time)
     log.close()
+    frontier.close()
+    if state['checkpoint'] is not None: state['checkpoint'].close()
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    parser = ArgumentParser(description='Multithreaded web crawler')
+    parser.add_argument('--resume', action='store_true', help='continue the last crawl from its checkpoint')
+    main(parser.parse_args().resume)
\ No newline at end of file
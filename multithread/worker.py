@@ -1,172 +1,225 @@
-from time import time
+from time import time, sleep
 from urllib.parse import urlsplit
-from heapq import heappush, heappop
 from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 from fetcher.page import fetch_page
-from fetcher.robots import is_allowed
-from parser.html import extract_links
-from utils.url import clean_url, get_superdomain, is_valid_url, is_cgi_url, is_blocked_extension
-from utils.priority import compute_priority
+from parser.links import extract_candidates, parse_page
+from utils.url import canonicalize
+from utils.admission import admit_link
 from logger.log import log_url
-from config import DEBUG
+from config import ROBOTS_POLL_INTERVAL, DEBUG
 
 def crawl(item, state, log, max_pages, max_time, start_time):
+    # Time source (replaced by a virtual clock in the offline simulator)
+    clock = state.get('clock', time)
+
     # Exit early if max config reached
-    if state['exit'] or len(state['visited']) >= max_pages or time() - start_time >= max_time:
+    if state['exit'] or _page_count(state) >= max_pages or clock() - start_time >= max_time:
         state['exit'] = True
         return []
 
     # Unpack item from heap
     priority, url, depth = item
 
-    # Fetch first to resolve any redirects
-    final_url, html, meta = fetch_page(url)
-    final_url = clean_url(final_url)
+    # Fetch first to resolve any redirects (raw bytes if the parse process pool decodes them)
+    parse_pool = state.get('parse_pool')
+    fetch = state.get('fetch', fetch_page) # replaced by a simulated web in the offline simulator
+    fetch_start = clock()
+    final_url, html, meta = fetch(url, decode=parse_pool is None)
+
+    # Feed latency and load-related failures (timeouts, connection errors, 429) to the concurrency controller
+    limiter = state.get('concurrency')
+    if limiter is not None: limiter.record(clock() - fetch_start, meta['status_code'] in (0, 429))
+
+    # Track host health (the frontier holds back hosts in backoff and discards dropped ones)
+    state['host_health'].record(urlsplit(url).netloc, meta)
 
-    # Extract domain and superdomain
-    domain = urlsplit(final_url).netloc
-    superdomain = get_superdomain(final_url)
+    # Normalize final URL and extract domain and superdomain in one parse
+    final_url, domain, superdomain, _, _ = canonicalize(final_url)
     
-    # Skip if already in robots block list
-    if not is_allowed(final_url, state['robots_cache']):
+    # Skip if already in robots block list (waits on the shared robots.txt fetch if unresolved)
+    if not state['robots_resolver'].wait(final_url):
         state['disallowed'].add(final_url)
         if DEBUG: print('Skipping', final_url)
         return []
     
-    # Skip if already visited
-    if final_url in state['visited']:
+    # Skip if already visited (atomic, so two workers landing on the same page don't both record it)
+    if not state['visited'].check_and_add(final_url):
         if DEBUG: print('Skipping', final_url)
         return []
-    state['visited'].add(final_url)
-
-    # Track timeout failures
-    if meta['status_code'] == 0 and meta['content_length'] == 0:
-        state['timeout_counts'][domain] = state['timeout_counts'].get(domain, 0) + 1
+    if state.get('shard') is not None: state['shard'].count_page()
 
     # Log result
     log_url(log, final_url, meta, depth, -priority)
 
     # Update crawl stats
-    state['total_bytes'] += meta['content_length']
-    state['status_counts'][meta['status_code']] = state['status_counts'].get(meta['status_code'], 0) + 1
+    state['total_bytes'].add(meta['content_length'])
+    state['status_counts'].add(meta['status_code'])
+
+    # Journal the visit so a resumed crawl rebuilds the same stats
+    checkpoint = state.get('checkpoint')
+    if checkpoint is not None: checkpoint.visited(final_url, domain, superdomain, meta, meta['status_code'] == 200 and bool(html))
 
     # Skip link extraction if fetch failed or not html
     if meta['status_code'] != 200 or not html: return []
 
     # Track domain crawl count
-    state['domain_crawl_counts'][domain] = state['domain_crawl_counts'].get(domain, 0) + 1
-    state['superdomain_domains'][superdomain].add(domain)
+    state['domain_crawl_counts'].add(domain)
+    state['superdomain_domains'].add(superdomain, domain)
 
     # Exit if max config reached
-    if state['exit'] or len(state['visited']) >= max_pages or time() - start_time >= max_time:
+    if state['exit'] or _page_count(state) >= max_pages or clock() - start_time >= max_time:
         state['exit'] = True
         return []
 
-    # Extract and enqueue child links
-    result = []
-    for link in extract_links(html, final_url):
-        # Normalize URL: strip query, fragment, and trailing slash
-        link = clean_url(link)
-
-        # Extract domain and superdomain
-        link_domain = urlsplit(link).netloc
-        link_superdomain = get_superdomain(link)
-        
-        # Skip if invalid (bad scheme, CGI path, or blocked extension)
-        if not is_valid_url(link) or is_cgi_url(link) or is_blocked_extension(link):
-            if DEBUG:
-                print('Skipping', link)
-                state['skipped_invalid'] += 1
-            continue
-
-        # Skip if already scheduled (in heap)
-        if link in state['scheduled']:
-            if DEBUG:
-                print('Skipping', link)
-                state['skipped_dupes'] += 1
-            continue
-
-        # Skip if already fetched
-        if link in state['visited']:
-            if DEBUG:
-                print('Skipping', link)
-                state['skipped_dupes'] += 1
-            continue
-
-        # Skip if already in robots block list
-        if link in state['disallowed']:
-            if DEBUG:
-                print('Skipping', link)
-                state['skipped_robots'] += 1
-            continue
-
-        # Skip if domain already exceeded timeout failure limit
-        if state['timeout_counts'].get(link_domain, 0) >= state['max_timeouts']:
-            if DEBUG:
-                print('Skipping', link)
-                state['skipped_timeout'] += 1
-            continue
+    # Extract, normalize and validate child links, and fingerprint the content (in a worker process if the parse pool is enabled)
+    near_duplicates = state.get('near_duplicates')
+    if limiter is not None: limiter.parse_started()
+    try:
+        if parse_pool is None: candidates, invalid, fingerprint = extract_candidates(html, final_url, fingerprint=near_duplicates is not None)
+        else: candidates, invalid, fingerprint = parse_pool.submit(parse_page, html, meta['content_type'], final_url, near_duplicates is not None).result()
+    except Exception as e:
+        if DEBUG: print(f'[ERROR] Failed to parse {final_url}: {e}')
+        return []
+    finally:
+        if limiter is not None: limiter.parse_finished()
+    if DEBUG: state['skipped_invalid'].add(invalid)
+
+    # Don't expand links of a near-duplicate of an already crawled page (it's logged all the same)
+    if fingerprint is not None and not near_duplicates.check_and_add(fingerprint):
+        if DEBUG:
+            print('Skipping links of near-duplicate', final_url)
+            state['skipped_near_dupes'].add()
+        return []
 
-        # Skip if blocked by robots.txt
-        if not is_allowed(link, state['robots_cache']):
-            state['disallowed'].add(link)
-            if DEBUG:
-                print('Skipping', link)
-                state['skipped_robots'] += 1
+    # Enqueue child links
+    shard = state.get('shard')
+    result = []
+    for link, link_domain, link_superdomain in candidates:
+        # Hand links owned by another shard over to it (the owner runs the checks below)
+        if shard is not None and not shard.owns(link_superdomain):
+            shard.forward(link, link_domain, link_superdomain, depth + 1)
+            state['traps'].found_link(domain)
             continue
 
-        # Track domain crawl count and compute priority
-        state['superdomain_domains'][link_superdomain].add(link_domain)
-        domain_crawl_count = state['domain_crawl_counts'].get(link_domain, 0)
-        superdomain_domain_count = len(state['superdomain_domains'][link_superdomain])
-        priority = compute_priority(domain_crawl_count, superdomain_domain_count)
-        
-        # Enqueue
-        state['scheduled'].add(link)
-        result.append((-priority, link, depth + 1))
+        item = admit_link(state, link, link_domain, link_superdomain, depth + 1, domain)
+        if item is not None: result.append(item)
+    state['traps'].page_expanded(domain)
 
     # Return new links
     return result
 
-def crawl_with_workers(max_heap, state, log, num_threads, max_pages, max_time, start_time):
-    # Create thread pool with fixed number of workers
-    with ThreadPoolExecutor(max_workers=num_threads) as executor:
-        futures = set()
+def crawl_with_workers(frontier, state, log, num_threads, max_pages, max_time, start_time):
+    resolver = state['robots_resolver']
+    shard = state.get('shard') # set when running as one shard of a distributed crawl
+    limiter = state.get('concurrency') # adapts the number of in-flight fetches (fixed at num_threads if unset)
+
+    # Create thread pool (threads are started on demand, up to the controller's ceiling)
+    with ThreadPoolExecutor(max_workers=limiter.maximum if limiter is not None else num_threads) as executor:
+        futures = {} # future -> URL being crawled
         
         # Fill the initial batch of worker tasks
-        _fill_worker_pool(futures, max_heap, executor, state, log, num_threads, max_pages, max_time, start_time)
-
-        # Main thread loop (wait for tasks to complete, refill as needed)
-        while futures:
-            # Wait for at least one task to finish
-            done, futures = wait(futures, return_when=FIRST_COMPLETED)
+        _fill_worker_pool(futures, frontier, executor, state, log, _pool_size(state, num_threads), max_pages, max_time, start_time)
+
+        # Main thread loop (wait for tasks, politeness delays or robots.txt, refill as needed)
+        while futures or ((frontier or resolver.has_pending() or (shard is not None and not shard.finished())) and not state['exit']):
+            if futures:
+                # Wait for at least one task to finish (or the next host to become ready)
+                done, _ = wait(futures, timeout=_wait_timeout(frontier), return_when=FIRST_COMPLETED)
+            else:
+                # All queued hosts are in their politeness delay or waiting on robots.txt
+                done = set()
+                if frontier: sleep(_wait_timeout(frontier))
+                elif shard is not None and not resolver.has_pending(): shard.wait_idle(ROBOTS_POLL_INTERVAL)
+                else: resolver.wait_ready(ROBOTS_POLL_INTERVAL)
             
-            # Enqueue new links from each task
+            # Enqueue new links from each task and free its host for the next fetch
+            # (the URL stays scheduled until its fetch is done, so it can't be enqueued again meanwhile)
             for future in done:
+                url = futures.pop(future)
+                frontier.done(url)
+                state['scheduled'].discard(url)
                 for link in future.result():
-                    heappush(max_heap, link)
+                    frontier.push(link)
+
+            # Enqueue parked links whose robots.txt has resolved
+            _release_pending(frontier, state)
+
+            # Send links owned by other shards and admit the ones they sent here
+            if shard is not None: _exchange_links(frontier, state, shard)
             
-            # Refill worker pool
-            _fill_worker_pool(futures, max_heap, executor, state, log, num_threads, max_pages, max_time, start_time)
+            # Refill worker pool (up to the current concurrency limit)
+            _fill_worker_pool(futures, frontier, executor, state, log, _pool_size(state, num_threads), max_pages, max_time, start_time)
+            if limiter is not None: limiter.in_flight(len(futures))
+
+            # Periodic checkpoint (copied here, written in the background while workers keep running)
+            if state.get('checkpoint') is not None: state['checkpoint'].maybe_snapshot(state, frontier, time() - start_time)
+
+    # Let the other shards know as soon as this one hits a limit
+    if shard is not None and state['exit']: shard.stop()
+
+def _wait_timeout(frontier):
+    # Sleep until the next waiting host is ready, but keep polling pending robots.txt
+    # (ready hosts left undispatched mean the pool is full, so they don't shorten the wait)
+    next_ready = frontier.next_ready_time()
+    if next_ready is None or next_ready <= time(): return ROBOTS_POLL_INTERVAL
+    return min(ROBOTS_POLL_INTERVAL, next_ready - time())
+
+def _pool_size(state, num_threads):
+    # Fetches to keep in flight (set by the concurrency controller if there is one)
+    limiter = state.get('concurrency')
+    return limiter.value if limiter is not None else num_threads
+
+def _page_count(state):
+    # Pages fetched so far (by every shard in a distributed crawl)
+    shard = state.get('shard')
+    return shard.page_count() if shard is not None else len(state['visited'])
+
+def _exchange_links(frontier, state, shard):
+    shard.flush()
+    for link, link_domain, link_superdomain, depth in shard.receive():
+        item = admit_link(state, link, link_domain, link_superdomain, depth)
+        if item is not None: frontier.push(item)
+
+    # Any shard reaching a limit stops all of them
+    if state['exit']: shard.stop()
+    elif shard.stopped(): state['exit'] = True
+
+def _release_pending(frontier, state):
+    for item, allowed in state['robots_resolver'].drain():
+        # Move disallowed links from the scheduled set to the robots block list
+        if not allowed:
+            state['scheduled'].discard(item[1])
+            state['disallowed'].add(item[1])
+            if DEBUG:
+                print('Skipping', item[1])
+                state['skipped_robots'].add()
+            continue
+        frontier.push(item)
 
-def _fill_worker_pool(futures, max_heap, executor, state, log, max_threads, max_pages, max_time, start_time):
+def _fill_worker_pool(futures, frontier, executor, state, log, max_threads, max_pages, max_time, start_time):
     # Fill up thread pool to capacity
     while len(futures) < max_threads:
         # Exit early if no more URLs to crawl
-        if not max_heap: break
+        if not frontier: break
         
         # Exit if max limits reached
-        page_count, total_time = len(state['visited']), time() - start_time
+        page_count, total_time = _page_count(state), state.get('clock', time)() - start_time
         if page_count >= max_pages or total_time >= max_time:
             print(f'[EXIT] Reached limit — fetched {page_count} pages in {total_time:.2f} seconds')
             state['exit'] = True
             break
 
-        # Pop next item and clean from scheduled set
-        priority, url, depth = heappop(max_heap)
-        state['scheduled'].discard(url)
-        if url in state['visited']: continue
+        # Pop next item from a host that is ready (None if every host is in its politeness delay)
+        item = frontier.pop()
+        if item is None: break
+
+        # Skip if already visited (e.g. reached through a redirect)
+        priority, url, depth = item
+        if url in state['visited']:
+            frontier.done(url)
+            state['scheduled'].discard(url)
+            continue
         
         # Submit crawl task to the executor for concurrent execution
-        futures.add(executor.submit(crawl, (priority, url, depth), state, log, max_pages, max_time, start_time))
\ No newline at end of file
+        futures[executor.submit(crawl, (priority, url, depth), state, log, max_pages, max_time, start_time)] = url
@@ -1,22 +1,91 @@
-from bs4 import BeautifulSoup
+from html import unescape
+from re import compile, IGNORECASE, DOTALL
 from urllib.parse import urljoin
 
 from config import DEBUG
 
-def extract_links(html, base_url):
+# Only tags that matter for links are tokenized; script/style bodies and comments are skipped whole
+_ATTRS = r'''((?:[^>"']|"[^"]*"|'[^']*')*)'''
+_TAG_PATTERN = (
+    r'<!--.*?-->'                                                       # comment
+    r'|<(script|style)\b(?:[^>"\']|"[^"]*"|\'[^\']*\')*>.*?</\1\s*>'    # raw text element
+    r'|<(a|base|meta)\b' + _ATTRS + '>'                                 # tag we care about
+)
+_ATTR_PATTERN = r'''([^\s=/>"']+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+)))?'''
+
+TAG_RE = compile(_TAG_PATTERN, IGNORECASE | DOTALL)
+ATTR_RE = compile(_ATTR_PATTERN)
+TAG_RE_BYTES = compile(_TAG_PATTERN.encode(), IGNORECASE | DOTALL)
+ATTR_RE_BYTES = compile(_ATTR_PATTERN.encode())
+
+def _parse_attrs(raw, attr_re, encoding):
+    attrs = {}
+    for name, double, single, bare in attr_re.findall(raw):
+        value = double or single or bare
+        if encoding:
+            name, value = name.decode('ascii', errors='replace'), value.decode(encoding, errors='replace')
+        attrs[name.lower()] = unescape(value) if '&' in value else value
+    return attrs
+
+def extract_links(html, base_url, encoding='utf-8'):
     links = []
-    
-    # Parse raw HTML into searchable DOM
-    soup = BeautifulSoup(html, 'html.parser')
+
+    # Tokenize straight from raw bytes when given them (only attribute values get decoded)
+    is_bytes = isinstance(html, bytes)
+    tag_re, attr_re = (TAG_RE_BYTES, ATTR_RE_BYTES) if is_bytes else (TAG_RE, ATTR_RE)
+    encoding = encoding if is_bytes else None
+
+    # Collect hrefs first, since <base href> applies to every link in the page
+    hrefs, base_href = [], None
+    for match in tag_re.finditer(html):
+        tag = match.group(2)
+        if not tag: continue # comment or script/style body
+        tag = tag.lower()
+        attrs = _parse_attrs(match.group(3), attr_re, encoding)
+
+        if tag in ('a', b'a'):
+            # Skip links the page asks us not to follow
+            if 'href' not in attrs or 'nofollow' in attrs.get('rel', '').lower().split(): continue
+            hrefs.append(attrs['href'])
+
+        elif tag in ('base', b'base'):
+            if base_href is None and 'href' in attrs: base_href = attrs['href']
+
+        # <meta name="robots" content="nofollow"> applies to the whole page
+        elif attrs.get('name', '').lower() == 'robots' and 'nofollow' in attrs.get('content', '').lower():
+            return links
 
     # Resolve all relative hrefs to full URLs
-    for tag in soup.find_all('a', href=True):
+    if base_href is not None: base_url = urljoin(base_url, base_href.strip())
+    for href in hrefs:
         try:
-            # print(tag)
-            full_url = urljoin(base_url, tag['href'])
+            full_url = urljoin(base_url, href.strip())
             links.append(full_url)
         except Exception as e:
-            if DEBUG: print(f'[WARNING] Skipping malformed link {tag["href"]}: {e}')
+            if DEBUG: print(f'[WARNING] Skipping malformed link {href}: {e}')
             continue
-    
-    return links
\ No newline at end of file
+
+    return links
+
+if __name__ == '__main__':
+    # Micro-benchmark against the previous BeautifulSoup extractor: python -m parser.html [page.html ...]
+    from sys import argv
+    from timeit import timeit
+    from bs4 import BeautifulSoup
+
+    def extract_links_bs4(html, base_url):
+        soup = BeautifulSoup(html, 'html.parser')
+        return [urljoin(base_url, tag['href']) for tag in soup.find_all('a', href=True)]
+
+    # Default to a synthetic page about the size of an average crawled page (~100 KB)
+    pages = [open(path, 'rb').read() for path in argv[1:]] or [
+        (b'<html><head><script>var a = "<a href=x>";</script></head><body>'
+         + b'<p>Some text <a href="/page/%d">link</a> and <a href="http://example.com/%d">more</a></p>\n' * 900
+         + b'</body></html>') % tuple(i for i in range(900) for _ in range(2))
+    ]
+
+    for page in pages:
+        html = page.decode('utf-8', errors='replace')
+        fast = timeit(lambda: extract_links(page, 'http://example.com/'), number=20) / 20
+        slow = timeit(lambda: extract_links_bs4(html, 'http://example.com/'), number=20) / 20
+        print(f'{len(page)} bytes: {fast * 1000:.2f} ms vs {slow * 1000:.2f} ms with BeautifulSoup ({slow / fast:.1f}x)')
@@ -0,0 +1,44 @@
+from codecs import lookup
+from urllib.parse import urlsplit
+
+from fetcher.encoding import detect_encoding
+from parser.html import extract_links
+from utils.url import canonicalize
+from utils.simhash import simhash
+from config import DEBUG
+
+def extract_candidates(html, base_url, encoding='utf-8', fingerprint=False):
+    candidates, invalid = [], 0
+
+    for link in extract_links(html, base_url, encoding):
+        # Normalize (strip query, fragment, and trailing slash) and validate in a single parse
+        canonical = canonicalize(link)
+
+        # Skip if invalid (bad scheme, CGI path, or blocked extension)
+        if not canonical.valid:
+            if DEBUG: print('Skipping', canonical.url)
+            invalid += 1
+            continue
+
+        # Keep link with its domain and superdomain
+        candidates.append((canonical.url, canonical.host, canonical.superdomain))
+
+    # Content fingerprint for near-duplicate detection (text and links)
+    if fingerprint:
+        text = html.decode(encoding, errors='replace') if isinstance(html, bytes) else html
+        fingerprint = simhash(text, [candidate[0] for candidate in candidates])
+    else:
+        fingerprint = None
+
+    # Return (link, domain, superdomain) candidates, number of invalid links dropped and the page's fingerprint
+    return candidates, invalid, fingerprint
+
+def parse_page(raw_bytes, content_type, base_url, fingerprint=False):
+    # Runs in a worker process: detect encoding, then tokenize the raw bytes directly
+    encoding = detect_encoding(raw_bytes, content_type, urlsplit(base_url).netloc)
+    try:
+        lookup(encoding)
+    except LookupError:
+        encoding = 'utf-8'
+
+    return extract_candidates(raw_bytes, base_url, encoding, fingerprint)
@@ -0,0 +1,40 @@
+import pytest
+
+from parser.html import extract_links
+
+PAGE = '''<html><head>
+<title>Links</title>
+<script>document.write('<a href="/from-script">x</a>');</script>
+<style>a[href="/from-style"] { color: red }</style>
+</head><body>
+<!-- <a href="/commented-out">old</a> -->
+<a href="/relative">one</a>
+<A HREF='page2.html' class="x">two</A>
+<a class="y" href=bare>three</a>
+<a href="http://other.com/abs?x=1&amp;y=2">four</a>
+<a href="/skip" rel="external nofollow">five</a>
+<a name="anchor">no href</a>
+</body></html>'''
+
+EXPECTED = [
+    'http://example.com/relative',
+    'http://example.com/dir/page2.html',
+    'http://example.com/dir/bare',
+    'http://other.com/abs?x=1&y=2',
+]
+
+@pytest.mark.parametrize('html', [PAGE, PAGE.encode('utf-8')], ids=['str', 'bytes'])
+def test_extract_links(html):
+    assert extract_links(html, 'http://example.com/dir/index.html') == EXPECTED
+
+def test_base_href():
+    html = b'<base href="http://cdn.example.com/root/"><a href="page">x</a><base href="/ignored/">'
+    assert extract_links(html, 'http://example.com/') == ['http://cdn.example.com/root/page']
+
+def test_meta_robots_nofollow():
+    html = b'<meta name="ROBOTS" content="noindex, nofollow"><a href="/page">x</a>'
+    assert extract_links(html, 'http://example.com/') == []
+
+def test_attribute_values_decoded():
+    html = '<a href="/café">x</a>'.encode('iso-8859-1')
+    assert extract_links(html, 'http://example.com/', 'iso-8859-1') == ['http://example.com/café']
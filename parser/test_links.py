@@ -0,0 +1,27 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from parser.links import extract_candidates, parse_page
+
+PAGE = '''<html><head><meta charset="iso-8859-1"></head><body>
+<a href="/docs/caf\xe9/?ref=nav#top">docs</a>
+<a href="https://blog.example.co.uk/post">blog</a>
+<a href="/files/report.pdf">pdf</a>
+<a href="/cgi-bin/search">search</a>
+<a href="mailto:someone@example.com">mail</a>
+</body></html>'''.encode('iso-8859-1')
+
+EXPECTED = [
+    ('http://example.com/docs/caf\xe9', 'example.com', 'example.com'),
+    ('https://blog.example.co.uk/post', 'blog.example.co.uk', 'example.co.uk'),
+]
+
+def test_extract_candidates():
+    candidates, invalid, fingerprint = extract_candidates(PAGE.decode('iso-8859-1'), 'http://example.com/')
+    assert candidates == EXPECTED
+    assert invalid == 3
+    assert fingerprint is None
+
+def test_parse_page_in_worker_process():
+    # Same result from raw bytes in a parse pool process (encoding taken from <meta charset>)
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        assert pool.submit(parse_page, PAGE, 'text/html', 'http://example.com/').result() == (EXPECTED, 3, None)
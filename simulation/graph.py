@@ -0,0 +1,89 @@
+from bisect import bisect
+from itertools import accumulate
+from random import Random
+from urllib.parse import urlsplit
+
+# Web graphs for the offline simulator: seeds(count) gives start URLs and links(url) a page's
+# outgoing links (None if the page doesn't exist). URLs are in canonical form, as the crawler fetches them.
+
+# Synthetic web: hosts grouped under superdomains, heavy-tailed site sizes, and links that mostly
+# stay on their host and otherwise favor popular hosts (Zipf). Pages are generated on demand from
+# the seed, so a graph of any size costs nothing until it's crawled.
+class SyntheticGraph:
+    def __init__(self, hosts=2000, pages_per_host=50, out_links=20, internal=0.7, popularity=1.0, broken=0.02, seed=0, names=None):
+        self.out_links = out_links
+        self.internal = internal    # share of links to the same host
+        self.broken = broken        # share of links to pages that don't exist
+        self.seed = seed
+        rng = Random(seed)
+
+        # Superdomains with one or more subdomain hosts (e.g. www.site3.com, sub4.site3.com), unless names are given
+        # (e.g. the addresses of a local server farm)
+        self.hosts = list(names) if names is not None else []
+        hosts = len(self.hosts) or hosts
+        while len(self.hosts) < hosts:
+            site = f'site{len(self.hosts)}.com'
+            self.hosts.append(f'www.{site}')
+            while rng.random() < 0.3 and len(self.hosts) < hosts: self.hosts.append(f'sub{len(self.hosts)}.{site}')
+        self.index = {host: index for index, host in enumerate(self.hosts)}
+
+        # Site sizes (Pareto) and link popularity (Zipf over a shuffled host order)
+        self.sizes = [max(1, int(pages_per_host * 0.5 * rng.paretovariate(2))) for _ in self.hosts]
+        ranks = list(range(1, hosts + 1))
+        rng.shuffle(ranks)
+        self.cumulative = list(accumulate(rank ** -popularity for rank in ranks))
+
+    def seeds(self, count):
+        # Home pages of the most linked-to hosts
+        popular = sorted(range(len(self.hosts)), key=lambda index: self._weight(index), reverse=True)
+        return [f'http://{self.hosts[index]}' for index in popular[:count]]
+
+    def links(self, url):
+        parts = urlsplit(url)
+        index = self.index.get(parts.netloc)
+        if index is None: return None
+        page = self._page(parts.path)
+        if page is None or page >= self.sizes[index]: return None
+
+        rng = Random(f'{self.seed}:{url}')
+        links = []
+        for _ in range(int(rng.expovariate(1 / self.out_links)) if self.out_links else 0):
+            target = index if rng.random() < self.internal else bisect(self.cumulative, rng.random() * self.cumulative[-1])
+            target = min(target, len(self.hosts) - 1)
+            page = rng.randrange(self.sizes[target])
+            if rng.random() < self.broken: page += self.sizes[target] # past the end of the site (404)
+            links.append(f'http://{self.hosts[target]}/p{page}' if page else f'http://{self.hosts[target]}')
+        return links
+
+    def _page(self, path):
+        # Page number from a path ('' or '/' is the home page, '/p12' page 12)
+        if path in ('', '/'): return 0
+        if path.startswith('/p') and path[2:].isdigit(): return int(path[2:])
+        return None
+
+    def _weight(self, index):
+        return self.cumulative[index] - (self.cumulative[index - 1] if index else 0)
+
+# Recorded web: an edge list of 'source<TAB>target' lines (e.g. exported from a crawl). Sources are pages
+# with known links; targets that never appear as a source are fetched as pages without links.
+class RecordedGraph:
+    def __init__(self, path):
+        self.edges = {}
+        self.pages = set()
+        with open(path, encoding='utf-8', errors='replace') as file:
+            for line in file:
+                if not line.strip() or line.startswith('#'): continue
+                source, _, target = line.rstrip('\n').partition('\t')
+                self.edges.setdefault(source, [])
+                if target:
+                    self.edges[source].append(target)
+                    self.pages.add(target)
+        self.pages.update(self.edges)
+
+    def seeds(self, count):
+        # First sources in file order
+        return list(self.edges)[:count]
+
+    def links(self, url):
+        if url not in self.pages: return None
+        return self.edges.get(url, [])
@@ -0,0 +1,225 @@
+from argparse import ArgumentParser
+from concurrent.futures import Future
+from heapq import heappush, heappop
+from itertools import count
+from math import log
+
+from frontier.politeness import Frontier
+from fetcher.robots import RobotsResolver, _base_url, _can_fetch
+from simulation.graph import SyntheticGraph, RecordedGraph
+from simulation.web import SimulatedWeb
+from utils.url import canonicalize
+from utils.priority import make_host_scorer
+from utils.concurrency import ConcurrencyLimit
+from utils.health import HostHealth
+from multithread.main import new_state
+from multithread.worker import _fill_worker_pool, _release_pending, _pool_size
+from config import NUM_THREADS
+
+# Frontier host ordering: 'live' re-scores hosts from current crawl counts (the crawler's policy),
+# 'enqueue' keeps the priority each link got when it was enqueued
+POLICIES = {
+    'live': make_host_scorer,
+    'enqueue': lambda state: None,
+}
+
+# Simulated seconds since the crawl started; only the event loop moves it forward
+class VirtualClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+# Stands in for the worker pool: submitted crawl tasks finish on the virtual clock, in order of their
+# simulated fetch times (ties in submission order), and run one at a time
+class SimulatedTasks:
+    def __init__(self, web, clock):
+        self.web = web
+        self.clock = clock
+        self.tasks = [] # heap of (finish time, task id, start time, function, args)
+        self.ids = count()
+
+    def submit(self, function, item, *args):
+        task_id = next(self.ids)
+        heappush(self.tasks, (self.clock() + self.web.fetch_time(item[1]), task_id, self.clock(), function, (item, *args)))
+        return task_id
+
+    def next_time(self):
+        return self.tasks[0][0] if self.tasks else None
+
+    def run_due(self):
+        # (task id, result) of every task finishing by now; each runs as of its start time, and its
+        # simulated fetch moves the clock to its finish time
+        done, now = [], self.clock.now
+        while self.tasks and self.tasks[0][0] <= now:
+            _, task_id, start, function, args = heappop(self.tasks)
+            self.clock.now = start
+            done.append((task_id, function(*args)))
+        self.clock.now = now
+        return done
+
+# RobotsResolver whose fetches finish on the virtual clock, one host round trip after they start
+class SimulatedRobotsResolver(RobotsResolver):
+    def __init__(self, cache, web, clock):
+        super().__init__(cache, max_workers=1, fetch=web.fetch_robots)
+        self.web = web
+        self.clock = clock
+        self.due = [] # heap of (finish time, base_url)
+
+    def wait(self, url):
+        # Asked for once a page of the host has been fetched, which took at least a round trip too
+        allowed = self.status(url)
+        if allowed is not None: return allowed
+        base_url = _base_url(url)
+        with self.lock:
+            future = self._submit(base_url)
+        return _can_fetch(self._finish(base_url, future), url)
+
+    def next_time(self):
+        return self.due[0][0] if self.due else None
+
+    def resolve_due(self):
+        while self.due and self.due[0][0] <= self.clock():
+            _, base_url = heappop(self.due)
+            future = self.inflight.get(base_url)
+            if future is not None: self._finish(base_url, future)
+
+    def _submit(self, base_url):
+        future = self.inflight.get(base_url)
+        if future is None:
+            future = self.inflight[base_url] = Future()
+            heappush(self.due, (self.clock() + self.web.robots_time(base_url), base_url))
+        return future
+
+    def _finish(self, base_url, future):
+        if not future.done(): future.set_result(self._resolve(base_url))
+        return future.result()
+
+# Stands in for the page log: records when each page was logged and its host
+class PageRecorder:
+    def __init__(self, clock):
+        self.pages = [] # (time, url)
+        self.clock = clock
+
+    def write(self, line):
+        self.pages.append((self.clock(), line.split('\t', 1)[0]))
+
+    def flush(self):
+        pass
+
+def simulate(web, seeds, policy='live', num_threads=NUM_THREADS, max_pages=2000, max_time=600, adaptive=False):
+    # Run the multithreaded engine's scheduling and page handling against a simulated web, with
+    # fetches, politeness delays and backoffs on a virtual clock (max_time is in simulated seconds)
+    clock = VirtualClock()
+    state = new_state()
+    state['clock'] = clock
+    state['host_health'] = HostHealth(clock=clock)
+    state['robots_resolver'] = SimulatedRobotsResolver(state['robots_cache'], web, clock)
+    if adaptive: state['concurrency'] = ConcurrencyLimit(num_threads, clock=clock) # num_threads is then the starting point
+
+    def fetch(url, decode=True):
+        # The fetch takes its simulated time
+        clock.now += web.fetch_time(url)
+        return web.fetch_page(url, decode)
+    state['fetch'] = fetch
+
+    frontier = Frontier(state['robots_cache'], POLICIES[policy](state), health=state['host_health'], clock=clock)
+    for seed in seeds:
+        if seed in state['scheduled']: continue
+        frontier.push((0, seed, 0))
+        state['scheduled'].add(seed)
+
+    recorder = PageRecorder(clock)
+    _crawl(frontier, state, recorder, SimulatedTasks(web, clock), num_threads, max_pages, max_time)
+    state['robots_resolver'].shutdown()
+    frontier.close()
+
+    result = summarize(recorder.pages, clock.now, state)
+    if adaptive: result['concurrency'] = state['concurrency'].value
+    return result
+
+def _crawl(frontier, state, log, tasks, num_threads, max_pages, max_time):
+    # Event-driven counterpart of crawl_with_workers: rather than waiting, jump the clock to the next
+    # event (a fetch or robots.txt fetch finishing, or a host's delay ending)
+    resolver, limiter, clock = state['robots_resolver'], state.get('concurrency'), state['clock']
+    futures = {} # task id -> URL being crawled
+    _fill_worker_pool(futures, frontier, tasks, state, log, _pool_size(state, num_threads), max_pages, max_time, 0)
+
+    while futures or ((frontier or resolver.has_pending()) and not state['exit']):
+        next_ready = frontier.next_ready_time()
+        events = [time for time in (tasks.next_time(), resolver.next_time()) if time is not None]
+        if next_ready is not None and next_ready > clock.now: events.append(next_ready)
+        if not events: break # nothing left that could make progress
+        clock.now = max(clock.now, min(events))
+
+        resolver.resolve_due()
+        for task_id, links in tasks.run_due():
+            url = futures.pop(task_id)
+            frontier.done(url)
+            state['scheduled'].discard(url)
+            for link in links: frontier.push(link)
+
+        _release_pending(frontier, state)
+        _fill_worker_pool(futures, frontier, tasks, state, log, _pool_size(state, num_threads), max_pages, max_time, 0)
+        if limiter is not None: limiter.in_flight(len(futures))
+
+def summarize(pages, elapsed, state):
+    # Throughput, diversity and how fast new hosts were reached (times in simulated seconds)
+    host_pages, superdomains, milestones, milestone = {}, set(), {}, 10
+    for logged, url in pages:
+        _, host, superdomain, _, _ = canonicalize(url)
+        host_pages[host] = host_pages.get(host, 0) + 1
+        superdomains.add(superdomain)
+
+        # Time to 10, 100, 1000... unique hosts
+        if len(host_pages) == milestone:
+            milestones[milestone] = logged
+            milestone *= 10
+
+    # Normalized entropy of pages over hosts (1 = evenly spread)
+    total = len(pages)
+    entropy = -sum(count / total * log(count / total) for count in host_pages.values()) if total else 0
+    evenness = entropy / log(len(host_pages)) if len(host_pages) > 1 else 0
+
+    return {
+        'pages': total,
+        'elapsed': elapsed,
+        'pages_per_second': total / elapsed if elapsed else 0,
+        'hosts': len(host_pages),
+        'superdomains': len(superdomains),
+        'host_evenness': evenness,
+        'time_to_hosts': milestones,
+        'status_counts': dict(state['status_counts'].items()),
+    }
+
+def print_report(result):
+    print(f"Pages: {result['pages']} in {result['elapsed']:.2f} simulated seconds ({result['pages_per_second']:.2f} pages/s)")
+    print(f"Unique hosts: {result['hosts']}, superdomains: {result['superdomains']}, host evenness: {result['host_evenness']:.3f}")
+    for count, seconds in sorted(result['time_to_hosts'].items()):
+        print(f'Time to {count} hosts: {seconds:.2f} seconds')
+    if 'concurrency' in result: print(f"Final concurrency limit: {result['concurrency']}")
+    for status_code, count in sorted(result['status_counts'].items()):
+        print(f'{status_code} responses: {count}')
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Offline crawl simulator (real scheduler, simulated web)')
+    parser.add_argument('--graph', help="recorded graph as 'source<TAB>target' lines (default: synthetic)")
+    parser.add_argument('--hosts', type=int, default=2000, help='hosts in the synthetic graph')
+    parser.add_argument('--seeds', type=int, default=10, help='seed URLs')
+    parser.add_argument('--pages', type=int, default=2000, help='max pages to crawl')
+    parser.add_argument('--time', type=float, default=600, help='max simulated seconds')
+    parser.add_argument('--threads', type=int, default=NUM_THREADS, help='worker threads')
+    parser.add_argument('--latency', type=float, default=0.2, help='median fetch latency in seconds')
+    parser.add_argument('--failure-rate', type=float, default=0.05, help='mean share of failed fetches')
+    parser.add_argument('--adaptive', action='store_true', help='adapt concurrency at runtime (--threads is the start)')
+    parser.add_argument('--policy', choices=sorted(POLICIES), nargs='+', default=['live'], help='frontier policies to compare')
+    parser.add_argument('--seed', type=int, default=0, help='random seed for the graph and the web')
+    args = parser.parse_args()
+
+    graph = RecordedGraph(args.graph) if args.graph else SyntheticGraph(args.hosts, seed=args.seed)
+    for index, policy in enumerate(args.policy):
+        if index: print()
+        print(f'Policy: {policy}')
+        web = SimulatedWeb(graph, latency=args.latency, failure_rate=args.failure_rate, seed=args.seed)
+        print_report(simulate(web, graph.seeds(args.seeds), policy, args.threads, args.pages, args.time, args.adaptive))
@@ -0,0 +1,52 @@
+from simulation.graph import SyntheticGraph, RecordedGraph
+from simulation.run import simulate
+from simulation.web import SimulatedWeb
+
+def test_synthetic_graph_is_deterministic():
+    graph, again = SyntheticGraph(hosts=50, seed=1), SyntheticGraph(hosts=50, seed=1)
+    seeds = graph.seeds(5)
+    assert seeds == again.seeds(5) and len(set(seeds)) == 5
+    assert graph.links(seeds[0]) == again.links(seeds[0])
+    assert graph.links(seeds[0]) != SyntheticGraph(hosts=50, seed=2).links(seeds[0])
+
+    # Only pages within a host's size exist
+    host = graph.hosts[0]
+    assert graph.links(f'http://{host}/p{graph.sizes[0] - 1}') is not None
+    assert graph.links(f'http://{host}/p{graph.sizes[0]}') is None
+    assert graph.links(f'http://{host}/other') is None
+    assert graph.links('http://unknown.com') is None
+
+def test_recorded_graph(tmp_path):
+    path = tmp_path / 'edges.tsv'
+    path.write_text('# comment\nhttp://a.com\thttp://b.com/x\nhttp://a.com\thttp://c.com\nhttp://c.com\thttp://a.com\n\nhttp://d.com\n')
+    graph = RecordedGraph(path)
+    assert graph.seeds(2) == ['http://a.com', 'http://c.com']
+    assert graph.links('http://a.com') == ['http://b.com/x', 'http://c.com']
+    assert graph.links('http://b.com/x') == []
+    assert graph.links('http://d.com') == []
+    assert graph.links('http://e.com') is None
+
+def test_simulated_crawl():
+    graph = SyntheticGraph(hosts=100, seed=0)
+    web = SimulatedWeb(graph, latency=0.05, failure_rate=0.05)
+    result = simulate(web, graph.seeds(5), num_threads=8, max_pages=150, max_time=600)
+    assert 150 <= result['pages'] <= 150 + 8 # fetches in flight at the limit still finish
+    assert result['hosts'] >= 5
+    assert 0 < result['host_evenness'] <= 1
+    assert result['status_counts'].get(200, 0) > 100
+
+def test_same_seed_same_result():
+    def run(seed):
+        graph = SyntheticGraph(hosts=200, seed=seed)
+        return simulate(SimulatedWeb(graph, failure_rate=0.1, seed=seed), graph.seeds(5), num_threads=16, max_pages=300)
+    result = run(3)
+    assert result == run(3)
+    assert result != run(4)
+
+def test_time_limit_is_simulated():
+    # A crawl of simulated minutes stops at the limit however long it takes to run
+    graph = SyntheticGraph(hosts=200, seed=0)
+    web = SimulatedWeb(graph, latency=2, seed=0)
+    result = simulate(web, graph.seeds(5), num_threads=4, max_pages=10000, max_time=60)
+    assert 60 <= result['elapsed'] <= 60 + web.timeout
+    assert 0 < result['pages'] < 10000
@@ -0,0 +1,73 @@
+from datetime import datetime, timezone
+from html import escape
+from random import Random
+from urllib.parse import urlsplit
+
+# Fake fetch layer over a web graph, with the same interface as fetcher.page.fetch_page and the robots.txt fetch.
+# Each host gets a median latency (log-normal across hosts) and a failure rate (exponential across hosts);
+# each fetch then draws its own latency around the host's median and fails (timeout or 5xx) at the host's rate.
+# Fetches return at once: fetch_time and robots_time give the simulated seconds they take, which the
+# simulator charges to its virtual clock, so results depend only on the seed.
+class SimulatedWeb:
+    def __init__(self, graph, latency=0.2, latency_spread=1.0, jitter=0.5, failure_rate=0.05, timeout=5, page_bytes=30000, seed=0):
+        self.graph = graph
+        self.latency = latency                  # median seconds per fetch across hosts
+        self.latency_spread = latency_spread    # log-normal sigma of host medians
+        self.jitter = jitter                    # log-normal sigma of fetches around their host's median
+        self.failure_rate = failure_rate        # mean share of failed fetches across hosts
+        self.timeout = timeout                  # seconds a timed-out fetch takes
+        self.page_bytes = page_bytes            # median reported page size
+        self.seed = seed
+        self.hosts = {} # host -> (median latency, failure rate)
+
+    def fetch_time(self, url):
+        # Simulated seconds the fetch of url takes
+        return self._draw(url)[1]
+
+    def robots_time(self, base_url):
+        # One round trip to the host
+        return min(self._host(urlsplit(base_url).netloc)[0], self.timeout)
+
+    def fetch_page(self, url, decode=True):
+        meta = {'status_code': 0, 'content_length': 0}
+        rng, _, failure = self._draw(url)
+
+        # Failures: half time out, half answer with a server error
+        if failure is not None:
+            meta['timestamp'] = datetime.now(timezone.utc).isoformat()
+            if failure == 'timeout': meta['error'] = 'read'
+            else: meta['status_code'] = rng.choice((500, 503))
+            return url, None, meta
+
+        meta['timestamp'] = datetime.now(timezone.utc).isoformat()
+        links = self.graph.links(url)
+        if links is None:
+            meta['status_code'] = 404
+            return url, None, meta
+
+        # Minimal page holding the links (parsed by the real link extractor); the reported size is simulated
+        html = '<html><body>' + ''.join(f'<a href="{escape(link)}">link</a>' for link in links) + '</body></html>'
+        meta['status_code'] = 200
+        meta['content_length'] = max(len(html), int(self.page_bytes * rng.lognormvariate(0, 1)))
+        meta['content_type'] = 'text/html; charset=utf-8'
+        return url, html if decode else html.encode('utf-8'), meta
+
+    def fetch_robots(self, base_url, user_agent='*'):
+        # Every host allows everything (None)
+        return None
+
+    def _draw(self, url):
+        # Per-fetch draws, the same on every call for a URL: (rng for the rest of the page, seconds, failure or None)
+        rng = Random(f'{self.seed}:{url}')
+        latency, failure_rate = self._host(urlsplit(url).netloc)
+        if rng.random() < failure_rate:
+            timed_out = rng.random() < 0.5
+            return rng, min(self.timeout if timed_out else latency, self.timeout), 'timeout' if timed_out else 'server'
+        return rng, min(latency * rng.lognormvariate(0, self.jitter), self.timeout), None
+
+    def _host(self, host):
+        profile = self.hosts.get(host)
+        if profile is None:
+            rng = Random(f'{self.seed}:{host}')
+            profile = self.hosts[host] = (self.latency * rng.lognormvariate(0, self.latency_spread), min(rng.expovariate(1 / self.failure_rate), 1) if self.failure_rate else 0)
+        return profile
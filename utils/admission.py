@@ -0,0 +1,75 @@
+from utils.priority import compute_priority
+from config import DEBUG
+
+# Link admission shared by both engines: duplicate, robots.txt, host health and trap checks, then the
+# link's priority. Links to hosts whose robots.txt isn't resolved yet are parked with the resolver.
+def admit_link(state, link, link_domain, link_superdomain, depth, source=None):
+    # Frontier item for a new link, or None if it is skipped (or parked until its robots.txt resolves);
+    # source is the host of the page it was found on, if known
+
+    # Skip if already scheduled (in heap)
+    if link in state['scheduled']:
+        if DEBUG:
+            print('Skipping', link)
+            state['skipped_dupes'].add()
+        return None
+
+    # Skip if already fetched
+    if link in state['visited']:
+        if DEBUG:
+            print('Skipping', link)
+            state['skipped_dupes'].add()
+        return None
+
+    # Skip if already in robots block list
+    if link in state['disallowed']:
+        if DEBUG:
+            print('Skipping', link)
+            state['skipped_robots'].add()
+        return None
+
+    # Skip if domain was dropped after repeated failures
+    if state['host_health'].is_dropped(link_domain):
+        if DEBUG:
+            print('Skipping', link)
+            state['skipped_timeout'].add()
+        return None
+
+    # Skip if the host's discovered-URL budget is used up (likely a crawler trap)
+    if not state['traps'].within_budget(link_domain):
+        if DEBUG:
+            print('Skipping', link)
+            state['skipped_traps'].add()
+        return None
+
+    # Skip if blocked by robots.txt (None if the host's robots.txt is not resolved yet)
+    allowed = state['robots_resolver'].status(link)
+    if allowed is False:
+        state['disallowed'].add(link)
+        if DEBUG:
+            print('Skipping', link)
+            state['skipped_robots'].add()
+        return None
+
+    # Track domain crawl count and compute priority (demoted if the host's pages yield few new links, or the path repeats itself)
+    superdomain_domain_count = state['superdomain_domains'].add(link_superdomain, link_domain)
+    domain_crawl_count = state['domain_crawl_counts'].get(link_domain, 0)
+    priority = compute_priority(domain_crawl_count, superdomain_domain_count) * state['traps'].factor(link_domain, link)
+    
+    # Claim the link (atomic, so two workers finding the same link don't both enqueue it)
+    if not state['scheduled'].check_and_add(link):
+        if DEBUG: state['skipped_dupes'].add()
+        return None
+    state['traps'].discovered_link(link_domain)
+    if source is not None: state['traps'].found_link(source)
+
+    # Park link in the pending area until its host's robots.txt resolves
+    if allowed is None and state['robots_resolver'].defer(link, (-priority, link, depth)):
+        return None
+
+    # Enqueue (re-checked in case robots.txt resolved in the meantime)
+    if allowed is None and not state['robots_resolver'].status(link):
+        state['scheduled'].discard(link)
+        state['disallowed'].add(link)
+        return None
+    return (-priority, link, depth)
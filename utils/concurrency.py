@@ -0,0 +1,86 @@
+from math import sqrt
+from threading import Lock
+from time import time
+
+from config import (
+    CONCURRENCY_MIN, CONCURRENCY_MAX, CONCURRENCY_WINDOW, CONCURRENCY_ERROR_MARGIN,
+    CONCURRENCY_LATENCY_TOLERANCE, CONCURRENCY_BACKOFF, PARSE_PROCESSES, DEBUG,
+)
+
+BASELINE_SMOOTHING = 0.1    # weight of each window in the long-term latency and error baselines
+MIN_WINDOW_SAMPLES = 10     # fetches needed before a window is evaluated
+PARSE_BACKLOG = 2 * max(PARSE_PROCESSES, 1) # pages parsing at once beyond which parsing can't keep up
+
+# Number of fetches the scheduler keeps in flight, adjusted once per window of completed fetches:
+#  - multiplicative decrease when the error/timeout rate rises above its long-term level or parsing backs up
+#  - otherwise a latency gradient (long-term / current latency, so queueing anywhere shrinks the limit) plus
+#    an additive sqrt(limit) probe, applied only when the limit was actually reached during the window
+class ConcurrencyLimit:
+    def __init__(self, initial, minimum=CONCURRENCY_MIN, maximum=CONCURRENCY_MAX, window=CONCURRENCY_WINDOW, clock=time):
+        self.minimum = minimum
+        self.maximum = max(maximum, minimum)
+        self.window = window
+        self.limit = float(min(max(initial, minimum), self.maximum))
+        self.lock = Lock() # fetches are recorded from every worker thread
+        self.clock = clock # source of the current time (virtual in the offline simulator)
+
+        self.long_latency = None    # long-term mean fetch latency (baseline)
+        self.long_errors = None     # long-term error rate (baseline, so dead hosts on the open web don't count)
+        self.parsing = 0            # pages being parsed right now
+        self._reset_window()
+
+    @property
+    def value(self):
+        return int(self.limit)
+
+    def record(self, latency, failed):
+        # One finished fetch: its latency and whether it failed in a way load can cause (timeout, connection error, 429)
+        with self.lock:
+            self.samples += 1
+            self.backlog += self.parsing
+            if failed: self.errors += 1
+            else:
+                self.latency_sum += latency
+                self.successes += 1
+            if self.samples >= MIN_WINDOW_SAMPLES and self.clock() - self.window_start >= self.window: self._update()
+
+    def in_flight(self, count):
+        # Fetches in flight right now (limit increases only count when the limit was the bottleneck)
+        if count >= self.value: self.saturated = True
+
+    def parse_started(self):
+        with self.lock:
+            self.parsing += 1
+
+    def parse_finished(self):
+        with self.lock:
+            self.parsing -= 1
+
+    def _update(self):
+        errors = self.errors / self.samples
+        backlog = self.backlog / self.samples
+        latency = self.latency_sum / self.successes if self.successes else None
+        previous = self.value
+
+        if (self.long_errors is not None and errors > self.long_errors + CONCURRENCY_ERROR_MARGIN) or backlog > PARSE_BACKLOG:
+            self.limit *= CONCURRENCY_BACKOFF
+        elif latency is not None and self.long_latency is not None:
+            # Latency well above its baseline means requests are queueing: scale down in proportion
+            gradient = min(max(CONCURRENCY_LATENCY_TOLERANCE * self.long_latency / latency, 0.5), 1)
+            self.limit = self.limit * gradient + (sqrt(self.limit) if self.saturated and gradient == 1 else 0)
+        self.limit = min(max(self.limit, self.minimum), self.maximum)
+
+        # Baselines follow slowly, so a sustained change becomes the new normal
+        self.long_errors = errors if self.long_errors is None else self.long_errors + BASELINE_SMOOTHING * (errors - self.long_errors)
+        if latency is not None:
+            self.long_latency = latency if self.long_latency is None else self.long_latency + BASELINE_SMOOTHING * (latency - self.long_latency)
+
+        if DEBUG and self.value != previous: print(f'[CONCURRENCY] {previous} -> {self.value} (errors {errors:.2f}, latency {latency}, backlog {backlog:.1f})')
+        self._reset_window()
+
+    def _reset_window(self):
+        self.window_start = self.clock()
+        self.samples = self.successes = self.errors = 0
+        self.latency_sum = 0.0
+        self.backlog = 0
+        self.saturated = False
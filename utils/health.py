@@ -0,0 +1,80 @@
+from threading import Lock
+from time import time
+
+from config import HOST_FAILURE_THRESHOLD, HOST_BACKOFF, HOST_MAX_BACKOFF, HOST_MAX_BACKOFFS, DEBUG
+
+# Failures that open the breaker at once: the host name doesn't resolve, or the server asks us to back off
+IMMEDIATE = ('dns', 'throttled')
+
+def failure_kind(meta):
+    # Failure class of a fetch ('dns', 'connect', 'read', 'throttled' or 'server'), None if the host answered
+    # normally (4xx included, the host is fine)
+    status = meta['status_code']
+    if status == 429 or (status == 503 and meta.get('retry_after') is not None): return 'throttled'
+    if status >= 500: return 'server'
+    if meta.get('error'): return meta['error']
+    if status == 0: return 'connect'
+    return None
+
+# Per-host circuit breaker. Closed while a host answers; opens (no fetches until a backoff ends) on repeated
+# failures, and the first fetch after the backoff is a half-open probe: success closes the breaker, failure
+# reopens it with twice the backoff, until the host is dropped. Only failing hosts are tracked.
+class HostHealth:
+    def __init__(self, threshold=HOST_FAILURE_THRESHOLD, backoff=HOST_BACKOFF, max_backoff=HOST_MAX_BACKOFF, max_backoffs=HOST_MAX_BACKOFFS, hosts=None, dropped=None, clock=time):
+        self.threshold = threshold
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_backoffs = max_backoffs
+        self.hosts = dict(hosts or {})      # host -> [consecutive failures, consecutive backoffs, backoff end time]
+        self.dropped = set(dropped or ())   # hosts given up on
+        self.lock = Lock()                  # fetches are recorded from every worker thread
+        self.clock = clock                  # source of the current time (virtual in the offline simulator)
+
+    def record(self, host, meta):
+        kind = failure_kind(meta)
+        with self.lock:
+            # Answer from the host closes its breaker (including a successful probe)
+            if kind is None:
+                self.hosts.pop(host, None)
+                return
+
+            # Open on enough consecutive failures, at once for DNS failures and throttling, and on a failed probe
+            entry = self.hosts.setdefault(host, [0, 0, 0])
+            entry[0] += 1
+            if entry[0] < self.threshold and kind not in IMMEDIATE and not entry[1]: return
+            entry[0] = 0
+            entry[1] += 1
+
+            # Still failing after the last backoff
+            if entry[1] > self.max_backoffs:
+                del self.hosts[host]
+                self.dropped.add(host)
+                if DEBUG: print(f'[HEALTH] Dropping {host} ({kind})')
+                return
+
+            # Exponential backoff, or the server's Retry-After if longer (both capped)
+            delay = self.backoff * 2 ** (entry[1] - 1)
+            if meta.get('retry_after') is not None: delay = max(delay, meta['retry_after'])
+            delay = min(delay, self.max_backoff)
+            entry[2] = self.clock() + delay
+            if DEBUG: print(f'[HEALTH] Backing off {host} for {delay:.0f} seconds ({kind})')
+
+    def retry_time(self, host):
+        # Time the host's backoff ends (0 if its breaker is closed)
+        entry = self.hosts.get(host)
+        return entry[2] if entry is not None else 0
+
+    def is_dropped(self, host):
+        return host in self.dropped
+
+    def copy(self):
+        with self.lock:
+            return HostHealth(self.threshold, self.backoff, self.max_backoff, self.max_backoffs,
+                              {host: list(entry) for host, entry in self.hosts.items()}, self.dropped, self.clock)
+
+    def __getstate__(self):
+        copy = self.copy()
+        return {'settings': (copy.threshold, copy.backoff, copy.max_backoff, copy.max_backoffs), 'hosts': copy.hosts, 'dropped': copy.dropped}
+
+    def __setstate__(self, state):
+        self.__init__(*state['settings'], state['hosts'], state['dropped'])
@@ -1,5 +1,17 @@
 from math import log
 
+from utils.url import host_superdomain
+
 def compute_priority(domain_crawl_count, superdomain_domain_count):
     # return 1 / log(1 + domain_crawl_count + 1e-6)
-    return 1 / log(2 + domain_crawl_count) + 1 / (1 + superdomain_domain_count)
\ No newline at end of file
+    return 1 / log(2 + domain_crawl_count) + 1 / (1 + superdomain_domain_count)
+
+def make_host_scorer(state):
+    # Current priority of a host, from live crawl counts (used by the frontier to re-score hosts)
+    def score(host):
+        superdomain = host_superdomain(host) # memoized per host
+        domain_crawl_count = state['domain_crawl_counts'].get(host, 0)
+        superdomain_domain_count = state['superdomain_domains'].count(superdomain)
+        return compute_priority(domain_crawl_count, superdomain_domain_count) * state['traps'].factor(host)
+
+    return score
@@ -0,0 +1,179 @@
+from array import array
+from hashlib import blake2b
+from functools import lru_cache
+from threading import Lock
+
+from config import SEEN_STORE, SEEN_BLOOM_CAPACITY
+
+EMPTY, DELETED = 0, 1       # Reserved slot markers (real fingerprints are always >= 2)
+HOST_BITS, PATH_BITS = 24, 40
+MAX_LOAD = 0.5              # Grow the table past this fill ratio
+BLOOM_HASHES = 7            # ~1% false positives at 10 bits per URL
+
+def url_fingerprint(url):
+    # 64-bit fingerprint: URLs on the same host share the top 24 bits (host hash), the rest hashes the URL
+    split = url.find('/', url.find('//') + 2) if '//' in url else -1
+    host = url[:split] if split != -1 else url
+    host_hash = host_prefix(host)
+    path_hash = int.from_bytes(blake2b(url.encode('utf-8', 'surrogatepass'), digest_size=PATH_BITS // 8).digest(), 'big')
+    return max((host_hash << PATH_BITS) | path_hash, DELETED + 1)
+
+@lru_cache(maxsize=65536)
+def host_prefix(host_url):
+    # Fingerprint prefix shared by every URL under scheme://netloc
+    return int.from_bytes(blake2b(host_url.encode('utf-8', 'surrogatepass'), digest_size=HOST_BITS // 8).digest(), 'big')
+
+# Set-like store of URL fingerprints in an array-backed open-addressing table (8 bytes per slot)
+# with an optional Bloom filter in front so most "new URL" checks never probe the table.
+class SeenStore:
+    def __init__(self, bloom_capacity=SEEN_BLOOM_CAPACITY, initial_capacity=1024):
+        self.table = array('Q', bytes(8 * initial_capacity)) # capacity is always a power of two
+        self.count = 0      # live fingerprints
+        self.used = 0       # live + deleted slots (drives resizing)
+        self.lock = Lock()  # writers only; readers see either the old or the new table
+
+        # Bloom filter (never cleared on discard, so it only ever says "definitely new" or "maybe")
+        bloom_bits = 8
+        while bloom_bits < bloom_capacity * 10: bloom_bits *= 2
+        self.bloom_mask = bloom_bits - 1
+        self.bloom = bytearray(bloom_bits // 8) if bloom_capacity else None
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, url):
+        return self._contains(url_fingerprint(url))
+
+    def add(self, url):
+        self.check_and_add(url)
+
+    def check_and_add(self, url):
+        # Add URL and return True if it was not already present
+        fingerprint = url_fingerprint(url)
+        with self.lock:
+            if self._contains(fingerprint): return False
+            self._insert(fingerprint)
+            return True
+
+    def discard(self, url):
+        fingerprint = url_fingerprint(url)
+        with self.lock:
+            table = self.table
+            mask = len(table) - 1
+            index = self._slot(fingerprint, mask)
+            while table[index] != EMPTY:
+                if table[index] == fingerprint:
+                    table[index] = DELETED
+                    self.count -= 1
+                    return
+                index = (index + 1) & mask
+
+    def update(self, other):
+        # Add every URL of another store (copies its fingerprints, since the URLs themselves aren't kept)
+        with self.lock:
+            for fingerprint in other.table:
+                if fingerprint > DELETED and not self._contains(fingerprint): self._insert(fingerprint)
+
+    def copy(self):
+        # Point-in-time copy (writers only wait for the table memcpy), e.g. for checkpoints
+        store = SeenStore(bloom_capacity=0, initial_capacity=1)
+        with self.lock:
+            store.table, store.count, store.used = self.table[:], self.count, self.used
+            store.bloom_mask, store.bloom = self.bloom_mask, (bytearray(self.bloom) if self.bloom is not None else None)
+        return store
+
+    def __getstate__(self):
+        # Locks can't be pickled, so drop it and make a fresh one on load
+        state = self.__dict__.copy()
+        del state['lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = Lock()
+
+    def host_count(self, host_url):
+        # Number of stored URLs under scheme://netloc (full scan, for reporting only)
+        prefix = host_prefix(host_url)
+        return sum(1 for fingerprint in self.table if fingerprint > DELETED and fingerprint >> PATH_BITS == prefix)
+
+    def _slot(self, fingerprint, mask):
+        # Fold host bits into the low bits so one host's URLs don't cluster
+        return (fingerprint ^ (fingerprint >> PATH_BITS)) & mask
+
+    def _bloom_positions(self, fingerprint):
+        # Double hashing from the two halves of the fingerprint
+        first, second = fingerprint & 0xffffffff, (fingerprint >> 32) | 1
+        mask = self.bloom_mask
+        return [(first + i * second) & mask for i in range(BLOOM_HASHES)]
+
+    def _contains(self, fingerprint):
+        # Bloom filter says definitely new, so skip the table probe
+        if self.bloom is not None:
+            for position in self._bloom_positions(fingerprint):
+                if not self.bloom[position >> 3] & (1 << (position & 7)): return False
+
+        table = self.table # mask comes from the same table in case a resize swaps it mid-read
+        mask = len(table) - 1
+        index = self._slot(fingerprint, mask)
+        while table[index] != EMPTY:
+            if table[index] == fingerprint: return True
+            index = (index + 1) & mask
+        return False
+
+    def _insert(self, fingerprint):
+        # Caller must hold the lock
+        if self.used + 1 > len(self.table) * MAX_LOAD: self._resize()
+
+        table = self.table
+        mask = len(table) - 1
+        index = self._slot(fingerprint, mask)
+        while table[index] > DELETED:
+            index = (index + 1) & mask
+        if table[index] == EMPTY: self.used += 1
+        table[index] = fingerprint
+        self.count += 1
+
+        if self.bloom is not None:
+            for position in self._bloom_positions(fingerprint):
+                self.bloom[position >> 3] |= 1 << (position & 7)
+
+    def _resize(self):
+        # Rebuild into a table sized for the live entries (dropping deleted slots), then swap it in
+        capacity = len(self.table)
+        while self.count + 1 > capacity * MAX_LOAD / 2: capacity *= 2
+        table, mask = array('Q', bytes(8 * capacity)), capacity - 1
+
+        for fingerprint in self.table:
+            if fingerprint <= DELETED: continue
+            index = self._slot(fingerprint, mask)
+            while table[index] != EMPTY:
+                index = (index + 1) & mask
+            table[index] = fingerprint
+
+        self.table, self.used = table, self.count
+
+# Exact string set with the same atomic check_and_add as SeenStore
+class SeenSet(set):
+    def __init__(self, urls=()):
+        super().__init__(urls)
+        self.lock = Lock()
+
+    def check_and_add(self, url):
+        # Add URL and return True if it was not already present
+        with self.lock:
+            if url in self: return False
+            self.add(url)
+            return True
+
+    def copy(self):
+        with self.lock:
+            return SeenSet(self)
+
+    def __reduce__(self):
+        # Pickle as the URLs alone (locks can't be pickled)
+        return SeenSet, (list(self),)
+
+def new_seen_store():
+    # Exact string set, or the compact fingerprint store (see SEEN_STORE in config)
+    return SeenStore() if SEEN_STORE == 'fingerprint' else SeenSet()
@@ -0,0 +1,105 @@
+from array import array
+from functools import lru_cache
+from hashlib import blake2b
+from re import compile, IGNORECASE, DOTALL
+from threading import Lock
+
+import numpy as np
+
+from config import NEAR_DUPLICATE_DISTANCE
+
+SHINGLE_WORDS = 3   # words per shingle
+MIN_SHINGLES = 8    # pages with less text get no fingerprint (too little to compare)
+
+MARKUP_RE = compile(r'<!--.*?-->|<(script|style)\b.*?</\1\s*>|<[^>]*>', IGNORECASE | DOTALL)
+
+# Shingle hash mixing (multipliers for the word positions, then the splitmix64 finalizer)
+SHINGLE_MULTIPLIERS = (np.uint64(0x9E3779B97F4A7C15), np.uint64(0xC2B2AE3D27D4EB4F))
+MIX = (np.uint64(0xBF58476D1CE4E5B9), np.uint64(0x94D049BB133111EB))
+
+# Bit k of every byte value, to turn per-byte value counts into per-bit counts
+BYTE_BITS = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).astype(np.int64)
+
+def _feature_hash(text):
+    # Stable across processes (unlike hash()), so parse pool workers produce comparable fingerprints
+    return int.from_bytes(blake2b(text.encode('utf-8', 'surrogatepass'), digest_size=8).digest(), 'little')
+
+# Words repeat across pages, links mostly don't
+_word_hash = lru_cache(maxsize=100000)(_feature_hash)
+
+def _link_path(link):
+    # Links count by path, so a mirror on another host (whose relative links resolve there) still matches
+    split = link.find('/', link.find('//') + 2)
+    return link[split:] if split != -1 else '/'
+
+def simhash(html, links=()):
+    # 64-bit SimHash of a page's visible text (word shingles) and outgoing links, None if the page has too
+    # little of either. Each distinct feature votes on every bit, so pages sharing most features land within
+    # a few bits of each other.
+    words = MARKUP_RE.sub(' ', html).lower().split()
+    hashes = np.fromiter(map(_word_hash, words), dtype=np.uint64, count=len(words))
+    if len(hashes) >= SHINGLE_WORDS:
+        hashes = hashes[:-2] * SHINGLE_MULTIPLIERS[0] + hashes[1:-1] * SHINGLE_MULTIPLIERS[1] + hashes[2:]
+    paths = np.fromiter(map(_feature_hash, map(_link_path, links)), dtype=np.uint64, count=len(links))
+
+    # Distinct features (sorted, so repeats sit next to each other)
+    features = np.sort(np.concatenate((hashes, paths)))
+    features = features[np.concatenate(([True], features[1:] != features[:-1]))]
+    if len(features) < MIN_SHINGLES: return None
+
+    # Spread feature hashes over all 64 bits
+    features ^= features >> np.uint64(30)
+    features *= MIX[0]
+    features ^= features >> np.uint64(27)
+    features *= MIX[1]
+    features ^= features >> np.uint64(31)
+
+    # Majority vote per bit (counted per byte position: value histogram times the bits of each value)
+    columns = features.view(np.uint8).reshape(-1, 8)
+    counts = np.concatenate([np.bincount(columns[:, byte], minlength=256) @ BYTE_BITS for byte in range(8)])
+    return int.from_bytes(np.packbits(counts * 2 > len(features)).tobytes(), 'big')
+
+# Fingerprints of crawled pages, split into distance + 1 bands so near-duplicates are found without a full
+# scan: fingerprints within `distance` bits share at least one band exactly (pigeonhole), so only
+# fingerprints in the same band buckets are compared (4 bands of 16 bits at the default distance of 3).
+class SimHashIndex:
+    def __init__(self, distance=NEAR_DUPLICATE_DISTANCE):
+        self.distance = distance
+        self.band_bits = 64 // (distance + 1)
+        self.band_mask = (1 << self.band_bits) - 1
+        self.bands = [{} for _ in range(distance + 1)]  # per band: band value -> array of fingerprints
+        self.count = 0
+        self.lock = Lock() # pages are checked from every worker
+
+    def __len__(self):
+        return self.count
+
+    def check_and_add(self, fingerprint):
+        # Add a page's fingerprint and return True if no near-duplicate was indexed before
+        with self.lock:
+            keys = [(fingerprint >> (index * self.band_bits)) & self.band_mask for index in range(len(self.bands))]
+            for band, key in zip(self.bands, keys):
+                for other in band.get(key, ()):
+                    if (fingerprint ^ other).bit_count() <= self.distance: return False
+
+            for band, key in zip(self.bands, keys):
+                bucket = band.get(key)
+                if bucket is None: bucket = band[key] = array('Q')
+                bucket.append(fingerprint)
+            self.count += 1
+            return True
+
+    def copy(self):
+        index = SimHashIndex(self.distance)
+        with self.lock:
+            index.bands = [{key: array('Q', bucket) for key, bucket in band.items()} for band in self.bands]
+            index.count = self.count
+        return index
+
+    def __getstate__(self):
+        copy = self.copy()
+        return {'distance': copy.distance, 'bands': copy.bands, 'count': copy.count}
+
+    def __setstate__(self, state):
+        self.__init__(state['distance'])
+        self.bands, self.count = state['bands'], state['count']
@@ -0,0 +1,161 @@
+from threading import Lock, local
+from zlib import crc32
+
+from config import STATE_STRIPES
+
+def _stripe(key, mask):
+    # Stable stripe for a key (crc32 so pickled state keeps its layout across processes)
+    data = key.encode('utf-8', 'surrogatepass') if isinstance(key, str) else str(key).encode()
+    return crc32(data) & mask
+
+# Scalar total kept in one cell per thread, so adds never contend and never get lost; merged on read
+class Accumulator:
+    def __init__(self, value=0):
+        self.cells = [[value]]  # one [total] cell per thread that has added
+        self.local = local()
+        self.lock = Lock()      # only taken when a thread adds for the first time
+
+    def add(self, amount=1):
+        cell = getattr(self.local, 'cell', None)
+        if cell is None:
+            cell = self.local.cell = [0]
+            with self.lock:
+                self.cells.append(cell)
+        cell[0] += amount
+
+    @property
+    def value(self):
+        return sum(cell[0] for cell in list(self.cells))
+
+    def copy(self):
+        return Accumulator(self.value)
+
+    def __getstate__(self):
+        return {'value': self.value}
+
+    def __setstate__(self, state):
+        self.__init__(state['value'])
+
+# Counts over a small, hot key set (e.g. HTTP status codes): per-thread dicts merged on read
+class ThreadCounts:
+    def __init__(self, counts=None):
+        self.tables = [dict(counts or {})]
+        self.local = local()
+        self.lock = Lock()
+
+    def add(self, key, amount=1):
+        table = getattr(self.local, 'table', None)
+        if table is None:
+            table = self.local.table = {}
+            with self.lock:
+                self.tables.append(table)
+        table[key] = table.get(key, 0) + amount
+
+    def get(self, key, default=0):
+        total = sum(table.get(key, 0) for table in list(self.tables))
+        return total if total else default
+
+    def items(self):
+        merged = {}
+        for table in list(self.tables):
+            for key, count in list(table.items()):
+                merged[key] = merged.get(key, 0) + count
+        return merged.items()
+
+    def values(self):
+        return [count for _, count in self.items()]
+
+    def copy(self):
+        return ThreadCounts(dict(self.items()))
+
+    def __getstate__(self):
+        return {'counts': dict(self.items())}
+
+    def __setstate__(self, state):
+        self.__init__(state['counts'])
+
+# Counts over many keys read on the hot path (e.g. per-host crawl counts): the key space is split into
+# lock-striped dicts, so writers to different hosts rarely share a lock and reads are a single lookup
+class StripedCounts:
+    def __init__(self, stripes=STATE_STRIPES):
+        self.mask = stripes - 1 # stripes is a power of two
+        self.tables = [{} for _ in range(stripes)]
+        self.locks = [Lock() for _ in range(stripes)]
+
+    def add(self, key, amount=1):
+        index = _stripe(key, self.mask)
+        table = self.tables[index]
+        with self.locks[index]:
+            table[key] = table.get(key, 0) + amount
+            return table[key]
+
+    def get(self, key, default=0):
+        return self.tables[_stripe(key, self.mask)].get(key, default)
+
+    def items(self):
+        items = []
+        for table, lock in zip(self.tables, self.locks):
+            with lock:
+                items.extend(table.items())
+        return items
+
+    def values(self):
+        return [count for _, count in self.items()]
+
+    def __len__(self):
+        return sum(len(table) for table in self.tables)
+
+    def copy(self):
+        counts = StripedCounts(self.mask + 1)
+        for index, (table, lock) in enumerate(zip(self.tables, self.locks)):
+            with lock:
+                counts.tables[index] = table.copy()
+        return counts
+
+    def __getstate__(self):
+        return {'tables': self.copy().tables}
+
+    def __setstate__(self, state):
+        self.__init__(len(state['tables']))
+        self.tables = state['tables']
+
+# Key -> set of members (e.g. superdomain -> domains seen under it), lock-striped by key
+class StripedSets:
+    def __init__(self, stripes=STATE_STRIPES):
+        self.mask = stripes - 1
+        self.tables = [{} for _ in range(stripes)]
+        self.locks = [Lock() for _ in range(stripes)]
+
+    def add(self, key, member):
+        # Add member and return the key's new set size
+        index = _stripe(key, self.mask)
+        table = self.tables[index]
+        with self.locks[index]:
+            members = table.get(key)
+            if members is None: members = table[key] = set()
+            members.add(member)
+            return len(members)
+
+    def count(self, key):
+        members = self.tables[_stripe(key, self.mask)].get(key)
+        return len(members) if members is not None else 0
+
+    def items(self):
+        items = []
+        for table, lock in zip(self.tables, self.locks):
+            with lock:
+                items.extend((key, set(members)) for key, members in table.items())
+        return items
+
+    def copy(self):
+        sets = StripedSets(self.mask + 1)
+        for key, members in self.items():
+            sets.tables[_stripe(key, sets.mask)][key] = members
+        return sets
+
+    def __getstate__(self):
+        return {'tables': self.copy().tables}
+
+    def __setstate__(self, state):
+        self.__init__(len(state['tables']))
+        self.tables = state['tables']
@@ -0,0 +1,65 @@
+import asynchronous.worker
+import multithread.worker
+from utils.admission import admit_link
+from utils.traps import TrapDetector
+from multithread.main import new_state
+
+class StubResolver:
+    # robots.txt verdicts per host (hosts not listed are unresolved, and their links get parked)
+    def __init__(self, verdicts):
+        self.verdicts = verdicts
+        self.parked = []
+
+    def status(self, url):
+        return self.verdicts.get(url.split('/')[2])
+
+    def defer(self, url, item):
+        self.parked.append(item)
+        return True
+
+def make_state(verdicts=None):
+    state = new_state()
+    state['robots_resolver'] = StubResolver(verdicts if verdicts is not None else {'a.com': True, 'b.com': False})
+    return state
+
+def admit(state, link, source='src.com'):
+    host = link.split('/')[2]
+    return admit_link(state, link, host, host, 1, source)
+
+def test_both_engines_share_admission():
+    assert multithread.worker.admit_link is admit_link
+    assert asynchronous.worker.admit_link is admit_link
+
+def test_new_link_admitted_once():
+    state = make_state()
+    item = admit(state, 'http://a.com/x')
+    assert item is not None and item[1:] == ('http://a.com/x', 1) and item[0] < 0
+    assert 'http://a.com/x' in state['scheduled']
+    assert admit(state, 'http://a.com/x') is None
+
+def test_known_links_skipped():
+    state = make_state()
+    state['visited'].add('http://a.com/seen')
+    state['disallowed'].add('http://a.com/blocked')
+    assert admit(state, 'http://a.com/seen') is None
+    assert admit(state, 'http://a.com/blocked') is None
+
+def test_robots_verdicts():
+    state = make_state()
+    assert admit(state, 'http://b.com/x') is None
+    assert 'http://b.com/x' in state['disallowed']
+
+    # Unresolved host: the link is claimed and parked until its robots.txt resolves
+    assert admit(state, 'http://c.com/x') is None
+    assert 'http://c.com/x' in state['scheduled']
+    assert [item[1] for item in state['robots_resolver'].parked] == ['http://c.com/x']
+
+def test_dropped_and_trap_hosts_skipped():
+    state = make_state()
+    state['host_health'].dropped.add('a.com')
+    assert admit(state, 'http://a.com/x') is None
+
+    state = make_state()
+    state['traps'] = TrapDetector(budget=2)
+    assert admit(state, 'http://a.com/1') and admit(state, 'http://a.com/2')
+    assert admit(state, 'http://a.com/3') is None
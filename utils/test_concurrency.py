@@ -0,0 +1,53 @@
+from utils.concurrency import ConcurrencyLimit, MIN_WINDOW_SAMPLES, PARSE_BACKLOG
+from config import CONCURRENCY_BACKOFF
+
+def window(limit, latency=0.1, failures=0, saturated=True):
+    # One full window of fetches (window=0, so it is evaluated as soon as it has enough samples)
+    if saturated: limit.in_flight(limit.value)
+    for index in range(MIN_WINDOW_SAMPLES):
+        limit.record(latency, index < failures)
+
+def test_bounds():
+    assert ConcurrencyLimit(1, minimum=10, maximum=20).value == 10
+    assert ConcurrencyLimit(50, minimum=10, maximum=20).value == 20
+
+def test_additive_increase_only_when_saturated():
+    limit = ConcurrencyLimit(16, minimum=1, maximum=100, window=0)
+    window(limit)
+    assert limit.value == 16 # first window sets the baselines
+    window(limit)
+    assert limit.value == 20 # + sqrt(16)
+    window(limit, saturated=False)
+    assert limit.value == 20
+
+def test_multiplicative_decrease_on_errors():
+    limit = ConcurrencyLimit(40, minimum=1, maximum=100, window=0)
+    window(limit, saturated=False)
+    window(limit, failures=5, saturated=False)
+    assert limit.value == int(40 * CONCURRENCY_BACKOFF)
+
+    # A steady error rate (e.g. dead hosts on the open web) becomes the baseline, so the limit grows again
+    for _ in range(50): window(limit, failures=5, saturated=False)
+    before = limit.value
+    window(limit, failures=5)
+    assert limit.value > before
+
+def test_latency_gradient():
+    limit = ConcurrencyLimit(40, minimum=1, maximum=100, window=0)
+    window(limit, latency=0.1, saturated=False)
+    window(limit, latency=0.1, saturated=False)
+    assert limit.value == 40
+
+    # Within the tolerance nothing changes, well above it the limit shrinks in proportion (at most halved)
+    window(limit, latency=0.14, saturated=False)
+    assert limit.value == 40
+    window(limit, latency=1.0, saturated=False)
+    assert limit.value == 20
+
+def test_parse_backlog():
+    limit = ConcurrencyLimit(40, minimum=1, maximum=100, window=0)
+    for _ in range(PARSE_BACKLOG + 1): limit.parse_started()
+    window(limit, saturated=False)
+    assert limit.value == int(40 * CONCURRENCY_BACKOFF)
+    for _ in range(PARSE_BACKLOG + 1): limit.parse_finished()
+    assert limit.parsing == 0
@@ -0,0 +1,65 @@
+from pickle import dumps, loads
+from time import time
+
+import pytest
+
+from utils.health import HostHealth, failure_kind
+
+OK = {'status_code': 200}
+TIMEOUT = {'status_code': 0, 'error': 'read'}
+DNS = {'status_code': 0, 'error': 'dns'}
+
+@pytest.mark.parametrize('meta, kind', [
+    (OK, None),
+    ({'status_code': 404}, None),
+    ({'status_code': 500}, 'server'),
+    ({'status_code': 503}, 'server'),
+    ({'status_code': 503, 'retry_after': 10}, 'throttled'),
+    ({'status_code': 429}, 'throttled'),
+    (TIMEOUT, 'read'),
+    (DNS, 'dns'),
+    ({'status_code': 0}, 'connect'),
+])
+def test_failure_kind(meta, kind):
+    assert failure_kind(meta) == kind
+
+def test_opens_after_threshold_and_closes_on_success():
+    health = HostHealth(threshold=2, backoff=30)
+    health.record('a.com', TIMEOUT)
+    assert health.retry_time('a.com') == 0
+    health.record('a.com', TIMEOUT)
+    assert health.retry_time('a.com') == pytest.approx(time() + 30, abs=1)
+
+    # Successful probe closes the breaker
+    health.record('a.com', OK)
+    assert health.retry_time('a.com') == 0 and 'a.com' not in health.hosts
+
+def test_immediate_failures():
+    health = HostHealth(threshold=5, backoff=30, max_backoff=600)
+    health.record('a.com', DNS)
+    assert health.retry_time('a.com') > time()
+
+    # Retry-After is honored when longer than the backoff (but capped)
+    health.record('b.com', {'status_code': 429, 'retry_after': 120})
+    assert health.retry_time('b.com') == pytest.approx(time() + 120, abs=1)
+    health.record('c.com', {'status_code': 429, 'retry_after': 86400})
+    assert health.retry_time('c.com') == pytest.approx(time() + 600, abs=1)
+
+def test_failed_probes_double_backoff_until_dropped():
+    health = HostHealth(threshold=1, backoff=10, max_backoff=1000, max_backoffs=3)
+    for delay in (10, 20, 40):
+        health.record('a.com', TIMEOUT)
+        assert health.retry_time('a.com') == pytest.approx(time() + delay, abs=1)
+        assert not health.is_dropped('a.com')
+    health.record('a.com', TIMEOUT)
+    assert health.is_dropped('a.com') and health.retry_time('a.com') == 0
+
+def test_copy_and_pickle():
+    health = HostHealth(threshold=1)
+    health.record('a.com', TIMEOUT)
+    health.dropped.add('b.com')
+    for copy in (health.copy(), loads(dumps(health))):
+        assert copy.retry_time('a.com') == health.retry_time('a.com')
+        assert copy.is_dropped('b.com')
+        copy.record('a.com', OK)
+        assert health.retry_time('a.com') > 0
@@ -0,0 +1,29 @@
+from frontier.politeness import Frontier
+from utils.priority import compute_priority, make_host_scorer
+from utils.state import StripedCounts, StripedSets
+from utils.traps import TrapDetector
+
+def new_state():
+    return {'domain_crawl_counts': StripedCounts(), 'superdomain_domains': StripedSets(), 'traps': TrapDetector()}
+
+def test_priority_drops_with_crawl_counts():
+    assert compute_priority(0, 1) > compute_priority(10, 1) > compute_priority(100, 1)
+    assert compute_priority(0, 1) > compute_priority(0, 5)
+
+def test_scorer_follows_live_counts():
+    state = new_state()
+    score = make_host_scorer(state)
+    state['superdomain_domains'].add('example.com', 'a.example.com')
+    before = score('a.example.com')
+
+    state['domain_crawl_counts'].add('a.example.com', 10)
+    assert score('a.example.com') < before
+
+def test_frontier_prefers_less_crawled_hosts():
+    # Both hosts start even; a.com is crawled a lot after its links were queued
+    state = new_state()
+    frontier = Frontier(scorer=make_host_scorer(state), min_delay=0, memory_items=0)
+    frontier.push((-1, 'http://a.com/', 0))
+    frontier.push((-1, 'http://b.com/', 0))
+    state['domain_crawl_counts'].add('a.com', 50)
+    assert frontier.pop()[1] == 'http://b.com/'
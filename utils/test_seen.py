@@ -0,0 +1,52 @@
+from pickle import dumps, loads
+
+import pytest
+
+from utils.seen import SeenStore, SeenSet, url_fingerprint, host_prefix, PATH_BITS
+
+URLS = [f'https://host{index % 7}.example.com/page/{index}' for index in range(5000)]
+
+@pytest.fixture(params=[SeenStore, lambda: SeenStore(bloom_capacity=0), SeenSet], ids=['bloom', 'table', 'set'])
+def store(request):
+    return request.param()
+
+def test_check_and_add(store):
+    assert all(store.check_and_add(url) for url in URLS)
+    assert not any(store.check_and_add(url) for url in URLS)
+    assert len(store) == len(URLS)
+    assert all(url in store for url in URLS)
+    assert 'https://host0.example.com/other' not in store
+
+def test_discard(store):
+    for url in URLS: store.add(url)
+    for url in URLS[::2]: store.discard(url)
+    assert len(store) == len(URLS) // 2
+    assert not any(url in store for url in URLS[::2])
+    assert all(url in store for url in URLS[1::2])
+
+    # Deleted slots can be reused
+    assert store.check_and_add(URLS[0])
+    assert URLS[0] in store
+
+def test_copy_and_pickle(store):
+    for url in URLS[:100]: store.add(url)
+    for copy in (store.copy(), loads(dumps(store))):
+        store.add(URLS[100])
+        assert len(copy) == 100
+        assert all(url in copy for url in URLS[:100])
+        assert URLS[100] not in copy
+        assert copy.check_and_add(URLS[101])
+
+def test_fingerprint_host_prefix():
+    fingerprint = url_fingerprint('https://example.com/page')
+    assert fingerprint >> PATH_BITS == host_prefix('https://example.com')
+    assert url_fingerprint('https://example.com') >> PATH_BITS == host_prefix('https://example.com')
+    assert fingerprint != url_fingerprint('https://example.com/other')
+
+def test_update_and_host_count():
+    store, other = SeenStore(), SeenStore()
+    for url in URLS[:10]: store.add(url)
+    for url in URLS[5:20]: other.add(url)
+    store.update(other)
+    assert len(store) == 20
+    assert store.host_count('https://host0.example.com') == 3
@@ -0,0 +1,65 @@
+from pickle import dumps, loads
+from random import Random
+
+import pytest
+
+from utils.simhash import simhash, SimHashIndex
+
+WORDS = [f'word{index}' for index in range(500)]
+
+def page(seed, words=300, links=20, host='example.com'):
+    rng = Random(seed)
+    text = ' '.join(rng.choice(WORDS) for _ in range(words))
+    return f'<html><head><script>var x = "{seed}";</script></head><body><p>{text}</p></body></html>', [f'http://{host}/page/{rng.randrange(10000)}' for _ in range(links)]
+
+def distance(first, second):
+    return (first ^ second).bit_count()
+
+def test_deterministic():
+    html, links = page(1)
+    assert simhash(html, links) == simhash(html, links)
+    assert 0 <= simhash(html, links) < 1 << 64
+
+def test_near_duplicates_are_close():
+    html, links = page(1)
+    fingerprint = simhash(html, links)
+
+    # Markup, a changed script, a mirror host and a small edit barely move the fingerprint
+    assert simhash(html.replace('<p>', '<p class="x">').replace('"1"', '"2"'), links) == fingerprint
+    assert simhash(html, [link.replace('example.com', 'mirror.org') for link in links]) == fingerprint
+    assert distance(simhash(html.replace('word1 ', 'changed ', 1), links), fingerprint) <= 3
+
+    # Unrelated pages are about 32 bits apart
+    other = simhash(*page(2))
+    assert distance(fingerprint, other) > 10
+
+def test_too_little_content():
+    assert simhash('<p>just a few words</p>') is None
+    assert simhash('<p>two words</p>', [f'http://example.com/{index}' for index in range(10)]) is not None
+
+@pytest.mark.parametrize('distance_limit', [0, 3, 7])
+def test_index_finds_fingerprints_within_distance(distance_limit):
+    rng = Random(distance_limit)
+    index = SimHashIndex(distance_limit)
+    fingerprints = [rng.getrandbits(64) for _ in range(1000)]
+    assert all(index.check_and_add(fingerprint) for fingerprint in fingerprints)
+    assert len(index) == 1000
+
+    # Flip distance bits (spread over every band) of indexed fingerprints, then one more than allowed
+    for fingerprint in fingerprints[:50]:
+        bits = rng.sample(range(64), distance_limit + 1)
+        near = fingerprint
+        for bit in bits[:distance_limit]: near ^= 1 << bit
+        assert not index.check_and_add(near)
+        assert index.check_and_add(near ^ (1 << bits[-1]))
+    assert len(index) == 1050
+
+def test_index_copy_and_pickle():
+    index = SimHashIndex(3)
+    index.check_and_add(0b1111)
+    copies = index.copy(), loads(dumps(index))
+    index.check_and_add(1 << 62)
+    for copy in copies:
+        assert not copy.check_and_add(0b0111)
+        assert copy.check_and_add(1 << 62)
+        assert len(copy) == 2
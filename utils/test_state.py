@@ -0,0 +1,46 @@
+from concurrent.futures import ThreadPoolExecutor
+from pickle import dumps, loads
+
+import pytest
+
+from utils.state import Accumulator, ThreadCounts, StripedCounts, StripedSets
+
+THREADS, ADDS = 8, 2000
+
+def hammer(work):
+    # Run work(thread index) on THREADS threads at once
+    with ThreadPoolExecutor(THREADS) as executor:
+        list(executor.map(work, range(THREADS)))
+
+def test_accumulator():
+    total = Accumulator(5)
+    hammer(lambda _: [total.add(2) for _ in range(ADDS)])
+    assert total.value == 5 + 2 * THREADS * ADDS
+    assert loads(dumps(total)).value == total.value
+    assert total.copy().value == total.value
+
+@pytest.mark.parametrize('counts_type', [ThreadCounts, StripedCounts])
+def test_counts(counts_type):
+    counts = counts_type()
+    hammer(lambda index: [counts.add(key % 3) for key in range(ADDS)] + [counts.add(f'thread{index}', 7)])
+    assert counts.get(0) == THREADS * len(range(0, ADDS, 3))
+    assert counts.get('missing', None) is None
+    assert sorted(counts.values()) == sorted(dict(counts.items()).values())
+    assert sum(counts.values()) == THREADS * (ADDS + 7)
+
+    # Copies are independent of later adds
+    snapshot, copies = dict(counts.items()), (counts.copy(), loads(dumps(counts)))
+    counts.add(0)
+    for copy in copies: assert dict(copy.items()) == snapshot
+
+def test_striped_sets():
+    sets = StripedSets()
+    hammer(lambda index: [sets.add(f'super{key % 10}.com', f'host{key}.super{key % 10}.com') for key in range(index, ADDS, THREADS)])
+    assert sets.count('super3.com') == ADDS // 10
+    assert sets.count('missing.com') == 0
+    assert sets.add('super3.com', 'host3.super3.com') == ADDS // 10
+
+    copy = loads(dumps(sets))
+    sets.add('super3.com', 'new.super3.com')
+    assert copy.count('super3.com') == ADDS // 10
+    assert dict(copy.items())['super3.com'] == {f'host{key}.super3.com' for key in range(3, ADDS, 10)}
@@ -0,0 +1,39 @@
+from utils.traps import TrapDetector
+
+def test_budget():
+    detector = TrapDetector(budget=3)
+    for _ in range(3):
+        assert detector.within_budget('example.com')
+        detector.discovered_link('example.com')
+    assert not detector.within_budget('example.com')
+    assert detector.within_budget('other.com')
+
+def test_low_yield_demotion():
+    detector = TrapDetector(min_pages=4, min_links=2, demotion=0.25)
+
+    # Too few pages expanded to judge
+    for _ in range(3): detector.page_expanded('calendar.com')
+    assert detector.factor('calendar.com') == 1
+
+    # One new link per page (a calendar's "next month") is demoted
+    detector.page_expanded('calendar.com')
+    for _ in range(4): detector.found_link('calendar.com')
+    assert detector.factor('calendar.com') == 0.25
+
+    # Enough new links lifts the demotion again
+    for _ in range(4): detector.found_link('calendar.com')
+    assert detector.factor('calendar.com') == 1
+
+def test_repeated_path_demotion():
+    detector = TrapDetector(demotion=0.25)
+    assert detector.factor('github.com', 'https://github.com/torvalds/linux') == 1
+    assert detector.factor('github.com', 'https://github.com/torvalds/torvalds') == 0.25
+    assert detector.factor('www.ikea.com', 'https://www.ikea.com/de/de/p/x') == 0.25
+
+def test_copy():
+    detector = TrapDetector(budget=1)
+    detector.discovered_link('example.com')
+    copy = detector.copy()
+    detector.discovered_link('other.com')
+    assert not copy.within_budget('example.com')
+    assert copy.within_budget('other.com')
@@ -0,0 +1,70 @@
+import pytest
+
+from utils.url import canonicalize, clean_url, get_superdomain, is_trap_path, has_repeated_segments
+
+@pytest.mark.parametrize('path', [
+    '/a/b/c/d/e/f/g/h/i/j/k',           # deeper than MAX_PATH_DEPTH
+    '/cart;jsessionid=0123456789abcdef',
+    '/(S(abcdef0123456789))/default',
+    '/page/page/page',
+    '/a/b/a/b/a/b',
+    '/x/a/b/a/b/a/b/y',
+    '/a/x/a/y/a',                       # one segment more than MAX_SEGMENT_REPEATS times
+])
+def test_trap_paths(path):
+    assert is_trap_path(path)
+
+@pytest.mark.parametrize('path', [
+    '/',
+    '/docs/page',
+    '/2024/01/01',
+    '/1/1/1/1',
+    '/de/de/p/x',                       # locale (country/language)
+    '/fr/fr',
+    '/torvalds/torvalds',               # profile repository named after its user
+    '/brutaldon/brutaldon',
+    '/a/b/a/b',
+])
+def test_not_trap_paths(path):
+    assert not is_trap_path(path)
+
+def test_repeated_segments():
+    assert has_repeated_segments('/de/de/p/x')
+    assert has_repeated_segments('/a/b/a/b')
+    assert not has_repeated_segments('/a/b/c/a')
+    assert not has_repeated_segments('/2024/01/01')
+
+def test_canonicalize():
+    canonical = canonicalize('https://Blog.example.co.uk/docs/page/?ref=abc#top')
+    assert canonical.url == 'https://Blog.example.co.uk/docs/page'
+    assert canonical.host == 'Blog.example.co.uk'
+    assert canonical.superdomain == 'example.co.uk'
+    assert canonical.valid
+    assert canonicalize('https://example.com/image.JPG').extension == '.jpg'
+
+@pytest.mark.parametrize('url', [
+    'https://example.com/image.jpg',
+    'https://example.com/cgi-bin/search',
+    'https://example.com/page.php',
+    'https://exa mple.com/',
+    'https://example.com/' + 'x' * 300,
+    'mailto:someone@example.com',
+])
+def test_canonicalize_invalid(url):
+    assert not canonicalize(url).valid
+
+@pytest.mark.parametrize('url', [
+    'https://example.com',
+    'https://example.com/',
+    'https://example.com/docs/page/',
+    'https://example.com/docs/page?ref=abc#top',
+    'https://example.com/a%20b/c',
+    'http://example.com:8080/x/',
+])
+def test_canonicalize_matches_clean_url(url):
+    assert canonicalize(url).url == clean_url(url)
+
+def test_superdomain_offline():
+    # Bundled public suffix list, so multi-label suffixes work without network access
+    assert get_superdomain('https://a.b.example.co.uk/page') == 'example.co.uk'
+    assert get_superdomain('news.bbc.co.uk') == 'bbc.co.uk'
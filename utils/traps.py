@@ -0,0 +1,48 @@
+from urllib.parse import urlsplit
+
+from utils.state import StripedCounts
+from utils.url import has_repeated_segments
+from config import HOST_URL_BUDGET, LOW_YIELD_PAGES, LOW_YIELD_LINKS, LOW_YIELD_DEMOTION
+
+# Per-host crawler-trap heuristics applied while filtering links (per-URL path checks are in utils/url.py):
+#  - a budget of discovered URLs per host, so one host generating endless URLs can't flood the frontier
+#  - a low-yield detector: hosts whose pages bring few new links (calendars, facets and session variants
+#    of pages already seen) are demoted, so they get less of the page budget
+#  - links whose path repeats a block of segments once (/a/b/a/b) are demoted rather than dropped
+class TrapDetector:
+    def __init__(self, budget=HOST_URL_BUDGET, min_pages=LOW_YIELD_PAGES, min_links=LOW_YIELD_LINKS, demotion=LOW_YIELD_DEMOTION):
+        self.budget = budget
+        self.min_pages = min_pages
+        self.min_links = min_links
+        self.demotion = demotion
+        self.discovered = StripedCounts()   # host -> URLs scheduled on it
+        self.pages = StripedCounts()        # host -> pages whose links were expanded
+        self.new_links = StripedCounts()    # host -> new links found on its pages
+
+    def within_budget(self, host):
+        return self.discovered.get(host, 0) < self.budget
+
+    def discovered_link(self, host):
+        # New URL scheduled on host
+        self.discovered.add(host)
+
+    def found_link(self, source):
+        # New link found on a page of source (scheduled here, or handed to another shard)
+        self.new_links.add(source)
+
+    def page_expanded(self, host):
+        self.pages.add(host)
+
+    def factor(self, host, url=None):
+        # Priority factor for a host's links (demoted while its pages yield too few new links), and for one of
+        # them if url is given (demoted again if its path repeats a block of segments)
+        factor = 1
+        pages = self.pages.get(host, 0)
+        if pages >= self.min_pages and self.new_links.get(host, 0) < self.min_links * pages: factor = self.demotion
+        if url is not None and has_repeated_segments(urlsplit(url).path): factor *= self.demotion
+        return factor
+
+    def copy(self):
+        detector = TrapDetector(self.budget, self.min_pages, self.min_links, self.demotion)
+        detector.discovered, detector.pages, detector.new_links = self.discovered.copy(), self.pages.copy(), self.new_links.copy()
+        return detector
@@ -1,9 +1,14 @@
+from collections import namedtuple
+from functools import lru_cache
 from os.path import splitext
+from re import compile, IGNORECASE
 from urllib.parse import urlsplit, urlunsplit
 
 import tldextract
 import validators
 
+from config import URL_CACHE_SIZE, MAX_URL_LENGTH, MAX_PATH_DEPTH, MAX_SEGMENT_REPEATS
+
 BLACKLIST = {
     '.jpg', '.jpeg', '.png', '.gif', '.pdf', '.zip', '.exe',
     '.js', '.css', '.mp4', '.mp3', '.avi', '.mov', '.svg',
@@ -30,10 +35,87 @@ def clean_url(url):
     
     return cleaned
 
-def get_superdomain(url):
-    extracted = tldextract.extract(url)
+# Public suffix list from the snapshot bundled with tldextract (never fetched over the network)
+_extract = tldextract.TLDExtract(suffix_list_urls=())
+
+# Characters validators.url accepts in a path (unreserved, sub-delims, ':', '@', '%', '/' and non-ASCII)
+PATH_RE = compile(r"[/a-zA-Z0-9\-._~!$&'()*+,;=:@%\u0080-\U0010ffff]*")
+
+# Session IDs carried in the path (e.g. ;jsessionid=..., ASP.NET /(S(...))/), which make every visit a new URL
+SESSION_RE = compile(r';\s*(?:jsessionid|phpsessid|sessionid|sid)=|/\([a-z]\([0-9a-z]+\)\)', IGNORECASE)
+
+# One parse of a link: cleaned URL, host (netloc), registered domain, lowercased extension, and
+# whether the crawler may fetch it (valid scheme/host/path, not CGI, no blocked extension, not a likely trap)
+CanonicalUrl = namedtuple('CanonicalUrl', 'url host superdomain extension valid')
+
+def canonicalize(url):
+    scheme, netloc, path, _, _ = urlsplit(url)
+
+    # Same result as clean_url, without a second parse
+    if scheme and netloc:
+        if path and path[0] != '/': path = '/' + path
+        cleaned = f'{scheme}://{netloc}{path}'
+    else:
+        cleaned = urlunsplit((scheme, netloc, path, '', ''))
+    if cleaned.endswith('/') and cleaned.count('/') > 2:
+        cleaned = cleaned.rstrip('/')
+        path = path.rstrip('/')
+
+    # Host-level checks are memoized, only the path is checked per link
+    extension = splitext(path)[1].lower()
+    valid = (
+        bool(netloc) and _is_valid_host(scheme, netloc)
+        and PATH_RE.fullmatch(path) is not None
+        and 'cgi' not in path.lower()
+        and extension not in BLACKLIST
+        and len(cleaned) <= MAX_URL_LENGTH
+        and not is_trap_path(path)
+    )
+    return CanonicalUrl(cleaned, netloc, host_superdomain(netloc), extension, valid)
+
+def is_trap_path(path):
+    # Paths that look like an endless URL space: too deep, repeating segments, or a session ID
+    segments = path.split('/')[1:]
+    if len(segments) > MAX_PATH_DEPTH: return True
+    if (';' in path or '(' in path) and SESSION_RE.search(path): return True
+
+    # Repeats are only possible with a duplicate segment (dates like /2024/01/01 may repeat numbers)
+    if len(set(segments)) == len(segments): return False
+    words = [segment for segment in segments if not segment.isdigit()]
+    if any(words.count(word) > MAX_SEGMENT_REPEATS for word in set(words)): return True
+
+    # Same block of segments over and over (/a/b/a/b/a/b), e.g. from relative links resolved against themselves
+    return _repeated_block(segments, MAX_SEGMENT_REPEATS + 1)
+
+def has_repeated_segments(path):
+    # Same block of segments twice in a row (/a/b/a/b). Often legitimate (locales like /de/de, GitHub's
+    # /user/user profile repos), so such links are only demoted (see utils/traps.py)
+    segments = path.split('/')[1:]
+    return len(set(segments)) < len(segments) and _repeated_block(segments, 2)
+
+def _repeated_block(segments, times):
+    # Whether some block of segments (not only numbers) occurs `times` times in a row
+    for size in range(1, len(segments) // times + 1):
+        for start in range(len(segments) - times * size + 1):
+            block = segments[start:start + size]
+            if all(segment.isdigit() for segment in block): continue
+            if all(segments[start + index * size:start + (index + 1) * size] == block for index in range(1, times)): return True
+    return False
+
+@lru_cache(maxsize=URL_CACHE_SIZE)
+def host_superdomain(host):
+    # Registered domain of a host (e.g. blog.example.co.uk -> example.co.uk), memoized per host
+    extracted = _extract(host)
     return f'{extracted.domain}.{extracted.suffix}'
 
+@lru_cache(maxsize=URL_CACHE_SIZE)
+def _is_valid_host(scheme, netloc):
+    return bool(validators.url(f'{scheme}://{netloc}'))
+
+def get_superdomain(url):
+    # Accepts a full URL or a bare host
+    return host_superdomain(urlsplit(url).netloc if '//' in url else url)
+
 def is_valid_url(url):
     return validators.url(url)
 